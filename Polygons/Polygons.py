@@ -4,8 +4,12 @@ matplotlib.use('Agg')
 import random
 import math
 import string
+import threading
+from contextlib import contextmanager
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
+from Polygons.canvas import asCanvas
 
 hatches = ('-', '+', 'x', '\\', '*', 'o', 'O', '.', '/', '|')
 
@@ -13,18 +17,39 @@ hatches = ('-', '+', 'x', '\\', '*', 'o', 'O', '.', '/', '|')
 CIRCLE_LIMIT_POINT = 100
 CANVAS_SIZE = 10
 IRREGULAR_ANGLE = math.pi / 6
+# mirror the x (vert) or y (hori) coordinates of the vertices
+FLIP_VERT = np.array([-1.0, 1.0])
+FLIP_HORI = np.array([1.0, -1.0])
+
+# the random number generator of the question being generated in each thread
+rngState = threading.local()
+
+def getRng():
+    # the generator installed by useRng in this thread, the global random module otherwise
+    return getattr(rngState, 'rng', None) or random
+
+@contextmanager
+def useRng(rng):
+    # makes rnd, rndangle and the Polygon methods draw from rng (a random.Random)
+    # in this thread, so that a seeded generation is reproducible
+    previous = getattr(rngState, 'rng', None)
+    rngState.rng = rng
+    try:
+        yield rng
+    finally:
+        rngState.rng = previous
 
 def rnd(zeroToOne=0):
     # if zeroToOne is 1, returns a number between 0 and 1 (inclusive)
     # else returns a number between -1 and 1 (inclusive)
     if zeroToOne == 1:
-        return random.random()
+        return getRng().random()
     else:
-        if round(random.random()) == round(0):
+        if round(getRng().random()) == round(0):
             # if generated number between 0 and 0.5
-            return random.random()
+            return getRng().random()
         else:
-            return random.random() * -1
+            return getRng().random() * -1
 
 def rndangle():
     # return a random angle [in radians] between 0 and 360 deg
@@ -32,20 +57,32 @@ def rndangle():
 
 def getpoints(R, theta, Xcenter, Ycenter):
     # finds the new points on circle, with radius R, center (Xcenter,Ycenter), at an angle theta
+    # theta can also be an array of angles, then the points come back as an (N, 2) array
+    if np.ndim(theta):
+        # x + iy = center + R * e^(i theta), viewed as (x, y) pairs
+        return (np.exp(1j * theta) * R + complex(Xcenter, Ycenter)).view(np.float64).reshape(-1, 2)
     return ((Xcenter + (R * math.cos(theta))), (Ycenter + (R * math.sin(theta))))
 
 # Circumcircle - has a radius and a x,y coordinates for the center
 class Circumcircle:
+    __slots__ = ('radius', 'x', 'y')
+
     def __init__(self, size, centerx, centery):
         self.radius = size
         self.x = centerx
         self.y = centery
 
+    def clone(self):
+        return Circumcircle(self.radius, self.x, self.y)
+
     def __repr__(self):
         return "Circumcircle: radius %s, Center: (%s,%s)" % (self.radius, self.x, self.y)
 
 # Represents a shape
 class Polygon:
+    # type is only set for alphabets
+    __slots__ = ('size', 'N', 'isRegular', 'points', 'circumcircle', 'hatch',
+                 'alphabet_rotation', 'alphabet', 'point_angles', 'type')
 
     @staticmethod
     def getHatches():
@@ -55,15 +92,16 @@ class Polygon:
         self.size = size
         self.N = no_of_sides
         if isRegular == 'any':
-            self.isRegular = random.choice([True, False])
+            self.isRegular = getRng().choice([True, False])
         else:
             self.isRegular = isRegular
-        self.points = []
+        # (N, 2) array of vertices
+        self.points = np.empty((0, 2))
 
         self.circumcircle = circumcircle
 
         if hatch == 'random':
-            self.hatch = hatches[int(random.random() * len(hatches))]
+            self.hatch = hatches[int(getRng().random() * len(hatches))]
         else:
             self.hatch = hatch
 
@@ -74,7 +112,7 @@ class Polygon:
 
         # The angles at which each point was drawn
         # This will be helpful in case of rotating and other things (I can't think of right now.)
-        self.point_angles = []
+        self.point_angles = np.empty(0)
 
     '''
     This shape is drawn randomly
@@ -103,9 +141,9 @@ class Polygon:
         # Uses the information - circumcircle(radius,x,y) + no_of_sides + isRegular to generate vertices
         # for the polygon
 
-        # Start with empty lists of points
-        self.points = []
-        self.point_angles = []
+        # Start with no points
+        self.points = np.empty((0, 2))
+        self.point_angles = np.empty(0)
 
         # Pick a random angle
         start_angle = rndangle()
@@ -119,24 +157,21 @@ class Polygon:
             # pass
             if self.alphabet is None:
                 self.type = 'alpha'
-                self.alphabet = random.choice(
+                self.alphabet = getRng().choice(
                     list(string.ascii_letters) + [u'\u2605', u'\u25DF', u'\u2020', u'\u002B'])
             pass
         elif self.N == 2:
             # An arrow
             # Two points that are opposite to each other
-            self.point_angles = [start_angle, start_angle + math.pi]
+            self.point_angles = np.array([start_angle, start_angle + math.pi])
             self.gen_points()
         elif self.isRegular:
             # Then theta is incremented uniformly by 360/N
             angle_increment = 2 * math.pi / self.N
 
             # Add points
-            for i in range(self.N):
-                cur_angle = start_angle + i * angle_increment
-                self.point_angles.append(cur_angle)
-                self.points.append(getpoints(
-                    self.circumcircle.radius, cur_angle, self.circumcircle.x, self.circumcircle.y))
+            self.point_angles = start_angle + np.arange(self.N) * angle_increment
+            self.gen_points()
 
         else:
             # Then theta is incremented by randangle
@@ -148,18 +183,13 @@ class Polygon:
             # Currently increment with one of the values in angle_increment
             # angle_increment = [math.pi / 8, 2*math.pi / 6 ]
 
-            self.points = []
-            self.point_angles = []
-
             angle_increment = 2 * math.pi / self.N
+            # Now modify the generated angles a little bit
+            # We increment/decrement angle by any number between 0 and 30 degrees
+            jitter = np.array([getRng().random() * IRREGULAR_ANGLE * (-1 if getRng().random() < 0.5 else 1)
+                               for _ in range(self.N)])
             # Add points
-            for i in range(self.N):
-                cur_angle = start_angle + i * angle_increment
-                # Now modify the generated angles a little bit
-                # We increment/decrement angle by any number between 0 and 30 degrees
-                cur_angle += random.random() * IRREGULAR_ANGLE * \
-                    (-1 if random.random() < 0.5 else 1)
-                self.point_angles.append(cur_angle)
+            self.point_angles = start_angle + np.arange(self.N) * angle_increment + jitter
 
             self.gen_points()
 
@@ -168,9 +198,8 @@ class Polygon:
         # To standardize the point angles generated, subtract 2*pi from any angle that was generated
         # if it is greater than 2*pi and then sort (sorting is not required but we just want to keep it in a way that
         # all angles are in increasing order between 0 and 2*pi)
-        for i in range(len(self.point_angles)):
-            if self.point_angles[i] > 2 * math.pi:
-                self.point_angles[i] -= 2 * math.pi
+        self.point_angles = np.where(self.point_angles > 2 * math.pi,
+                                     self.point_angles - 2 * math.pi, self.point_angles)
 
     def setSize(self, size=10):
         self.circumcircle.radius = size
@@ -181,61 +210,64 @@ class Polygon:
     def isCircle(self):
         return self.N == 0 or self.N > CIRCLE_LIMIT_POINT
 
-    def drawPolygon(self):
+    '''
+    Draw the shape on canvas (see Polygons.canvas) or on a matplotlib Axes.
+    Falls back to the current pyplot axes, which is not safe to use from
+    several threads at once.
+    '''
+
+    def drawPolygon(self, canvas=None):
+        canvas = asCanvas(plt.gca() if canvas is None else canvas)
         points = self.points
 
         if self.N == 0:
-            self.drawCircle()
+            self.drawCircle(canvas)
         elif self.N == 1:
-            plt.gca().text(self.circumcircle.x, self.circumcircle.y, self.alphabet,
-                           # rotation value should in degrees
-                           rotation=self.alphabet_rotation * (180 / math.pi),
-                           fontsize=self.size, color='black',
-                           multialignment='center',
-                           verticalalignment='center', horizontalalignment='center',
-                           )
+            canvas.text(self.circumcircle.x, self.circumcircle.y, self.alphabet,
+                        fontsize=self.size,
+                        # rotation value should in degrees
+                        rotation=self.alphabet_rotation * (180 / math.pi))
 
         elif self.N == 2:
-            self.drawArrow()
+            self.drawArrow(canvas)
         else:
-            # FOR POLYGONS
-            fill = False
+            # FOR POLYGONS (never filled)
             if not self.hatch:
                 # don't do anything
                 hatch = None
             elif self.hatch == 'random':
                 # pick a random hatch
-                hatch = hatches[int(random.random() * len(hatches))]
+                hatch = hatches[int(getRng().random() * len(hatches))]
                 self.hatch = hatch
             else:
                 hatch = self.hatch
 
-            polygon = plt.Polygon(points, fill=fill, hatch=hatch)
-            plt.gca().add_patch(polygon)
+            canvas.polygon(points, hatch=hatch)
 
-    def drawCircle(self):
+    def drawCircle(self, canvas=None):
+        canvas = asCanvas(plt.gca() if canvas is None else canvas)
         if not self.hatch:
             # don't do anything
             hatch = None
         elif self.hatch == 'random':
             # pick a random hatch
-            hatch = hatches[int(random.random() * len(hatches))]
+            hatch = hatches[int(getRng().random() * len(hatches))]
             self.hatch = hatch
         else:
             hatch = self.hatch
 
-        circle = plt.Circle((self.circumcircle.x, self.circumcircle.y),
-                             self.circumcircle.radius, fill=False, hatch=hatch)
-        plt.gca().add_patch(circle)
+        canvas.circle((self.circumcircle.x, self.circumcircle.y),
+                      self.circumcircle.radius, hatch=hatch)
 
-    def drawArrow(self):
+    def drawArrow(self, canvas=None):
+        canvas = asCanvas(plt.gca() if canvas is None else canvas)
         x1, y1 = self.points[0]
         x2, y2 = self.points[1]
         dx, dy = x2 - x1, y2 - y1
 
         # FIX make head_width and head_length relative to something so that it scales.
-        plt.arrow(x1, y1, dx, dy, head_width=abs(min(dx, dy) * 0.1),
-                  head_length=abs(min(dx, dy) * 0.1), fc='k', ec='k')
+        canvas.arrow(x1, y1, dx, dy, head_width=abs(min(dx, dy) * 0.1),
+                     head_length=abs(min(dx, dy) * 0.1))
 
     '''
     Generate this object outside the poly
@@ -306,15 +338,19 @@ class Polygon:
 
         elif not self.isCircle():
             # rotate the current polygon clockwise by theta
-            self.points = []
+            # Update the angles at which vertices are drawn
+            self.point_angles = self.point_angles + theta
             # Find new points drawn at new angles.
-            for cur_angle in self.point_angles:
-                self.points.append(getpoints(self.circumcircle.radius, cur_angle + theta,
-                                             self.circumcircle.x, self.circumcircle.y))
+            self.gen_points()
 
-            # Update the angles at which vertices are drawn
-            self.point_angles = [cur_angle +
-                                 theta for cur_angle in self.point_angles]
+    """
+    Move the polygon (circumcircle and vertices) by dx, dy
+    """
+
+    def translate(self, dx, dy):
+        self.circumcircle = Circumcircle(
+            self.circumcircle.radius, self.circumcircle.x + dx, self.circumcircle.y + dy)
+        self.points = self.points + [dx, dy]
 
     def add_vertex(self):
         if not self.isCircle():
@@ -355,19 +391,12 @@ class Polygon:
                 self.alphabet_rotation = 'horizontal'
 
         elif not self.isCircle():
-            pts = []
             if how == 'vert':
-                for pt in self.points:
-                    x, y = pt
-                    xdist = self.circumcircle.x - x
-
-                    x, y = 2 * self.circumcircle.x - x, y
-                    pts.append((x, y))
+                pts = self.points * FLIP_VERT + (2 * self.circumcircle.x, 0)
             elif how == 'hori':
-                for pt in self.points:
-                    x, y = pt
-                    x, y = x, 2 * self.circumcircle.y - y
-                    pts.append((x, y))
+                pts = self.points * FLIP_HORI + (0, 2 * self.circumcircle.y)
+            else:
+                pts = np.empty((0, 2))
 
             # Update the points
             self.points = pts
@@ -379,16 +408,9 @@ class Polygon:
         # Given the points are generated, find the angles in which they were
         # generated.
         if not self.isCircle():
-            point_angles = []
-            for pt in self.points:
-                x, y = pt
-                angle = math.atan2(y - self.circumcircle.y,
-                                    x - self.circumcircle.x)
-                if angle < 0:
-                    angle = (2 * math.pi) + angle
-                point_angles.append(angle)
-
-            self.point_angles = point_angles
+            x, y = (self.points - (self.circumcircle.x, self.circumcircle.y)).T
+            # atan2 gives (-pi, pi], negative angles are moved to (pi, 2pi)
+            self.point_angles = np.mod(np.arctan2(y, x), 2 * math.pi)
 
     def get_point_angles(self):
         self.gen_point_angles()
@@ -397,10 +419,8 @@ class Polygon:
     def gen_points(self):
         if not self.isCircle():
             # Given point angles and the circumcircle, draw
-            self.points = []
-            for angle in self.point_angles:
-                self.points.append(getpoints(self.circumcircle.radius, angle,
-                                             self.circumcircle.x, self.circumcircle.y))
+            self.points = getpoints(self.circumcircle.radius, self.point_angles,
+                                    self.circumcircle.x, self.circumcircle.y)
 
     def swap_polygons(self, otherpoly):
         # swap the circumcircles of the two polygons and then replicate points
@@ -417,6 +437,26 @@ class Polygon:
         self.gen_points()
         otherpoly.gen_points()
 
+    """
+    Returns an independent copy of the polygon, much cheaper than copy.deepcopy.
+    The circumcircle and the point arrays are copied, everything else is immutable.
+    """
+
+    def clone(self):
+        other = Polygon.__new__(Polygon)
+        other.size = self.size
+        other.N = self.N
+        other.isRegular = self.isRegular
+        other.hatch = self.hatch
+        other.alphabet_rotation = self.alphabet_rotation
+        other.alphabet = self.alphabet
+        if hasattr(self, 'type'):
+            other.type = self.type
+        other.circumcircle = None if self.circumcircle is None else self.circumcircle.clone()
+        other.points = self.points.copy()
+        other.point_angles = self.point_angles.copy()
+        return other
+
     def __repr__(self):
         return "Polygon: %s sides, circumcircle: %s" % (self.N, self.circumcircle)
 
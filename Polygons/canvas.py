@@ -0,0 +1,413 @@
+"""
+Drawing targets for Polygon and the generators.
+
+Every canvas has the same small drawing API in data coordinates (polygon,
+circle, rectangle, arrow, text) and turns what was drawn into an image laid
+out like a matplotlib figure with axis('image') and axis('off').
+
+- MatplotlibCanvas draws through a Figure/Axes on its own Agg canvas.
+- RasterCanvas keeps a display list and rasterizes it straight into a numpy
+  array with OpenCV, blitting text from the glyph atlas (Polygons.glyphs),
+  without the Figure/Axes/Artist machinery.
+- SvgCanvas lays out the same display list and writes it as SVG markup
+  (a Polygons.svg.SvgImage) instead of pixels.
+
+The backend is picked with the RENDER_BACKEND environment variable
+('raster' by default, 'matplotlib' for comparison).
+
+Canvases come from a per-thread pool: newCanvas() hands out an idle canvas
+of the same backend and dpi when there is one, and canvas.close() clears
+what was drawn and gives it back, keeping the Figure, Axes and renderer.
+"""
+import math
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from Polygons import svg
+from Polygons.glyphs import atlas, drawText
+from Polygons.hatching import drawHatch
+
+BACKENDS = ('raster', 'matplotlib')
+RENDER_BACKEND = os.getenv('RENDER_BACKEND', 'raster')
+
+# matplotlib defaults: figure.figsize, figure.dpi and figure.subplot.*
+FIGSIZE = (6.4, 4.8)
+DPI = 100
+AXES_BOX = (0.125, 0.11, 0.9, 0.88)  # left, bottom, right, top
+# axes.xmargin and axes.ymargin
+MARGIN = 0.05
+# patch.linewidth in points
+LINEWIDTH = 1.0
+# matplotlib's FancyArrow default stem width, in data units
+ARROW_WIDTH = 0.001
+# idle canvases kept per thread for every (backend, dpi)
+POOL_SIZE = int(os.getenv('CANVAS_POOL_SIZE', 4))
+
+COLORS = {
+    None: 0,
+    'black': 0,
+    'k': 0,
+    'blue': 29,  # gray level of pure blue
+}
+SVG_COLORS = {
+    None: '#000',
+    'black': '#000',
+    'k': '#000',
+    'blue': '#00f',
+}
+BACKGROUND = 255
+
+"""
+Returns an empty canvas for the given backend (RENDER_BACKEND by default),
+reusing one from this thread's pool when possible. Call close() on it when
+done so it goes back to the pool.
+"""
+def newCanvas(dpi=None, backend=None):
+    backend = backend or RENDER_BACKEND
+    if backend not in CANVASES:
+        raise ValueError(f"Unknown render backend {backend!r}, expected one of {tuple(CANVASES)}")
+    return canvasPool.acquire(backend, dpi or DPI)
+
+"""
+Wraps a matplotlib Axes in a MatplotlibCanvas, returns canvases unchanged.
+"""
+def asCanvas(target):
+    if hasattr(target, 'add_patch'):
+        return MatplotlibCanvas(ax=target)
+    return target
+
+"""
+Vertices of the arrow matplotlib draws for ax.arrow(x, y, dx, dy, ...)
+(a FancyArrow with the head added after the stem).
+"""
+def arrowVertices(x, y, dx, dy, head_width, head_length, width=ARROW_WIDTH):
+    distance = math.hypot(dx, dy)
+    length = distance + head_length
+    if not length:
+        return np.empty((0, 2))
+
+    left_half_arrow = np.array([
+        [0.0, 0.0],                       # tip
+        [-head_length, -head_width / 2],  # leftmost
+        [-head_length, -width / 2],       # meets stem
+        [-length, -width / 2],            # bottom left
+        [-length, 0],
+    ]) + [head_length, 0]
+    right_half_arrow = left_half_arrow * [1, -1]
+    coords = np.concatenate([left_half_arrow[:-1], right_half_arrow[-2::-1]])
+
+    if distance != 0:
+        cx, sx = dx / distance, dy / distance
+    else:
+        cx, sx = 0, 1
+    return np.dot(coords, [[cx, sx], [-sx, cx]]) + [x + dx, y + dy]
+
+
+class CanvasPool:
+    def __init__(self, maxIdle=POOL_SIZE):
+        self.maxIdle = maxIdle
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.allocations = 0
+        self.releases = 0
+        self.discards = 0
+
+    def idle(self):
+        # (backend, dpi) -> canvases this thread can hand out again
+        if not hasattr(self.local, 'canvases'):
+            self.local.canvases = {}
+        return self.local.canvases
+
+    def acquire(self, backend, dpi):
+        free = self.idle().get((backend, dpi))
+        if free:
+            canvas = free.pop()
+            with self.lock:
+                self.hits += 1
+        else:
+            canvas = CANVASES[backend](dpi=dpi)
+            with self.lock:
+                self.allocations += 1
+        canvas.pool = self
+        return canvas
+
+    def release(self, canvas):
+        canvas.pool = None
+        canvas.reset()
+        free = self.idle().setdefault((canvas.backend, canvas.dpi), [])
+        kept = len(free) < self.maxIdle
+        if kept:
+            free.append(canvas)
+        with self.lock:
+            self.releases += 1
+            self.discards += not kept
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'allocations': self.allocations,
+                'releases': self.releases,
+                'discards': self.discards,
+            }
+
+
+class MatplotlibCanvas:
+    backend = 'matplotlib'
+    pool = None
+
+    def __init__(self, dpi=None, ax=None):
+        # imported here so the raster backend never loads matplotlib's artists
+        from Polygons.utils import newFigure
+        if ax is None:
+            self.fig, self.ax = newFigure(dpi)
+        else:
+            self.fig, self.ax = ax.figure, ax
+        self.dpi = self.fig.dpi
+
+    def reset(self):
+        self.ax.cla()
+        self.fig.patch.set_alpha(1)
+        self.ax.patch.set_alpha(1)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+
+    def polygon(self, points, hatch=None, edgecolor=None):
+        import matplotlib.patches as mpatches
+        self.ax.add_patch(mpatches.Polygon(points, fill=False, hatch=hatch, edgecolor=edgecolor))
+
+    def rectangle(self, xy, width, height, edgecolor=None):
+        import matplotlib.patches as mpatches
+        self.ax.add_patch(mpatches.Rectangle(xy, width, height, fill=False, edgecolor=edgecolor))
+
+    def circle(self, center, radius, hatch=None):
+        import matplotlib.patches as mpatches
+        self.ax.add_patch(mpatches.Circle(center, radius, fill=False, hatch=hatch))
+
+    def arrow(self, x, y, dx, dy, head_width, head_length):
+        self.ax.arrow(x, y, dx, dy, head_width=head_width, head_length=head_length, fc='k', ec='k')
+
+    def text(self, x, y, s, fontsize, rotation=0):
+        self.ax.text(x, y, s, rotation=rotation, fontsize=fontsize, color='black',
+                     multialignment='center', verticalalignment='center', horizontalalignment='center')
+
+    def toRGBA(self, transparent=False):
+        from Polygons.utils import figureToRGBA
+        self.ax.axis('image')
+        self.ax.axis('off')
+        return figureToRGBA(self.fig, transparent=transparent)
+
+    def toImage(self):
+        return cv2.cvtColor(self.toRGBA(), cv2.COLOR_RGBA2GRAY)
+
+
+class RasterCanvas:
+    backend = 'raster'
+    pool = None
+
+    def __init__(self, dpi=None):
+        self.dpi = dpi or DPI
+        self.shapes = []
+        self.texts = []
+
+    def reset(self):
+        self.shapes.clear()
+        self.texts.clear()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+
+    def polygon(self, points, hatch=None, edgecolor=None):
+        self.shapes.append(('polygon', np.asarray(points, dtype=np.float64).reshape(-1, 2), hatch, edgecolor))
+
+    def rectangle(self, xy, width, height, edgecolor=None):
+        x, y = xy
+        self.polygon([(x, y), (x + width, y), (x + width, y + height), (x, y + height)], edgecolor=edgecolor)
+
+    def circle(self, center, radius, hatch=None):
+        self.shapes.append(('circle', (center, radius), hatch, None))
+
+    def arrow(self, x, y, dx, dy, head_width, head_length):
+        self.shapes.append(('arrow', arrowVertices(x, y, dx, dy, head_width, head_length), None, None))
+
+    def text(self, x, y, s, fontsize, rotation=0):
+        self.texts.append((x, y, s, fontsize, rotation))
+
+    def dataLimits(self):
+        # like matplotlib, texts do not count towards the data limits
+        xs, ys = [], []
+        for kind, geometry, _, _ in self.shapes:
+            if kind == 'circle':
+                (cx, cy), r = geometry
+                xs += [cx - r, cx + r]
+                ys += [cy - r, cy + r]
+            elif len(geometry):
+                xs += [geometry[:, 0].min(), geometry[:, 0].max()]
+                ys += [geometry[:, 1].min(), geometry[:, 1].max()]
+        if not xs:
+            return 0.0, 1.0, 0.0, 1.0
+        return min(xs), max(xs), min(ys), max(ys)
+
+    def layout(self):
+        """
+        Returns (width, height, transform) where transform maps data
+        coordinates to pixel coordinates the way axis('image') does: data
+        limits plus margins, equal aspect, axes box shrunk around the data
+        and centered.
+        """
+        width = int(round(FIGSIZE[0] * self.dpi))
+        height = int(round(FIGSIZE[1] * self.dpi))
+        left, bottom, right, top = AXES_BOX
+        box_width, box_height = (right - left) * width, (top - bottom) * height
+
+        xmin, xmax, ymin, ymax = self.dataLimits()
+        # matplotlib widens empty ranges the same way
+        if xmax - xmin == 0:
+            xmin, xmax = xmin - 0.05 * abs(xmin or 1), xmax + 0.05 * abs(xmax or 1)
+        if ymax - ymin == 0:
+            ymin, ymax = ymin - 0.05 * abs(ymin or 1), ymax + 0.05 * abs(ymax or 1)
+        # axes.xmargin / axes.ymargin
+        xmin, xmax = xmin - MARGIN * (xmax - xmin), xmax + MARGIN * (xmax - xmin)
+        ymin, ymax = ymin - MARGIN * (ymax - ymin), ymax + MARGIN * (ymax - ymin)
+
+        scale = min(box_width / (xmax - xmin), box_height / (ymax - ymin))
+        x0 = left * width + (box_width - (xmax - xmin) * scale) / 2
+        y0 = bottom * height + (box_height - (ymax - ymin) * scale) / 2
+
+        def transform(points):
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            px = x0 + (points[:, 0] - xmin) * scale - 0.5
+            py = height - (y0 + (points[:, 1] - ymin) * scale) - 0.5
+            return np.column_stack([px, py])
+
+        transform.scale = scale
+        return width, height, transform
+
+    def toImage(self):
+        width, height, transform = self.layout()
+        img = np.full((height, width), 255, dtype=np.uint8)
+        thickness = max(1, int(round(LINEWIDTH * self.dpi / 72)))
+
+        for kind, geometry, hatch, edgecolor in self.shapes:
+            color = COLORS.get(edgecolor, 0)
+            if kind == 'circle':
+                (cx, cy), r = geometry
+                center = tuple(_fixed(transform([(cx, cy)]))[0])
+                radius = int(round(r * transform.scale * 16))
+                if hatch:
+                    corners = np.array([center, center]) + [[-radius, -radius], [radius, radius]]
+                    mask, offset = _mask(img, corners)
+                    cv2.circle(mask, tuple(int(v) for v in np.array(center) - np.array(offset) * 16),
+                               radius, 255, -1, cv2.LINE_8, shift=4)
+                    drawHatch(img, mask, hatch, self.dpi, height, offset=offset)
+                cv2.circle(img, center, radius, color, thickness, cv2.LINE_AA, shift=4)
+                continue
+
+            if not len(geometry):
+                continue
+            pts = _fixed(transform(geometry))
+            if kind == 'arrow':
+                cv2.fillPoly(img, [pts], color, cv2.LINE_AA, shift=4)
+            elif hatch:
+                mask, offset = _mask(img, pts)
+                cv2.fillPoly(mask, [pts - np.array(offset, dtype=np.int32) * 16], 255, cv2.LINE_8, shift=4)
+                drawHatch(img, mask, hatch, self.dpi, height, offset=offset)
+            cv2.polylines(img, [pts], True, color, thickness, cv2.LINE_AA, shift=4)
+
+        for x, y, s, fontsize, rotation in self.texts:
+            (px, py), = transform([(x, y)])
+            drawText(img, px + 0.5, py + 0.5, s, fontsize * self.dpi / 72, rotation)
+
+        return img
+
+    def toRGBA(self, transparent=False):
+        img = self.toImage()
+        if not transparent:
+            return cv2.cvtColor(img, cv2.COLOR_GRAY2RGBA)
+        # black line art: darkness is coverage
+        rgba = np.zeros(img.shape + (4,), dtype=np.uint8)
+        rgba[..., 3] = 255 - img
+        return rgba
+
+class SvgCanvas(RasterCanvas):
+    backend = 'svg'
+
+    def toImage(self):
+        width, height, transform = self.layout()
+        stroke = svg.num(LINEWIDTH * self.dpi / 72)
+        body, defs, extents = [], {}, []
+
+        def toPixels(points):
+            # pixel centers are at .5 in SVG user space
+            return transform(points) + 0.5
+
+        for kind, geometry, hatch, edgecolor in self.shapes:
+            color = SVG_COLORS.get(edgecolor, edgecolor)
+            fill = color if kind == 'arrow' else 'none'
+            if hatch:
+                pattern_id, pattern = svg.hatchPattern(hatch, self.dpi, height)
+                defs[pattern_id] = pattern
+                fill = f'url(#{pattern_id})'
+            paint = f'fill="{fill}" stroke="{color}" stroke-width="{stroke}"'
+
+            if kind == 'circle':
+                (cx, cy), r = geometry
+                (px, py), = toPixels([(cx, cy)])
+                radius = r * transform.scale
+                body.append(f'<circle cx="{svg.num(px)}" cy="{svg.num(py)}" r="{svg.num(radius)}" {paint}/>')
+                extents.append(svg.extent([(px - radius, py - radius), (px + radius, py + radius)], LINEWIDTH * self.dpi / 144))
+                continue
+
+            if not len(geometry):
+                continue
+            pts = toPixels(geometry)
+            body.append(f'<polygon points="{svg.points(pts)}" {paint}/>')
+            extents.append(svg.extent(pts, LINEWIDTH * self.dpi / 144))
+
+        for x, y, s, fontsize, rotation in self.texts:
+            (px, py), = toPixels([(x, y)])
+            size = fontsize * self.dpi / 72
+            body.append(svg.text(px, py, s, size, rotation))
+            # the rasterized glyph gives the extent of the text
+            h, w = atlas.get(s, size, rotation).shape
+            extents.append((px - w / 2, py - h / 2, px + w / 2, py + h / 2))
+
+        bbox = None
+        if extents:
+            extents = np.array(extents)
+            bbox = (*extents[:, :2].min(axis=0), *extents[:, 2:].max(axis=0))
+        return svg.SvgImage(''.join(body), width, height, bbox=bbox, defs=defs, background=BACKGROUND)
+
+    def toRGBA(self, transparent=False):
+        img = self.toImage()
+        if transparent:
+            img.background = None
+        return img
+
+
+CANVASES = {
+    'raster': RasterCanvas,
+    'matplotlib': MatplotlibCanvas,
+    'svg': SvgCanvas,
+}
+
+# one pool per process, with idle canvases kept per thread
+canvasPool = CanvasPool()
+
+def _mask(img, points):
+    # an empty mask over the part of img covered by the fixed point points,
+    # and the position of its top left pixel in img
+    x0, y0 = np.maximum(points.min(axis=0) // 16 - 1, 0)
+    x1, y1 = np.minimum(points.max(axis=0) // 16 + 2, [img.shape[1], img.shape[0]])
+    return np.zeros((max(y1 - y0, 0), max(x1 - x0, 0)), dtype=np.uint8), (int(x0), int(y0))
+
+def _fixed(points):
+    # cv2 drawing functions take 1/16 pixel fixed point coordinates (shift=4)
+    return np.rint(points * 16).astype(np.int32)
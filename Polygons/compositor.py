@@ -0,0 +1,182 @@
+"""
+In-process replacements for the ImageMagick montage/convert steps.
+Every function takes and returns cv2 image objects (numpy arrays), or
+Polygons.svg.SvgImage objects for vector output.
+"""
+import math
+
+import cv2
+import numpy as np
+
+from Polygons import svg
+
+# ImageMagick's default -bordercolor (#DFDFDF)
+BORDER_COLOR = 223
+BACKGROUND_COLOR = 255
+
+"""
+Surrounds img with a solid border of the given size and color.
+Same as `convert img -bordercolor <color> -border <size>x<size>`.
+"""
+def addBorder(img, size, color=BORDER_COLOR):
+    if size <= 0:
+        return img
+    if isinstance(img, svg.SvgImage):
+        return svg.addBorder(img, size, color)
+    return cv2.copyMakeBorder(img, size, size, size, size, cv2.BORDER_CONSTANT, value=_pixelValue(img, color))
+
+"""
+Pads img with background on each side.
+x is the padding on the left and right, y on the top and bottom (defaults to x).
+"""
+def padImage(img, x, y=None, color=BACKGROUND_COLOR):
+    if y is None:
+        y = x
+    if x <= 0 and y <= 0:
+        return img
+    if isinstance(img, svg.SvgImage):
+        return svg.centerImage(img, img.width + 2 * x, img.height + 2 * y, color)
+    return cv2.copyMakeBorder(img, y, y, x, x, cv2.BORDER_CONSTANT, value=_pixelValue(img, color))
+
+"""
+Places img in the middle of a width x height background.
+"""
+def centerImage(img, width, height, color=BACKGROUND_COLOR):
+    if isinstance(img, svg.SvgImage):
+        return svg.centerImage(img, width, height, color)
+    h, w = img.shape[:2]
+    out = np.full((height, width) + img.shape[2:], color, dtype=img.dtype)
+    top = (height - h) // 2
+    left = (width - w) // 2
+    out[top:top + h, left:left + w] = img
+    return out
+
+"""
+Lays images out row by row, cols images per row.
+Works like `montage -mode concatenate -tile <cols>x -border <border> -geometry +<spacing>+<spacing>`:
+every image keeps its own size, gets a border and then spacing on each side,
+and is centered in the height of its row. Rows are centered in the widest row.
+"""
+def tile(images, cols, border=0, spacing=0, borderColor=BORDER_COLOR, background=BACKGROUND_COLOR):
+    if images and isinstance(images[0], svg.SvgImage):
+        return svg.tile(images, cols, border, spacing, borderColor, background)
+    cells = [padImage(addBorder(img, border, borderColor), spacing, color=background) for img in images]
+
+    rows = []
+    for start in range(0, len(cells), cols):
+        row = cells[start:start + cols]
+        height = max(cell.shape[0] for cell in row)
+        rows.append(np.hstack([centerImage(cell, cell.shape[1], height, background) for cell in row]))
+
+    width = max(row.shape[1] for row in rows)
+    return np.vstack([centerImage(row, width, row.shape[0], background) for row in rows])
+
+"""
+Packs images into one sheet with shelf packing: each image keeps its own
+size and goes right of the previous one, starting a new row below when it
+would make the row wider than width (by default the widest image or the side
+of a square of the same area, whichever is larger). spacing pixels of
+background separate the images, so that a client scaling one of them does
+not bleed its neighbours in.
+Returns the sheet and the (x, y, width, height) of each image in it.
+"""
+def pack(images, width=None, spacing=2, background=BACKGROUND_COLOR):
+    sizes = [(img.shape[1], img.shape[0]) for img in images]
+    if width is None:
+        area = sum((w + spacing) * (h + spacing) for w, h in sizes)
+        width = max(max(w for w, _ in sizes), math.ceil(math.sqrt(area)))
+
+    rects, x, y, rowHeight = [], 0, 0, 0
+    for w, h in sizes:
+        if x and x + w > width:
+            x, y, rowHeight = 0, y + rowHeight + spacing, 0
+        rects.append((x, y, w, h))
+        x += w + spacing
+        rowHeight = max(rowHeight, h)
+    sheetWidth = max(x + w for x, _, w, _ in rects)
+    sheetHeight = max(y + h for _, y, _, h in rects)
+
+    if isinstance(images[0], svg.SvgImage):
+        return svg.pack(images, rects, sheetWidth, sheetHeight, background), rects
+    # one channel layout for all, the richest of the images
+    channels = max(img.shape[2] if img.ndim == 3 else 1 for img in images)
+    sheet = np.full((sheetHeight, sheetWidth) + ((channels,) if channels > 1 else ()), background, dtype=np.uint8)
+    if channels == 4:
+        sheet[..., 3] = 255
+    for img, (x, y, w, h) in zip(images, rects):
+        sheet[y:y + h, x:x + w] = _withChannels(img, channels)
+    return sheet, rects
+
+"""
+Composites an RGBA image over a solid background and returns a single channel image.
+Same as `convert img -flatten` with a white background.
+Blends the gray level rather than each color, in 8-bit integers.
+"""
+def flatten(rgba, background=BACKGROUND_COLOR):
+    if isinstance(rgba, svg.SvgImage):
+        return svg.flatten(rgba, background)
+    rgba = np.ascontiguousarray(rgba)
+    alpha = cv2.extractChannel(rgba, 3)
+    ink = cv2.multiply(cv2.cvtColor(rgba, cv2.COLOR_RGBA2GRAY), alpha, scale=1 / 255)
+    paper = cv2.multiply(np.full_like(alpha, background), cv2.bitwise_not(alpha), scale=1 / 255)
+    return cv2.add(ink, paper)
+
+"""
+Mirrors img left to right. Same as `convert img -flop`.
+"""
+def mirror(img):
+    if isinstance(img, svg.SvgImage):
+        return svg.mirror(img)
+    return cv2.flip(img, 1)
+
+"""
+Composites the RGBA image top over the RGBA image bottom (Porter-Duff over).
+Same as PIL.Image.alpha_composite(bottom, top).
+Works on premultiplied 8-bit colors with cv2's saturating integer ops, so
+the colors of nearly transparent pixels are only approximate; flattened,
+the result is within a few gray levels of an exact composite.
+"""
+def alphaComposite(bottom, top):
+    if isinstance(bottom, svg.SvgImage):
+        return svg.composite(bottom, top)
+    uncovered = cv2.bitwise_not(cv2.extractChannel(np.ascontiguousarray(top), 3))
+    below = cv2.multiply(cv2.cvtColor(np.ascontiguousarray(bottom), cv2.COLOR_RGBA2mRGBA), cv2.merge([uncovered] * 4), scale=1 / 255)
+    over = cv2.add(cv2.cvtColor(np.ascontiguousarray(top), cv2.COLOR_RGBA2mRGBA), below)
+    return cv2.cvtColor(over, cv2.COLOR_mRGBA2RGBA)
+
+"""
+Draws a one pixel wide vertical dashed line at column x, in place.
+dash and gap are in pixels, like `-draw "stroke-dasharray <dash> <gap> line ..."`.
+"""
+def drawDashedLine(img, x, dash=5, gap=3, color=0):
+    if isinstance(img, svg.SvgImage):
+        return svg.drawDashedLine(img, x, dash, gap, color)
+    rows = np.arange(img.shape[0]) % (dash + gap) < dash
+    img[rows, x] = _pixelValue(img, color)
+    return img
+
+"""
+Fills the rectangle [x0, x1) x [y0, y1) with color, in place.
+"""
+def fillRect(img, x0, y0, x1, y1, color=BACKGROUND_COLOR):
+    if isinstance(img, svg.SvgImage):
+        return svg.fillRect(img, x0, y0, x1, y1, color)
+    if x1 > x0 and y1 > y0:
+        cv2.rectangle(img, (x0, y0), (x1 - 1, y1 - 1), _pixelValue(img, color), thickness=cv2.FILLED)
+    return img
+
+def _withChannels(img, channels):
+    have = img.shape[2] if img.ndim == 3 else 1
+    if have == channels:
+        return img
+    if have == 1:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA if channels == 4 else cv2.COLOR_GRAY2BGR)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+
+def _pixelValue(img, color):
+    # cv2 and numpy want one (opaque) value per channel
+    if img.ndim == 3 and img.shape[2] == 4:
+        return (color, color, color, 255)
+    if img.ndim == 3:
+        return (color,) * img.shape[2]
+    return color
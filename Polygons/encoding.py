@@ -0,0 +1,164 @@
+"""
+Final encoding stage for the generated images.
+
+The NVR figures are black line art on white with a few gray levels from
+anti-aliasing, hatches and borders, so they are written as palette PNGs:
+pixels are quantized to an evenly spaced gray ramp of 2, 4 or 16 levels and
+packed at 1, 2 or 4 bits per pixel. The zlib level is a parameter so that
+short-lived files can be written fast (PNG_COMPRESSION) and kept assets
+small (PNG_CACHE_COMPRESSION, see recompressPng). A lossless WebP
+copy can be written next to each PNG for clients that accept it.
+
+Every encode is counted, with its size and time, per format.
+"""
+import io
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+from PIL import Image
+
+# bits per pixel of the PNGs: 1, 2 or 4 for a gray palette, 8 for full grayscale
+PNG_BITS = int(os.getenv('PNG_BITS', 4))
+# zlib level of the generated PNGs, 1 (fast) to 9 (small); they are deleted
+# within minutes, so they are written fast
+PNG_COMPRESSION = int(os.getenv('PNG_COMPRESSION', 1))
+# zlib level of the copies the render cache keeps until they are evicted
+PNG_CACHE_COMPRESSION = int(os.getenv('PNG_CACHE_COMPRESSION', 9))
+# also write a lossless .webp next to each PNG
+WEBP_VARIANTS = os.getenv('WEBP_VARIANTS', 'False').lower() == 'true'
+# WebP effort, 0 (fast) to 6 (small)
+WEBP_METHOD = int(os.getenv('WEBP_METHOD', 4))
+
+PALETTE_BITS = (1, 2, 4)
+
+"""
+Maps a uint8 grayscale image to indices into an evenly spaced ramp of
+2 ** bits gray levels, rounding to the nearest level.
+"""
+def quantize(img, bits):
+    levels = (1 << bits) - 1
+    return ((img.astype(np.uint16) * levels + 127) // 255).astype(np.uint8)
+
+def grayRamp(bits):
+    levels = (1 << bits) - 1
+    return np.round(np.arange(levels + 1) * 255 / levels).astype(np.uint8)
+
+def toPil(img, bits):
+    if bits not in PALETTE_BITS:
+        return Image.fromarray(img)
+    # a palette of 2 ** bits entries makes PIL pack the pixels at that depth
+    pil = Image.fromarray(quantize(img, bits), 'P')
+    pil.putpalette(np.repeat(grayRamp(bits), 3).tobytes())
+    return pil
+
+"""
+Encodes a uint8 grayscale image as PNG bytes.
+"""
+def encodePng(img, bits=PNG_BITS, compression=PNG_COMPRESSION):
+    buffer = io.BytesIO()
+    toPil(img, bits).save(buffer, 'PNG', compress_level=compression)
+    return buffer.getvalue()
+
+"""
+Encodes a uint8 grayscale image as lossless WebP bytes, with the same gray
+levels as the PNG.
+"""
+def encodeWebp(img, bits=PNG_BITS, method=WEBP_METHOD):
+    if bits in PALETTE_BITS:
+        img = grayRamp(bits)[quantize(img, bits)]
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, 'WEBP', lossless=True, method=method)
+    return buffer.getvalue()
+
+def webpPath(path):
+    return os.path.splitext(path)[0] + '.webp'
+
+
+class EncodingStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.formats = {}
+
+    def record(self, format, size, seconds):
+        with self.lock:
+            entry = self.formats.setdefault(format, {'assets': 0, 'bytes': 0, 'seconds': 0.0})
+            entry['assets'] += 1
+            entry['bytes'] += size
+            entry['seconds'] += seconds
+
+    def stats(self):
+        with self.lock:
+            return {
+                format: {
+                    'assets': entry['assets'],
+                    'bytes': entry['bytes'],
+                    'bytes_per_asset': entry['bytes'] // entry['assets'],
+                    'encode_ms_per_asset': round(1000 * entry['seconds'] / entry['assets'], 3),
+                }
+                for format, entry in self.formats.items()
+            }
+
+    def clear(self):
+        with self.lock:
+            self.formats.clear()
+
+# one set of counters per process
+encodingStats = EncodingStats()
+
+"""
+Runs encode(), records its size and time under format and returns the bytes.
+"""
+"""
+Encodes PNG bytes again at another zlib level, with the same pixels, palette
+and bit depth.
+"""
+def recompressPng(data, compression):
+    buffer = io.BytesIO()
+    Image.open(io.BytesIO(data)).save(buffer, 'PNG', compress_level=compression)
+    return buffer.getvalue()
+
+def timed(format, encode, *args, **kwargs):
+    start = time.perf_counter()
+    data = encode(*args, **kwargs)
+    encodingStats.record(format, len(data), time.perf_counter() - start)
+    return data
+
+"""
+Encodes a grayscale image as PNG bytes and counts it. Arguments left as None
+take the module settings.
+"""
+def pngBytes(img, bits=None, compression=None):
+    bits = PNG_BITS if bits is None else bits
+    compression = PNG_COMPRESSION if compression is None else compression
+    return timed('png', encodePng, img, bits, compression)
+
+"""
+Writes data to path through a temporary file, so readers never see a
+partly written file.
+"""
+def writeFile(path, data):
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+"""
+Writes the other encodings of the PNG at path next to it: a .webp when webp
+(WEBP_VARIANTS by default) is set.
+"""
+def writeVariants(path, img, bits=None, webp=None):
+    if WEBP_VARIANTS if webp is None else webp:
+        bits = PNG_BITS if bits is None else bits
+        writeFile(webpPath(path), timed('webp', encodeWebp, img, bits))
+
+"""
+Writes a grayscale image to path as PNG, with its variants.
+"""
+def writeImage(path, img, bits=None, compression=None, webp=None):
+    # variants first, so a PNG that exists always has them
+    writeVariants(path, img, bits, webp)
+    writeFile(path, pngBytes(img, bits, compression))
+    return True
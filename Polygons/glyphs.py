@@ -0,0 +1,116 @@
+"""
+Glyph atlas for the raster canvas.
+
+Text on the NVR figures is a handful of symbols (dice faces, letters and
+signs like ★ and †) at a few sizes. Each one is laid out and rasterized with
+PIL once per process and kept as an anti-aliased coverage bitmap keyed by
+(symbol, pixel size, rotation bucket); drawing text is then a blit.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# rotations are rounded to this many degrees
+ROTATION_BUCKET = 5
+# most glyphs kept before the least recently used ones are dropped
+MAX_GLYPHS = int(os.getenv('GLYPH_ATLAS_SIZE', 2048))
+
+_fonts = {}
+
+def _font(size):
+    if size not in _fonts:
+        import matplotlib
+        path = os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf')
+        _fonts[size] = ImageFont.truetype(path, size)
+    return _fonts[size]
+
+"""
+Rasterizes s centered in a coverage bitmap (255 = ink), rotated by rotation degrees.
+"""
+def rasterize(s, size, rotation=0):
+    font = _font(size)
+    left, top, right, bottom = font.getbbox(s, anchor='mm')
+    pad = 2
+    mask = Image.new('L', (right - left + 2 * pad, bottom - top + 2 * pad), 0)
+    ImageDraw.Draw(mask).text((pad - left, pad - top), s, fill=255, font=font, anchor='mm')
+    if rotation:
+        mask = mask.rotate(rotation, resample=Image.BICUBIC, expand=True)
+    glyph = np.asarray(mask)
+    # shared between threads, never written to
+    glyph.setflags(write=False)
+    return glyph
+
+
+class GlyphAtlas:
+    def __init__(self, maxGlyphs=MAX_GLYPHS, rotationBucket=ROTATION_BUCKET):
+        self.maxGlyphs = maxGlyphs
+        self.rotationBucket = rotationBucket
+        self.glyphs = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, s, size, rotation=0):
+        bucket = int(round(rotation / self.rotationBucket)) * self.rotationBucket % 360
+        return s, max(1, int(round(size))), bucket
+
+    def get(self, s, size, rotation=0):
+        """
+        Returns the coverage bitmap of s at size pixels, rasterizing it on first use.
+        """
+        key = self.key(s, size, rotation)
+        with self.lock:
+            glyph = self.glyphs.get(key)
+            if glyph is not None:
+                self.glyphs.move_to_end(key)
+                self.hits += 1
+                return glyph
+            self.misses += 1
+
+        # two threads may rasterize the same glyph, the result is identical
+        glyph = rasterize(*key)
+        with self.lock:
+            self.glyphs[key] = glyph
+            while len(self.glyphs) > self.maxGlyphs:
+                self.glyphs.popitem(last=False)
+        return glyph
+
+    def stats(self):
+        with self.lock:
+            return {
+                'glyphs': len(self.glyphs),
+                'bytes': sum(glyph.nbytes for glyph in self.glyphs.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.glyphs.clear()
+            self.hits = self.misses = 0
+
+# one atlas per process
+atlas = GlyphAtlas()
+
+"""
+Draws s in black centered on the pixel position (x, y), rotated by rotation degrees.
+"""
+def drawText(img, x, y, s, size, rotation=0):
+    return blit(img, atlas.get(s, size, rotation), x, y)
+
+"""
+Darkens img with the coverage bitmap glyph centered on (x, y), clipped to img.
+"""
+def blit(img, glyph, x, y):
+    h, w = glyph.shape
+    top, left = int(round(y - h / 2)), int(round(x - w / 2))
+    y0, x0 = max(top, 0), max(left, 0)
+    y1, x1 = min(top + h, img.shape[0]), min(left + w, img.shape[1])
+    if y0 >= y1 or x0 >= x1:
+        return img
+    region = img[y0:y1, x0:x1]
+    np.minimum(region, 255 - glyph[y0 - top:y1 - top, x0 - left:x1 - left], out=region)
+    return img
@@ -0,0 +1,214 @@
+"""
+Hatch fills for the raster canvas.
+The patterns follow matplotlib.hatch: every pattern is periodic in a one inch
+cell anchored at the bottom left corner of the figure, with `density` lines
+(or rows of shapes) per cell for every repetition of the hatch character.
+
+Because of that each (hatch, dpi, density) is drawn once into a one inch
+tile and kept in a bounded texture cache; filling a shape copies the tile
+under the shape's mask, whatever the pattern.
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+HATCH_DENSITY = 6
+# hatch.linewidth in points
+HATCH_LINEWIDTH = 1.0
+# most tiles kept before the least recently used ones are dropped
+MAX_TEXTURES = int(os.getenv('HATCH_CACHE_SIZE', 64))
+
+# character -> (shape size relative to the row spacing, filled)
+SHAPES = {
+    'o': (0.2, False),
+    'O': (0.35, False),
+    '.': (0.1, True),
+    '*': (1.0 / 3.0, True),
+}
+
+"""
+Returns the vertices of a unit five pointed star, like Path.unit_regular_star(5).
+"""
+def unitStar(points=5, innerCircle=0.5):
+    theta = math.pi / points * np.arange(2 * points) + math.pi / 2
+    r = np.where(np.arange(2 * points) % 2 == 0, 1.0, innerCircle)
+    return np.column_stack([r * np.cos(theta), r * np.sin(theta)])
+
+
+class TextureCache:
+    def __init__(self, maxTextures=MAX_TEXTURES):
+        self.maxTextures = maxTextures
+        self.textures = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, hatch, dpi, color=0, density=HATCH_DENSITY):
+        """
+        Returns the one inch tile of the hatch, drawing it on first use.
+        Row 0 of the tile is the top of the cell that sits on the bottom edge of the figure.
+        """
+        key = (hatch, dpi, color, density)
+        with self.lock:
+            texture = self.textures.get(key)
+            if texture is not None:
+                self.textures.move_to_end(key)
+                self.hits += 1
+                return texture
+            self.misses += 1
+
+        # drawn with a margin so the line ends and anti-aliasing do not show at the seams
+        size, pad = int(round(dpi)), 8
+        layer = np.full((size + 2 * pad, size + 2 * pad), 255, dtype=np.uint8)
+        drawPattern(layer, hatch, dpi, -pad, -pad, size, color, density)
+        texture = np.ascontiguousarray(layer[pad:-pad, pad:-pad])
+        # shared between threads, never written to
+        texture.setflags(write=False)
+        with self.lock:
+            self.textures[key] = texture
+            while len(self.textures) > self.maxTextures:
+                self.textures.popitem(last=False)
+        return texture
+
+    def stats(self):
+        with self.lock:
+            return {
+                'textures': len(self.textures),
+                'bytes': sum(texture.nbytes for texture in self.textures.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.textures.clear()
+            self.hits = self.misses = 0
+
+# one cache per process
+textures = TextureCache()
+
+"""
+Fills the pixels of img where mask is set with the hatch pattern, in place.
+img is a single channel image; figure_height is the height of the whole
+figure in pixels so the pattern lines up with matplotlib's. mask may cover
+only part of img, with its top left pixel at offset (x, y) in img.
+"""
+def drawHatch(img, mask, hatch, dpi, figure_height, color=0, offset=(0, 0)):
+    x, y, w, h = cv2.boundingRect(mask)
+    if w == 0 or h == 0:
+        return img
+    mask = mask[y:y + h, x:x + w]
+    x, y = x + offset[0], y + offset[1]
+
+    if float(dpi).is_integer():
+        texture = textures.get(hatch, dpi, color)
+        size = texture.shape[0]
+        rows = (np.arange(y, y + h) - figure_height) % size
+        cols = np.arange(x, x + w) % size
+        layer = texture[np.ix_(rows, cols)]
+    else:
+        # the pattern only repeats on whole pixels for integer dpi
+        layer = np.full((h, w), 255, dtype=np.uint8)
+        drawPattern(layer, hatch, dpi, x, y, figure_height, color)
+
+    region = img[y:y + h, x:x + w]
+    inside = mask > 0
+    region[inside] = np.minimum(region[inside], layer[inside])
+    return img
+
+"""
+Returns the geometry of the hatch over the display rectangle x0..x1, y0..y1
+(pixels, y up, origin at the bottom left of the figure), extended a little
+past its edges: (segments, shapes) where segments is an (M, 2, 2) array of
+line end points and shapes a list of (char, radius, filled, centers) with
+centers an (K, 2) array.
+"""
+def hatchGeometry(hatch, dpi, x0, x1, y0, y1, density=HATCH_DENSITY):
+    segments = []
+
+    def lines(step, start, end, lo, hi, point):
+        c = np.arange(int(math.floor(lo / step)) - 1, int(math.ceil(hi / step)) + 2) * step
+        starts = np.column_stack(np.broadcast_arrays(*point(c, start)))
+        ends = np.column_stack(np.broadcast_arrays(*point(c, end)))
+        segments.append(np.stack([starts, ends], axis=1))
+
+    horizontal = (hatch.count('-') + hatch.count('+')) * density
+    if horizontal:
+        step = dpi / horizontal
+        lines(step, x0, x1, y0 - step / 2, y1 - step / 2, lambda c, t: (t, c + step / 2))
+
+    vertical = (hatch.count('|') + hatch.count('+')) * density
+    if vertical:
+        step = dpi / vertical
+        lines(step, y0, y1, x0 - step / 2, x1 - step / 2, lambda c, t: (c + step / 2, t))
+
+    # diagonals are spaced twice as far apart as the straight lines
+    north_east = (hatch.count('/') + hatch.count('x') + hatch.count('X')) * density
+    if north_east:
+        step = 2 * dpi / north_east
+        # x - y = c
+        lines(step, y0, y1, x0 - y1, x1 - y0, lambda c, t: (t + c, t))
+
+    south_east = (hatch.count('\\') + hatch.count('x') + hatch.count('X')) * density
+    if south_east:
+        step = 2 * dpi / south_east
+        # x + y = c
+        lines(step, y0, y1, x0 + y0, x1 + y1, lambda c, t: (c - t, t))
+
+    shapes = []
+    for char, (size, filled) in SHAPES.items():
+        rows = hatch.count(char) * density
+        if rows:
+            spacing = dpi / rows
+            shapes.append((char, spacing * size, filled, shapeCenters(spacing, x0, x1, y0, y1)))
+
+    segments = np.concatenate(segments) if segments else np.empty((0, 2, 2))
+    return segments, shapes
+
+def shapeCenters(spacing, x0, x1, y0, y1):
+    rows = np.arange(int(math.floor(y0 / spacing)) - 1, int(math.ceil(y1 / spacing)) + 2)
+    cols = np.arange(int(math.floor(x0 / spacing)) - 1, int(math.ceil(x1 / spacing)) + 2)
+    # odd rows are shifted by half a column
+    cx = (cols[None, :] * spacing + np.where(rows % 2, spacing / 2, 0)[:, None]).ravel()
+    cy = np.repeat(rows * spacing, len(cols))
+    return np.column_stack([cx, cy])
+
+"""
+Draws the hatch pattern on layer, which is the part of the figure whose top
+left pixel is (left, top).
+"""
+def drawPattern(layer, hatch, dpi, left, top, figure_height, color=0, density=HATCH_DENSITY):
+    height, width = layer.shape[:2]
+    thickness = max(1, int(round(HATCH_LINEWIDTH * dpi / 72)))
+
+    # display coordinates (y up) covered by the layer
+    x0, x1 = left, left + width
+    y0, y1 = figure_height - top - height, figure_height - top
+    segments, shapes = hatchGeometry(hatch, dpi, x0, x1, y0, y1, density)
+
+    def toLayer(points):
+        # display -> layer pixel coordinates, 1/16 pixel fixed point for cv2
+        px = points[..., 0] - left - 0.5
+        py = figure_height - points[..., 1] - top - 0.5
+        return np.rint(np.stack([px, py], axis=-1) * 16).astype(np.int32)
+
+    if len(segments):
+        cv2.polylines(layer, list(toLayer(segments)), False, color, thickness, cv2.LINE_AA, shift=4)
+
+    for char, radius, filled, centers in shapes:
+        centers = toLayer(centers)
+        if char == '*':
+            # display y points up, layer y points down
+            star = np.rint(unitStar() * [radius, -radius] * 16).astype(np.int32)
+            cv2.fillPoly(layer, list(centers[:, None, :] + star), color, cv2.LINE_AA, shift=4)
+            continue
+        r = int(round(radius * 16))
+        for center in centers:
+            cv2.circle(layer, (int(center[0]), int(center[1])), r, color,
+                       -1 if filled else thickness, cv2.LINE_AA, shift=4)
+
+    return layer
@@ -0,0 +1,242 @@
+"""
+Vector (SVG) images for the NVR generators.
+
+An SvgImage is SVG markup in pixel coordinates plus the viewport (viewBox)
+it shows at a given output size. It supports the same operations the
+generators use on raster images, without rasterizing anything:
+cropping and quadrants change the viewBox, resizing changes the output
+size, borders and montages wrap images in groups, and the fold helpers
+add a mirrored copy, a dashed line or a covering rectangle.
+"""
+import math
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from Polygons.hatching import HATCH_DENSITY, HATCH_LINEWIDTH, hatchGeometry, unitStar
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+FONT_FAMILY = 'DejaVu Sans, Verdana, sans-serif'
+
+"""
+Formats a coordinate compactly: two decimals at most, no trailing zeros.
+"""
+def num(value):
+    text = f'{value:.2f}'.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+def gray(value):
+    return '#%02x%02x%02x' % ((int(value),) * 3)
+
+def points(pts):
+    return ' '.join(f'{num(x)},{num(y)}' for x, y in pts)
+
+
+class SvgImage:
+    def __init__(self, body, width, height, viewBox=None, bbox=None, defs=None, background=None):
+        self.body = body
+        # output size in pixels
+        self.width = width
+        self.height = height
+        # (x, y, width, height) of the body coordinates that are shown
+        self.viewBox = viewBox or (0, 0, width, height)
+        # (x0, y0, x1, y1) extent of what was drawn, in body coordinates
+        self.bbox = bbox
+        # id -> markup of patterns used by the body
+        self.defs = dict(defs or {})
+        # gray level behind the body, None for transparent
+        self.background = background
+
+    @property
+    def shape(self):
+        # same as a single channel image of the output size
+        return (self.height, self.width)
+
+    def copy(self):
+        return SvgImage(self.body, self.width, self.height, self.viewBox, self.bbox, self.defs, self.background)
+
+    def element(self, x=0, y=0):
+        """
+        Returns the image as a nested <svg> placed at (x, y).
+        The nested viewport clips the body to the viewBox.
+        """
+        position = (f' x="{num(x)}"' if x else '') + (f' y="{num(y)}"' if y else '')
+        return f'<svg{position}{self.viewport()}>{self.backdrop()}{self.body}</svg>'
+
+    def toString(self):
+        defs = f'<defs>{"".join(self.defs.values())}</defs>' if self.defs else ''
+        return f'<svg xmlns="{SVG_NS}"{self.viewport()}>{defs}{self.backdrop()}{self.body}</svg>'
+
+    def viewport(self):
+        vx, vy, vw, vh = self.viewBox
+        return (f' width="{num(self.width)}" height="{num(self.height)}" '
+                f'viewBox="{num(vx)} {num(vy)} {num(vw)} {num(vh)}" preserveAspectRatio="none"')
+
+    def backdrop(self):
+        if self.background is None:
+            return ''
+        vx, vy, vw, vh = self.viewBox
+        return f'<rect x="{num(vx)}" y="{num(vy)}" width="{num(vw)}" height="{num(vh)}" fill="{gray(self.background)}"/>'
+
+    def toBytes(self):
+        return self.toString().encode('utf-8')
+
+"""
+Wraps img at (x, y) in a new width x height image whose body is built from
+prefix, the nested image and suffix.
+"""
+def wrap(img, width, height, x=0, y=0, prefix='', suffix='', background=None, defs=None):
+    merged = dict(img.defs)
+    merged.update(defs or {})
+    return SvgImage(prefix + img.element(x, y) + suffix, width, height, defs=merged, background=background)
+
+def crop(img):
+    # the viewport snaps to whole pixels, like cropping a raster image
+    if img.bbox is None:
+        return img
+    vx, vy, vw, vh = img.viewBox
+    x0, y0 = max(math.floor(img.bbox[0]), vx), max(math.floor(img.bbox[1]), vy)
+    x1, y1 = min(math.ceil(img.bbox[2]), vx + vw), min(math.ceil(img.bbox[3]), vy + vh)
+    if x1 <= x0 or y1 <= y0:
+        return img
+    out = img.copy()
+    out.viewBox = (x0, y0, x1 - x0, y1 - y0)
+    out.width, out.height = x1 - x0, y1 - y0
+    return out
+
+def resize(img, width, height):
+    out = img.copy()
+    out.width, out.height = width, height
+    return out
+
+"""
+Returns the part of img shown by the output pixels [x0, x1) x [y0, y1).
+"""
+def region(img, x0, y0, x1, y1):
+    vx, vy, vw, vh = img.viewBox
+    sx, sy = vw / img.width, vh / img.height
+    out = img.copy()
+    out.viewBox = (vx + x0 * sx, vy + y0 * sy, (x1 - x0) * sx, (y1 - y0) * sy)
+    out.width, out.height = x1 - x0, y1 - y0
+    out.bbox = None
+    return out
+
+def fillRect(img, x0, y0, x1, y1, color):
+    vx, vy, vw, vh = img.viewBox
+    sx, sy = vw / img.width, vh / img.height
+    img.body += (f'<rect x="{num(vx + x0 * sx)}" y="{num(vy + y0 * sy)}" '
+                 f'width="{num((x1 - x0) * sx)}" height="{num((y1 - y0) * sy)}" fill="{gray(color)}"/>')
+    return img
+
+def drawDashedLine(img, x, dash, gap, color):
+    # a one pixel wide line through the middle of output column x
+    vx, vy, vw, vh = img.viewBox
+    sx, sy = vw / img.width, vh / img.height
+    lx = num(vx + (x + 0.5) * sx)
+    img.body += (f'<line x1="{lx}" y1="{num(vy)}" x2="{lx}" y2="{num(vy + vh)}" stroke="{gray(color)}" '
+                 f'stroke-width="{num(sx)}" stroke-dasharray="{num(dash * sy)} {num(gap * sy)}"/>')
+    return img
+
+def mirror(img):
+    # left to right about the middle of the viewBox
+    vx, vy, vw, vh = img.viewBox
+    out = img.copy()
+    out.body = f'<g transform="matrix(-1 0 0 1 {num(2 * vx + vw)} 0)">{img.body}</g>'
+    if img.bbox is not None:
+        x0, y0, x1, y1 = img.bbox
+        out.bbox = (2 * vx + vw - x1, y0, 2 * vx + vw - x0, y1)
+    return out
+
+def composite(bottom, top):
+    # both drawn in the same coordinates, top over bottom
+    out = bottom.copy()
+    out.body = bottom.body + top.body
+    out.defs.update(top.defs)
+    if bottom.bbox is not None and top.bbox is not None:
+        out.bbox = (min(bottom.bbox[0], top.bbox[0]), min(bottom.bbox[1], top.bbox[1]),
+                    max(bottom.bbox[2], top.bbox[2]), max(bottom.bbox[3], top.bbox[3]))
+    return out
+
+def flatten(img, background):
+    out = img.copy()
+    out.background = background
+    return out
+
+def addBorder(img, size, color):
+    width, height = img.width + 2 * size, img.height + 2 * size
+    border = (f'<rect x="{num(size / 2)}" y="{num(size / 2)}" width="{num(img.width + size)}" '
+              f'height="{num(img.height + size)}" fill="none" stroke="{gray(color)}" stroke-width="{num(size)}"/>')
+    return wrap(img, width, height, size, size, prefix=border)
+
+def centerImage(img, width, height, color):
+    return wrap(img, width, height, (width - img.width) // 2, (height - img.height) // 2, background=color)
+
+"""
+Montage of images as groups, laid out like compositor.tile.
+"""
+def tile(images, cols, border, spacing, borderColor, background):
+    cell = 2 * (border + spacing)
+    rows = [images[start:start + cols] for start in range(0, len(images), cols)]
+    row_sizes = [(sum(img.width + cell for img in row), max(img.height + cell for img in row)) for row in rows]
+    width = max(row_width for row_width, _ in row_sizes)
+    height = sum(row_height for _, row_height in row_sizes)
+
+    groups, defs, top = [], {}, 0
+    for row, (row_width, row_height) in zip(rows, row_sizes):
+        left = (width - row_width) // 2
+        for img in row:
+            y = top + (row_height - img.height - cell) // 2
+            frame = ''
+            if border:
+                frame = (f'<rect x="{num(spacing + border / 2)}" y="{num(spacing + border / 2)}" '
+                         f'width="{num(img.width + border)}" height="{num(img.height + border)}" fill="none" '
+                         f'stroke="{gray(borderColor)}" stroke-width="{num(border)}"/>')
+            groups.append(f'<g transform="translate({num(left)} {num(y)})">{frame}'
+                          f'{img.element(spacing + border, spacing + border)}</g>')
+            defs.update(img.defs)
+            left += img.width + cell
+        top += row_height
+    return SvgImage(''.join(groups), width, height, defs=defs, background=background)
+
+def pack(images, rects, width, height, background):
+    groups, defs = [], {}
+    for img, (x, y, _, _) in zip(images, rects):
+        groups.append(img.element(x, y))
+        defs.update(img.defs)
+    return SvgImage(''.join(groups), width, height, defs=defs, background=background)
+
+"""
+Returns the <pattern> for a hatch in a figure of the given height, lined up
+with the raster hatches (one inch cells from the bottom left corner).
+"""
+def hatchPattern(hatch, dpi, figure_height, density=HATCH_DENSITY):
+    pattern_id = 'hatch-%s-%s-%s' % (num(dpi), num(figure_height % dpi), ''.join('%x' % ord(c) for c in hatch))
+    # the cell covering display y 0..dpi, drawn with y pointing down
+    segments, shapes = hatchGeometry(hatch, dpi, 0, dpi, 0, dpi, density)
+    width = num(HATCH_LINEWIDTH * dpi / 72)
+    parts = []
+    if len(segments):
+        path = ''.join(f'M{num(x0)} {num(dpi - y0)}L{num(x1)} {num(dpi - y1)}' for (x0, y0), (x1, y1) in segments)
+        parts.append(f'<path d="{path}" stroke="#000" stroke-width="{width}"/>')
+    for char, radius, filled, centers in shapes:
+        for cx, cy in centers:
+            if char == '*':
+                star = unitStar() * [radius, -radius] + [cx, dpi - cy]
+                parts.append(f'<polygon points="{points(star)}"/>')
+            elif filled:
+                parts.append(f'<circle cx="{num(cx)}" cy="{num(dpi - cy)}" r="{num(radius)}"/>')
+            else:
+                parts.append(f'<circle cx="{num(cx)}" cy="{num(dpi - cy)}" r="{num(radius)}" '
+                             f'fill="none" stroke="#000" stroke-width="{width}"/>')
+    pattern = (f'<pattern id="{pattern_id}" patternUnits="userSpaceOnUse" x="0" y="{num(figure_height % dpi)}" '
+               f'width="{num(dpi)}" height="{num(dpi)}">{"".join(parts)}</pattern>')
+    return pattern_id, pattern
+
+def text(x, y, s, size, rotation=0):
+    transform = f' transform="rotate({num(-rotation)} {num(x)} {num(y)})"' if rotation else ''
+    return (f'<text x="{num(x)}" y="{num(y)}" font-size="{num(size)}" font-family="{FONT_FAMILY}" '
+            f'text-anchor="middle" dominant-baseline="central"{transform}>{escape(s)}</text>')
+
+def extent(pts, margin=0):
+    pts = np.asarray(pts)
+    return (pts[:, 0].min() - margin, pts[:, 1].min() - margin, pts[:, 0].max() + margin, pts[:, 1].max() + margin)
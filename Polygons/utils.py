@@ -1,13 +1,62 @@
 """
 Methods related to processing the complete image as a whole
+Images are cv2 image objects, or Polygons.svg.SvgImage for vector output.
 """
 import cv2
 import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from Polygons import encoding, svg
+
+"""
+Creates a figure that is not registered with pyplot, on its own Agg canvas,
+with a single axes to draw on. Returns fig, ax.
+Nothing here touches pyplot's global state, so each thread can own its figures.
+"""
+def newFigure(dpi=None):
+    fig = Figure(dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    return fig, ax
+
+"""
+Draws a matplotlib figure on its Agg canvas and returns the RGBA buffer as a
+numpy array, without going through an encoded file.
+dpi overrides the figure dpi the same way savefig(dpi=...) does.
+transparent clears the figure and axes backgrounds like savefig(transparent=True).
+"""
+def figureToRGBA(fig, dpi=None, transparent=False):
+    if dpi is not None:
+        fig.set_dpi(dpi)
+    if transparent:
+        fig.patch.set_alpha(0)
+        for ax in fig.axes:
+            ax.patch.set_alpha(0)
+    fig.canvas.draw()
+    return np.array(fig.canvas.buffer_rgba())
+
+"""
+Same as figureToRGBA but returns a single channel image, matching what
+cv2.imread(path, 0) gives for a saved figure.
+"""
+def figureToImage(fig, dpi=None):
+    return cv2.cvtColor(figureToRGBA(fig, dpi=dpi), cv2.COLOR_RGBA2GRAY)
+
+"""
+Resizes a cv2 image object to width x height with Lanczos interpolation.
+"""
+def resizeImage(img, width, height):
+    if isinstance(img, svg.SvgImage):
+        return svg.resize(img, width, height)
+    return cv2.resize(img, (width, height), interpolation=cv2.INTER_LANCZOS4)
 
 """
 Takes cv2 image object. Returns the cropped image object.
 """
 def cropImage(img):
+    if isinstance(img, svg.SvgImage):
+        return svg.crop(img)
     # Invert colors so that OpenCV can find bounding rectangle
     img = invertColors(img)
     # Find bounding rectangles
@@ -42,6 +91,8 @@ def splitQuad(img, quad_number=0):
     # 0,1,2,3 => first_quad, second_quad, third_quad, fourth_quad
     quad_number = quad_number % 4
     height, width = img.shape  # Corrected order: height comes first, then width
+    if isinstance(img, svg.SvgImage):
+        return splitQuadSvg(img, quad_number, width, height)
     tmp_img = np.copy(img)
 
     if quad_number == 0:
@@ -57,6 +108,33 @@ def splitQuad(img, quad_number=0):
         tmp_img[height//2:height, width//2:width] = 255  # Use integer division
         return img[height//2:height, width//2:width], tmp_img
 
+def splitQuadSvg(img, quad_number, width, height):
+    # the same quadrants as above, as (x0, y0, x1, y1)
+    quads = [(width // 2, 0, width, height // 2), (0, 0, width // 2, height // 2),
+             (0, height // 2, width // 2, height), (width // 2, height // 2, width, height)]
+    x0, y0, x1, y1 = quads[quad_number]
+    rest = svg.fillRect(img.copy(), x0, y0, x1, y1, 255)
+    return svg.region(img, x0, y0, x1, y1), rest
+
+"""
+Encodes img as it is stored: PNG bytes for cv2 images, SVG markup for SVG images.
+compression overrides the PNG zlib level, e.g. fast for files that are deleted soon.
+"""
+def imageBytes(img, compression=None):
+    if isinstance(img, svg.SvgImage):
+        return encoding.timed('svg', img.toBytes)
+    return encoding.pngBytes(img, compression=compression)
+
+"""
+Writes img to path: cv2 images through the PNG encoding stage (palette PNG,
+optional WebP copy), SVG images as text. compression is as for imageBytes.
+"""
+def saveImage(path, img, compression=None):
+    if isinstance(img, svg.SvgImage):
+        encoding.writeFile(path, imageBytes(img))
+        return True
+    return encoding.writeImage(path, img, compression=compression)
+
 def apply(polys, func_names, params):
     assert len(polys) == len(func_names) and len(func_names) == len(params)
     for i in range(len(polys)):
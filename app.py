@@ -6,6 +6,12 @@ from flask_migrate import Migrate
 from routes import register_blueprints
 from models import db, bcrypt, jwt
 from utils.image_handlers import cleanup_static_folders, ensure_static_folders
+from utils.question_pool import question_pool
+from utils.render_pool import render_pool
+from utils.render_jobs import render_jobs
+from utils.render_cache import render_cache
+from utils.janitor import janitor
+from utils.blob_store import blob_store
 from config import Config
 import os
 
@@ -70,6 +76,21 @@ def create_app():
         with app.app_context():
             cleanup_static_folders()
 
+    # Delete generated images as they expire, including those left by the
+    # last run (before the question pool adds its own)
+    janitor.init_app(app)
+
+    # Keep generated images in memory if configured (before anything is generated)
+    blob_store.init_app(app)
+
+    # Start the render worker processes, then generate questions ahead of
+    # requests in them (after the cleanup above), and the render job threads
+    render_pool.init_app(app)
+    question_pool.init_app(app)
+    render_jobs.init_app(app)
+    # Read back the questions cached by earlier runs
+    render_cache.init_app(app)
+
     # Diagnostic route
     @app.route('/')
     def index():
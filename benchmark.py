@@ -0,0 +1,152 @@
+"""
+Times question generation with each render backend, copying polygons and
+the PNG/WebP encodings of the generated images.
+Run with: python benchmark.py [repeats]
+Generated images are written to a temporary directory.
+"""
+import contextlib
+import copy
+import glob
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import cv2
+
+import Polygons.canvas
+from Polygons import encoding
+from Polygons.canvas import BACKENDS, canvasPool
+from Polygons.glyphs import atlas
+from Polygons.hatching import textures
+from Polygons.Polygons import Polygon, Circumcircle
+from generateQuestionPaper import generate_question
+
+# one question number per generator (odd numbers are the difficult variants)
+GENERATORS = {
+    'cut': 1,
+    'fold': 5,
+    'dice': 3,
+    'figure_matrix': 7,
+    'grid': 9,
+    'series': 11,
+}
+
+
+def quietly(func, *args):
+    # the generators print every path they write
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def time_generator(question_num, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        quietly(generate_question, question_num)
+    return (time.perf_counter() - start) / repeats
+
+
+def unslotted(cls):
+    # the class as it was before __slots__: the same methods, with the
+    # attributes in a per-instance __dict__
+    namespace = {name: value for name, value in vars(cls).items() if name not in cls.__slots__ and name != '__slots__'}
+    return type(cls.__name__, (), namespace)
+
+# the dict-based polygons, copied with deepcopy, that clone() replaced
+DictPolygon = unslotted(Polygon)
+DictCircumcircle = unslotted(Circumcircle)
+
+
+def make_polygons(count, polygon=Polygon, circumcircle=Circumcircle):
+    polys = []
+    for i in range(count):
+        poly = polygon(no_of_sides=3 + i % 3, hatch=random.choice(Polygon.getHatches()))
+        poly.circumcircle = circumcircle(10, i, -i)
+        poly.makeShape()
+        polys.append(poly)
+    return polys
+
+
+def polygon_memory(count, polygon, circumcircle):
+    # bytes per polygon, with its circumcircle and points
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    polys = make_polygons(count, polygon, circumcircle)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(polys)
+
+
+def benchmark_polygons(count=1000):
+    # one Grid level is three polygons, copied once per distractor
+    dict_level = make_polygons(3, DictPolygon, DictCircumcircle)
+    level = make_polygons(3)
+    number = 2000
+    deepcopy_time = min(timeit.repeat(lambda: copy.deepcopy(dict_level), number=number, repeat=3)) / number
+    clone_time = min(timeit.repeat(lambda: [poly.clone() for poly in level], number=number, repeat=3)) / number
+    dict_memory = polygon_memory(count, DictPolygon, DictCircumcircle)
+    slots_memory = polygon_memory(count, Polygon, Circumcircle)
+
+    print(f"{'polygons':<34}{'dict+deepcopy':>14}{'slots+clone':>13}{'ratio':>8}")
+    print(f"{'copy a level of 3 (us)':<34}{deepcopy_time * 1e6:>14.1f}{clone_time * 1e6:>13.1f}"
+          f"{deepcopy_time / clone_time:>7.1f}x")
+    print(f"{'memory per polygon (bytes)':<34}{dict_memory:>14.0f}{slots_memory:>13.0f}"
+          f"{dict_memory / slots_memory:>7.2f}x")
+
+
+def benchmark_encoding():
+    # the written images again, at full 8-bit depth
+    encoding.PNG_BITS = 8
+    for question_num in GENERATORS.values():
+        quietly(generate_question, question_num)
+    encoding.PNG_BITS = int(os.getenv('PNG_BITS', 4))
+    # stored under their content hash in shard directories
+    images = [cv2.imread(path, 0) for path in glob.glob(os.path.join('static', 'result', '**', '*.png'), recursive=True)]
+    if not images:
+        print("no generated images to encode")
+        return
+
+    variants = [(f'png {bits}-bit level {level}', encoding.encodePng, {'bits': bits, 'compression': level})
+                for bits in (8, 4, 2, 1) for level in (1, 6, 9)]
+    variants.append(('webp 4-bit lossless', encoding.encodeWebp, {'bits': 4}))
+    print(f"{'encoding':<24}{'bytes/image':>12}{'ms/image':>10}")
+    for name, encode, kwargs in variants:
+        start = time.perf_counter()
+        size = sum(len(encode(img, **kwargs)) for img in images)
+        seconds = time.perf_counter() - start
+        print(f"{name:<24}{size // len(images):>12}{seconds * 1000 / len(images):>10.2f}")
+
+
+def main(repeats=5):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            # warm up imports, fonts and caches
+            for question_num in GENERATORS.values():
+                quietly(generate_question, question_num)
+
+            print(f"{'generator':<15}" + ''.join(f"{backend:>14}" for backend in BACKENDS) + f"{'speedup':>10}")
+            for name, question_num in GENERATORS.items():
+                timings = []
+                for backend in BACKENDS:
+                    Polygons.canvas.RENDER_BACKEND = backend
+                    timings.append(time_generator(question_num, repeats))
+                row = ''.join(f"{seconds * 1000:>12.1f}ms" for seconds in timings)
+                print(f"{name:<15}{row}{timings[1] / timings[0]:>9.1f}x")
+            print(f"canvas pool: {canvasPool.stats()}")
+            print(f"glyph atlas: {atlas.stats()}")
+            print(f"hatch textures: {textures.stats()}")
+            print(f"encoding: {encoding.encodingStats.stats()}")
+            benchmark_polygons()
+            benchmark_encoding()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
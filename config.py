@@ -46,3 +46,43 @@ class Config:
     
     # CORS settings - only allow your frontend domain in production
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*')
+
+    # Browser/CDN lifetime of generated images stored under their content hash (a year)
+    IMMUTABLE_MAX_AGE = int(os.getenv('IMMUTABLE_MAX_AGE', 31536000))
+    # Cache-Control of the other files under /api/static, by path prefix (the
+    # longest match wins); with no-cache browsers keep them but revalidate
+    # with their ETag, which costs a 304 when nothing changed
+    STATIC_CACHE_POLICIES = {
+        'data/': os.getenv('STATIC_DATA_CACHE_CONTROL', 'public, no-cache'),
+        '': 'no-cache',
+    }
+
+    # Worker processes that render questions (0 renders in the web process)
+    RENDER_PROCESSES = int(os.getenv('RENDER_PROCESSES', min(4, os.cpu_count() or 1)))
+    # Jobs a render worker runs before it is replaced by a fresh process
+    RENDER_MAX_JOBS = int(os.getenv('RENDER_MAX_JOBS', 100))
+    # Seconds a render may take, including waiting for a free worker
+    RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', 30))
+
+    # Most questions one /nvr or /spatial request may ask for with ?count=
+    QUESTION_BATCH_MAX = int(os.getenv('QUESTION_BATCH_MAX', 20))
+
+    # Memory for generated images served straight from the web process
+    # (0 writes them all to static/result); needs a single web process
+    BLOB_STORE_BYTES = int(os.getenv('BLOB_STORE_BYTES', 0))
+
+    # Disk space for questions of known seeds, kept to serve them again under
+    # static/cache (0 disables the cache); needs a single web process
+    RENDER_CACHE_BYTES = int(os.getenv('RENDER_CACHE_BYTES', 0))
+
+    # Render jobs (/jobs endpoints) waiting at most; more are refused with 503
+    RENDER_JOB_QUEUE_SIZE = int(os.getenv('RENDER_JOB_QUEUE_SIZE', 64))
+    # Threads running render jobs, one per render process by default
+    RENDER_JOB_WORKERS = int(os.getenv('RENDER_JOB_WORKERS', max(1, RENDER_PROCESSES)))
+    # Seconds a finished render job and its images are kept
+    RENDER_JOB_TTL = int(os.getenv('RENDER_JOB_TTL', 600))
+
+    # Ready NVR/spatial questions kept per question type (0 disables the pool)
+    QUESTION_POOL_DEPTH = int(os.getenv('QUESTION_POOL_DEPTH', 2))
+    # Background threads generating questions for the pool
+    QUESTION_POOL_WORKERS = int(os.getenv('QUESTION_POOL_WORKERS', 1))
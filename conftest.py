@@ -0,0 +1,28 @@
+"""
+Shared fixtures for the tests that go through the Flask app.
+Config reads the environment when it is imported, so render workers and the
+question pool are switched off here, before the app is; tests that need them
+start their own.
+"""
+import os
+
+os.environ.setdefault('RENDER_PROCESSES', '0')
+os.environ.setdefault('QUESTION_POOL_DEPTH', '0')
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def client(app, tmp_path, monkeypatch):
+    # questions are rendered under the test's own directory, and each is
+    # rendered afresh: cached seeds would point into another test's directory
+    from utils.render_cache import render_cache
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(render_cache, 'max_bytes', 0)
+    return app.test_client()
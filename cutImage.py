@@ -1,20 +1,26 @@
-from Polygons.Polygons import Polygon, plt
+from Polygons.Polygons import Polygon
 from Polygons.utils import cropImage, splitQuad
-import cv2
+from Polygons.canvas import newCanvas
+from utils.result_store import NamedStore
 import random
 import math
 import os
 
 class Cut:
-    def __init__(self, polyNum, questionCount):
+    def __init__(self, polyNum, questionCount, format='png', store=None, rng=None):
         self.polyNum = polyNum
         self.questionCount = questionCount
+        # png, or svg for vector images
+        self.format = format
+        self.backend = 'svg' if format == 'svg' else None
+        # the random number generator the question is drawn from (seeded by generate_question)
+        self.rng = rng or random.Random()
         self.optionNum = 3  # number of distractors
         self.question_path = ''
         self.answer_path = ''
         self.distractors = []
         self.distractors_path = []
-        self.quadrantNum = random.choice([0, 1, 2, 3])
+        self.quadrantNum = self.rng.choice([0, 1, 2, 3])
         self.STATIC_ROOT = os.path.join(os.getcwd(), "static")
         
         # Ensure required directories exist
@@ -22,67 +28,52 @@ class Cut:
         self.result_dir = os.path.join(self.STATIC_ROOT, 'result')
         os.makedirs(self.tmp_dir, exist_ok=True)
         os.makedirs(self.result_dir, exist_ok=True)
+        # where the images are written, by name unless a store is given
+        self.store = store or NamedStore(self.result_dir)
 
-    def distractor_sequence(self, A):
+    def distractor_sequence(self, A, canvas):
         seqs_of_polygons = [A]
         polys = []
         for j in range(self.polyNum):
-            B = Polygon(no_of_sides=random.choice([0, int(random.random() * 7) + 3]), isRegular='any', hatch=None)
+            B = Polygon(no_of_sides=self.rng.choice([0, int(self.rng.random() * 7) + 3]), isRegular='any', hatch=None)
             B.clone_circumcircle(A)
             B.circumcircle.x = B.circumcircle.x
             B.circumcircle.y = B.circumcircle.y
-            B.circumcircle.radius = random.choice([10, 20, 40, 50]) + B.circumcircle.radius
+            B.circumcircle.radius = self.rng.choice([10, 20, 40, 50]) + B.circumcircle.radius
             B.makeShape()
-            B.drawPolygon()
+            B.drawPolygon(canvas)
             seqs_of_polygons.append(B)
         self.distractors = seqs_of_polygons
 
     def generate_question_answer_pair(self):
-        plt.figure()
+        canvas = newCanvas(backend=self.backend)
         A = Polygon()
         A.makeRandomCircumcircle()
-        A.drawPolygon()
-        self.distractor_sequence(A)
-        plt.axis('image')
-        plt.axis('off')
-        question_tmpPath = os.path.join(self.tmp_dir, f'cut_question_{self.questionCount}.png')
-        plt.savefig(question_tmpPath)
-        img = cv2.imread(question_tmpPath, 0)
-        img = cropImage(img)
-        cv2.imwrite(question_tmpPath, img)
-        self.question_path = os.path.join(self.result_dir, f'cut_question_{self.questionCount}.png')
-        self.answer_path = os.path.join(self.result_dir, f'cut_answer_{self.questionCount}.png')
-        img = cv2.imread(question_tmpPath, 0)
+        A.drawPolygon(canvas)
+        self.distractor_sequence(A, canvas)
+        img = cropImage(canvas.toImage())
+        canvas.close()
         quad, rest_img = splitQuad(img, self.quadrantNum)
-        cv2.imwrite(self.answer_path, quad)
-        cv2.imwrite(self.question_path, rest_img)
-        plt.close()
+        self.answer_path = self.store.save(f'cut_answer_{self.questionCount}.{self.format}', quad)
+        self.question_path = self.store.save(f'cut_question_{self.questionCount}.{self.format}', rest_img)
 
     def genDistractors(self):
         for j in range(self.optionNum):
-            plt.figure()
+            canvas = newCanvas(backend=self.backend)
             for i in self.distractors:
-                choice = random.choice(['flip', 'rotate', 'swap'])
+                choice = self.rng.choice(['flip', 'rotate', 'swap'])
                 if choice == 'flip':
-                    i.flip(how=random.choice(['vert', 'hori']))
+                    i.flip(how=self.rng.choice(['vert', 'hori']))
                 elif choice == 'rotate':
-                    i.rotate(theta=random.choice([math.pi / 2, math.pi / 4, math.pi]))
+                    i.rotate(theta=self.rng.choice([math.pi / 2, math.pi / 4, math.pi]))
                 elif choice == 'swap':
-                    i.swap_polygons(random.choice(self.distractors))
-                i.drawPolygon()
-            plt.axis('image')
-            plt.axis('off')
-            distractor_tmpPath = os.path.join(self.tmp_dir, f'cut_question_{self.questionCount}_dist_{j}.png')
-            plt.savefig(distractor_tmpPath)
-            img = cv2.imread(distractor_tmpPath, 0)
-            img = cropImage(img)
-            cv2.imwrite(distractor_tmpPath, img)
-            img = cv2.imread(distractor_tmpPath, 0)
+                    i.swap_polygons(self.rng.choice(self.distractors))
+                i.drawPolygon(canvas)
+            img = cropImage(canvas.toImage())
+            canvas.close()
             quad, rest_img = splitQuad(img, self.quadrantNum)
-            distractor_finalPath = os.path.join(self.result_dir, f'cut_question_{self.questionCount}_dist_{j}.png')
-            cv2.imwrite(distractor_finalPath, quad)
+            distractor_finalPath = self.store.save(f'cut_question_{self.questionCount}_dist_{j}.{self.format}', quad)
             self.distractors_path.append(distractor_finalPath)
-            plt.close()
 
     def getQuestion(self):
         return self.question_path
@@ -2,9 +2,12 @@ import json
 import argparse
 import logging
 import os
-import matplotlib.pyplot as plt
+import matplotlib.patches as mpatches
 import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+from Polygons.encoding import PNG_COMPRESSION
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
@@ -12,7 +15,9 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 def setup_2d_figure(figsize=(8, 8)):
     """Create and configure a 2D matplotlib figure and axis."""
-    fig, ax = plt.subplots(figsize=figsize)
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
     ax.set_aspect('equal')
     ax.set_xticks([])
     ax.set_yticks([])
@@ -22,7 +27,8 @@ def setup_2d_figure(figsize=(8, 8)):
 
 def setup_3d_figure(figsize=(10, 8)):
     """Create and configure a 3D matplotlib figure and axis."""
-    fig = plt.figure(figsize=figsize)
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
     ax = fig.add_subplot(111, projection='3d')
     ax.grid(False)
     ax.set_axis_off()
@@ -37,7 +43,7 @@ def draw_regular_polygon(ax, center: tuple, radius: float, num_sides: int, **kwa
     angles = np.linspace(0, 2 * np.pi, num_sides, endpoint=False)
     vertices = np.column_stack((center[0] + radius * np.cos(angles),
                                 center[1] + radius * np.sin(angles)))
-    polygon = plt.Polygon(vertices, **kwargs)
+    polygon = mpatches.Polygon(vertices, **kwargs)
     ax.add_patch(polygon)
     return vertices
 
@@ -132,7 +138,7 @@ def draw_shape(shape_data: list, shape_id: int = None, output_folder="static/res
                 else:
                     rect_length = shape_info.get("width", 10)
                     rect_height = shape_info.get("height", 6)
-                rect = plt.Rectangle((1, 1), rect_length, rect_height, fill=False, edgecolor='black')
+                rect = mpatches.Rectangle((1, 1), rect_length, rect_height, fill=False, edgecolor='black')
                 ax.add_patch(rect)
                 ax.text(1 + rect_length / 2, 1 - 0.5, f"Length = {rect_length} cm", ha='center')
                 ax.text(1 - 0.5, 1 + rect_height / 2, f"Width = {rect_height} cm", va='center', rotation=90)
@@ -148,7 +154,7 @@ def draw_shape(shape_data: list, shape_id: int = None, output_folder="static/res
                     (1 + base + shear * height, 1 + height),
                     (1 + shear * height, 1 + height)
                 ])
-                ax.add_patch(plt.Polygon(vertices, fill=False, edgecolor='black'))
+                ax.add_patch(mpatches.Polygon(vertices, fill=False, edgecolor='black'))
                 ax.set_xlim(0, vertices[:, 0].max() + 1)
                 ax.set_ylim(0, vertices[:, 1].max() + 1)
             elif shape_type == "trapezoid":
@@ -162,7 +168,7 @@ def draw_shape(shape_data: list, shape_id: int = None, output_folder="static/res
                     (1 + width_val - offset, 1 + height_val),
                     (1 + offset, 1 + height_val)
                 ])
-                ax.add_patch(plt.Polygon(vertices, fill=False, edgecolor='black'))
+                ax.add_patch(mpatches.Polygon(vertices, fill=False, edgecolor='black'))
                 ax.set_xlim(0, width_val + 2)
                 ax.set_ylim(0, height_val + 2)
 
@@ -186,7 +192,7 @@ def draw_shape(shape_data: list, shape_id: int = None, output_folder="static/res
                         (1 + d1 * 0.75, 1 + d2)   # bottom vertex (offset from center)
                     ])
 
-                ax.add_patch(plt.Polygon(vertices, fill=False, edgecolor='black'))
+                ax.add_patch(mpatches.Polygon(vertices, fill=False, edgecolor='black'))
                 ax.set_xlim(0, vertices[:, 0].max() + 1)
                 ax.set_ylim(0, vertices[:, 1].max() + 1)
 
@@ -216,7 +222,7 @@ def draw_shape(shape_data: list, shape_id: int = None, output_folder="static/res
                     (1 + base, 1),
                     (1 + base / 3, 1 + height_val)
                 ])
-            ax.add_patch(plt.Polygon(vertices, fill=False, edgecolor='black'))
+            ax.add_patch(mpatches.Polygon(vertices, fill=False, edgecolor='black'))
             ax.set_xlim(0, base + 2)
             ax.set_ylim(0, height_val + 2)
 
@@ -343,8 +349,7 @@ def draw_shape(shape_data: list, shape_id: int = None, output_folder="static/res
 
         if fig:
             filepath = os.path.join(output_folder, f"{current_id}.png")
-            plt.savefig(filepath, bbox_inches="tight", dpi=300)
-            plt.close(fig)
+            fig.savefig(filepath, bbox_inches="tight", dpi=300, pil_kwargs={"compress_level": PNG_COMPRESSION})
 
 
 def main():
@@ -1,10 +1,11 @@
-from Polygons.Polygons import Polygon, plt, Circumcircle
+from Polygons.Polygons import Polygon, Circumcircle
 from Polygons.utils import cropImage
+from Polygons.canvas import newCanvas
+from utils.result_store import NamedStore
+from Polygons.compositor import tile
 import math
-import copy
 import os
 import random
-import cv2
 
 gridSize = 25
 radius = 10
@@ -12,34 +13,28 @@ startX = 0
 startY = 0
 
 def shift_polys(polys, pos_by=1, hatch_by=1):
-    tmep_polys = copy.deepcopy(polys)
+    tmep_polys = [poly.clone() for poly in polys]
 
-def draw_grid():
+def draw_grid(canvas):
     # This is to get a border so that while cropping, we do not crop the whitespaces we want to show.
-    plt.gca().add_patch(
-        plt.Rectangle(
-            (-gridSize / 2, -gridSize * 3 + gridSize / 2),   # (x,y)
-            gridSize * 3,          # width
-            gridSize * 3,          # height
-            fill=None,
-            edgecolor='black'  # Added edge color for better visibility
-        )
+    canvas.rectangle(
+        (-gridSize / 2, -gridSize * 3 + gridSize / 2),   # (x,y)
+        gridSize * 3,          # width
+        gridSize * 3,          # height
+        edgecolor='black'  # Added edge color for better visibility
     )
 
     # draw boxes grid
     for i in range(3):
         for j in range(3):
-            plt.gca().add_patch(
-                plt.Rectangle(
-                    (-gridSize / 2 + gridSize * i, -gridSize * (j + 1) + gridSize / 2),   # (x,y)
-                    gridSize,          # width
-                    gridSize,          # height
-                    fill=None,
-                    edgecolor='blue'
-                )
+            canvas.rectangle(
+                (-gridSize / 2 + gridSize * i, -gridSize * (j + 1) + gridSize / 2),   # (x,y)
+                gridSize,          # width
+                gridSize,          # height
+                edgecolor='blue'
             )
 
-def draw_polygon_grid(poly, index):
+def draw_polygon_grid(poly, index, canvas):
     # The incoming index is 1 to 9
     # Assigns the figure an appropriate circumcircle
     index -= 1  # Convert to 0-based index
@@ -53,54 +48,55 @@ def draw_polygon_grid(poly, index):
     # Assign the circumcircle with the correct center
     poly.circumcircle = Circumcircle(radius, center_x, center_y)
     poly.makeShape()
-    poly.drawPolygon()
+    poly.drawPolygon(canvas)
 
 class FigureMatrixAndSequence:
-    def __init__(self, questionCount):
+    def __init__(self, questionCount, format='png', store=None, rng=None):
         self.questionCount = questionCount
+        # png, or svg for vector images
+        self.format = format
+        self.backend = 'svg' if format == 'svg' else None
+        # the random number generator the question is drawn from (seeded by generate_question)
+        self.rng = rng or random.Random()
         self.question_path = ''
         self.answer_path = ''
         self.distractors_path = []
         self.STATIC_ROOT = os.path.join(os.getcwd(), "static")
-        self.logic_choice = random.random()
+        self.logic_choice = self.rng.random()
         
         # Ensure required directories exist
         self.tmp_dir = os.path.join(self.STATIC_ROOT, 'tmp')
         self.result_dir = os.path.join(self.STATIC_ROOT, 'result')
         os.makedirs(self.tmp_dir, exist_ok=True)
         os.makedirs(self.result_dir, exist_ok=True)
+        # where the images are written, by name unless a store is given
+        self.store = store or NamedStore(self.result_dir)
 
     def generate_all_images(self):
+        question_parts = []
         if self.logic_choice < 0.5:
-            plt.figure()
-            draw_grid()
+            canvas = newCanvas(dpi=150, backend=self.backend)
+            draw_grid(canvas)
             polys = []
             XX = 0
 
             rank = list(range(1, 10))
-            random.shuffle(rank)
+            self.rng.shuffle(rank)
             for i in rank:
-                temp = Polygon(no_of_sides=int(random.random() * 6),
+                temp = Polygon(no_of_sides=int(self.rng.random() * 6),
                                isRegular=False, hatch='random')
-                draw_polygon_grid(temp, i)
+                draw_polygon_grid(temp, i, canvas)
                 polys.append(temp)
                 XX += 1
 
             # question
-            plt.axis('image')
-            plt.axis('off')
-            question_tmpPath = os.path.join(self.tmp_dir, f'figureMatrix_question_{self.questionCount}_part_0.png')
-
-            plt.savefig(question_tmpPath, dpi=150)
-            img = cv2.imread(question_tmpPath, 0)
-            img = cropImage(img)
-            cv2.imwrite(question_tmpPath, img)
-            plt.close()
+            question_parts.append(cropImage(canvas.toImage()))
+            canvas.close()
 
             # generates remaining 4 parts for question
             for i in range(1, 9):
-                plt.figure()
-                draw_grid()
+                canvas = newCanvas(dpi=150, backend=self.backend)
+                draw_grid(canvas)
 
                 # shift polygons by one position
                 temp_circumcircle = polys[0].circumcircle
@@ -111,59 +107,44 @@ class FigureMatrixAndSequence:
 
                 for k in range(len(polys)):
                     polys[k].gen_points()
-                    polys[k].drawPolygon()
+                    polys[k].drawPolygon(canvas)
 
-                plt.axis('image')
-                plt.axis('off')
+                img = cropImage(canvas.toImage())
+                canvas.close()
                 if i in [1, 2, 3, 4]:
-                    question_tmpPath = os.path.join(self.tmp_dir, f'figureMatrix_question_{self.questionCount}_part_{i}.png')
+                    question_parts.append(img)
                 elif i == 5:
-                    question_tmpPath = os.path.join(self.result_dir, f'figureMatrix_answer_{self.questionCount}.png')
-                    self.answer_path = question_tmpPath
+                    self.answer_path = self.store.save(f'figureMatrix_answer_{self.questionCount}.{self.format}', img)
                 else:
-                    question_tmpPath = os.path.join(self.result_dir, f'figureMatrix_question_{self.questionCount}_dist_{i - 6}.png')
-                    self.distractors_path.append(question_tmpPath)
-
-                plt.savefig(question_tmpPath, dpi=150)
-
-                img = cv2.imread(question_tmpPath, 0)
-                img = cropImage(img)
-                cv2.imwrite(question_tmpPath, img)
-                plt.close()
+                    distractor_path = self.store.save(f'figureMatrix_question_{self.questionCount}_dist_{i - 6}.{self.format}', img)
+                    self.distractors_path.append(distractor_path)
 
         else:
-            plt.figure()
-            draw_grid()
+            canvas = newCanvas(dpi=150, backend=self.backend)
+            draw_grid(canvas)
             polys = []
             XX = 0
 
             rank = list(range(1, 10))
-            random.shuffle(rank)
+            self.rng.shuffle(rank)
             hatches = ['-', '+', 'x', '\\', '*', 'o', 'O', '.', '/', '|']
-            random.shuffle(hatches)
+            self.rng.shuffle(hatches)
 
             for i in rank:
-                temp = Polygon(no_of_sides=int(random.random() * 6) + 3,
+                temp = Polygon(no_of_sides=int(self.rng.random() * 6) + 3,
                                isRegular=False, hatch=hatches[i % 10])
-                draw_polygon_grid(temp, i)
+                draw_polygon_grid(temp, i, canvas)
                 polys.append(temp)
                 XX += 1
 
             # question
-            plt.axis('image')
-            plt.axis('off')
-            question_tmpPath = os.path.join(self.tmp_dir, f'figureMatrix_question_{self.questionCount}_part_0.png')
-
-            plt.savefig(question_tmpPath, dpi=150)
-            img = cv2.imread(question_tmpPath, 0)
-            img = cropImage(img)
-            cv2.imwrite(question_tmpPath, img)
-            plt.close()
+            question_parts.append(cropImage(canvas.toImage()))
+            canvas.close()
 
             # generates remaining 4 parts for question
             for i in range(1, 9):
-                plt.figure()
-                draw_grid()
+                canvas = newCanvas(dpi=150, backend=self.backend)
+                draw_grid(canvas)
 
                 # shift polygons by one position
                 temp_circumcircle = polys[0].circumcircle
@@ -174,28 +155,19 @@ class FigureMatrixAndSequence:
 
                 for k in range(len(polys)):
                     polys[k].gen_points()
-                    polys[k].drawPolygon()
+                    polys[k].drawPolygon(canvas)
 
-                plt.axis('image')
-                plt.axis('off')
+                img = cropImage(canvas.toImage())
+                canvas.close()
                 if i in [1, 2, 3, 4]:
-                    question_tmpPath = os.path.join(self.tmp_dir, f'figureMatrix_question_{self.questionCount}_part_{i}.png')
+                    question_parts.append(img)
                 elif i == 5:
-                    question_tmpPath = os.path.join(self.result_dir, f'figureMatrix_answer_{self.questionCount}.png')
-                    self.answer_path = question_tmpPath
+                    self.answer_path = self.store.save(f'figureMatrix_answer_{self.questionCount}.{self.format}', img)
                 else:
-                    question_tmpPath = os.path.join(self.result_dir, f'figureMatrix_question_{self.questionCount}_dist_{i - 6}.png')
-                    self.distractors_path.append(question_tmpPath)
-
-                plt.savefig(question_tmpPath, dpi=150)
-
-                img = cv2.imread(question_tmpPath, 0)
-                img = cropImage(img)
-                cv2.imwrite(question_tmpPath, img)
-                plt.close()
+                    distractor_path = self.store.save(f'figureMatrix_question_{self.questionCount}_dist_{i - 6}.{self.format}', img)
+                    self.distractors_path.append(distractor_path)
 
-        self.question_path = os.path.join(self.result_dir, f'figureMatrix_question_{self.questionCount}.png')
-        os.system('montage -mode concatenate -tile 5x1 -border 5 ' + os.path.join(self.tmp_dir, f'figureMatrix_question_{self.questionCount}_part_[0-4].png') + ' ' + self.question_path)
+        self.question_path = self.store.save(f'figureMatrix_question_{self.questionCount}.{self.format}', tile(question_parts, cols=5, border=5))
 
     def get_question(self):
         return self.question_path
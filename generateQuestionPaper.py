@@ -4,15 +4,40 @@ from figureMatrixAndSequence import FigureMatrixAndSequence
 from fold import Fold
 from grid import Grid
 from series import Series
+import contextlib
 import os
+import random
+from Polygons.Polygons import useRng
 from utils.image_handlers import ensure_static_folders
+from utils.blob_store import BlobCollector
+from utils.result_store import result_store
+from utils.sprite_sheet import SpriteSheet
+from utils.workspace import Workspace
 
-def generate_question(question_num):
+# image formats the generators can write
+IMAGE_FORMATS = ('png', 'svg')
+
+# seeds drawn for questions generated without one
+SEED_RANGE = 2 ** 32
+
+def generate_question(question_num, format='png', store=None, seed=None, sprite=False):
     '''
     by default:
     even questions are easy, odd questions are difficult
     2 questions - 1 easy, 1 difficult per question type
+    format is png, or svg for vector images
+    images are saved under the hash of their content unless another store is given,
+    through a scratch workspace of their own (a BlobCollector keeps them in memory
+    instead, with no workspace)
+    the same seed and question number always give the same images; a random
+    seed is drawn when none is given, and returned in the question data
+    with sprite, the images are packed into one sheet that is encoded and
+    stored once: question, answer and distractors all give its path, and
+    rects the [x, y, width, height] of each of them in it
     '''
+    if format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format {format!r}, expected one of {IMAGE_FORMATS}")
+
     # Ensure all required directories exist
     ensure_static_folders()
     
@@ -21,14 +46,46 @@ def generate_question(question_num):
 
     # Ensure the result directory exists
     os.makedirs(result_dir, exist_ok=True)
+    if store is None:
+        store = result_store
+
+    if seed is None:
+        seed = random.randrange(SEED_RANGE)
+    # the generator and its polygons draw from one random number generator of their own
+    rng = random.Random(seed)
+
+    # a private scratch directory per generation, published atomically
+    workspace = contextlib.nullcontext(store) if isinstance(store, BlobCollector) else Workspace(store)
+    with workspace as target, useRng(rng):
+        if not sprite:
+            question_data = generate_images(question_num, format, target, static_dir, rng)
+        else:
+            sheet = SpriteSheet(static_dir)
+            question_data = generate_images(question_num, format, sheet, static_dir, rng)
+            pack_sheet(question_data[str(question_num)], sheet, target)
+    question_data[str(question_num)]['seed'] = seed
+    return question_data
+
+def pack_sheet(question_info, sheet, store):
+    # points the question's images at their sprite sheet
+    paths = [question_info['question'], question_info['answer'], *question_info['distractors']]
+    sheet_path, rects = sheet.pack(store, paths)
+    question_info['question'] = question_info['answer'] = sheet_path
+    question_info['distractors'] = [sheet_path] * len(question_info['distractors'])
+    question_info['rects'] = {'question': rects[0], 'answer': rects[1], 'distractors': rects[2:]}
 
+def generate_images(question_num, format, store, static_dir, rng=None):
+    """
+    Runs the generator of question_num, saving its images to store.
+    Returns the question data with image paths relative to static_dir.
+    """
     # cut
     if question_num in [1, 2]:
         if question_num % 2 == 0:
             polygon_num = 4
         else:
             polygon_num = 2
-        c = Cut(polygon_num, question_num)
+        c = Cut(polygon_num, question_num, format=format, store=store, rng=rng)
         c.generate_question_answer_pair()
         question_filepath = os.path.relpath(c.getQuestion(), static_dir)
         answer_filepath = os.path.relpath(c.getAnswer(), static_dir)
@@ -50,7 +107,7 @@ def generate_question(question_num):
 
     # dice
     elif question_num in [3, 4]:
-        d = Dice(question_num)
+        d = Dice(question_num, format=format, store=store, rng=rng)
         d.generate_question()
         question_filepath = os.path.relpath(d.getQuestion(), static_dir)
         d.generate_answer()
@@ -73,7 +130,7 @@ def generate_question(question_num):
 
     # fold
     elif question_num in [5, 6]:
-        f = Fold(question_num)
+        f = Fold(question_num, format=format, store=store, rng=rng)
         f.generate_all_images()
         question_filepath = os.path.relpath(f.get_question(), static_dir)
         answer_filepath = os.path.relpath(f.get_answer(), static_dir)
@@ -94,7 +151,7 @@ def generate_question(question_num):
 
     # figure matrix and sequence
     elif question_num in [7, 8]:
-        f = FigureMatrixAndSequence(question_num)
+        f = FigureMatrixAndSequence(question_num, format=format, store=store, rng=rng)
         f.generate_all_images()
         question_filepath = os.path.relpath(f.get_question(), static_dir)
         answer_filepath = os.path.relpath(f.get_answer(), static_dir)
@@ -115,7 +172,7 @@ def generate_question(question_num):
 
     # grid
     elif question_num in [9, 10]:
-        g = Grid(question_num)
+        g = Grid(question_num, format=format, store=store, rng=rng)
         g.generate_all_images()
         question_filepath = os.path.relpath(g.get_question(), static_dir)
         answer_filepath = os.path.relpath(g.get_answer(), static_dir)
@@ -136,7 +193,7 @@ def generate_question(question_num):
 
     # series
     elif question_num in [11, 12]:
-        s = Series(question_num)
+        s = Series(question_num, format=format, store=store, rng=rng)
         s.generate_all_images()
         question_filepath = os.path.relpath(s.get_question(), static_dir)
         answer_filepath = os.path.relpath(s.get_answer(), static_dir)
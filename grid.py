@@ -1,17 +1,20 @@
-from Polygons.Polygons import Polygon, plt, Circumcircle
-from Polygons.utils import cropImage
+from Polygons.Polygons import Polygon, Circumcircle
+from Polygons.utils import cropImage, resizeImage
+from Polygons.canvas import newCanvas
+from utils.result_store import NamedStore
+from Polygons.compositor import tile
 import math
-import copy
 import os
 import random
-import cv2
-import PIL.Image as IMG
 import matplotlib.path as mpath
 import matplotlib.patches as mpatches
 
 class Grid:
-    def __init__(self, questionCount):
+    def __init__(self, questionCount, format='png', store=None, rng=None):
         self.questionCount = questionCount
+        # png, or svg for vector images
+        self.format = format
+        self.backend = 'svg' if format == 'svg' else None
         self.lenSequence = 3
         self.numPolygons = 3
         self.question_path = ''
@@ -24,12 +27,17 @@ class Grid:
         self.result_dir = os.path.join(self.STATIC_ROOT, 'result')
         os.makedirs(self.tmp_dir, exist_ok=True)
         os.makedirs(self.result_dir, exist_ok=True)
+        # where the images are written, by name unless a store is given
+        self.store = store or NamedStore(self.result_dir)
+        # the random number generator the question is drawn from (seeded by generate_question)
+        self.rng = rng or random.Random()
 
     def generate_all_images(self):
         dist_root_seq_of_polygons = []
+        level_montages = []
         for l in range(self.lenSequence):
             # Cleans canvas starts a new figure
-            plt.figure()
+            canvas = newCanvas(backend=self.backend)
 
             # Make a random polygon (the outer most Polygon)
             A = Polygon()
@@ -40,7 +48,7 @@ class Grid:
             seqs_of_polygons = []
             for j in range(self.numPolygons):
                 # any number of sides
-                B = Polygon(no_of_sides=int(random.random() * 3) + 3)
+                B = Polygon(no_of_sides=int(self.rng.random() * 3) + 3)
                 # same center and radius
                 B.clone_circumcircle(A)
                 # Center remains same as A but the radius can be anything less than A's radius
@@ -48,26 +56,16 @@ class Grid:
                 # make the sides
                 B.makeShape()
                 # draw the polygon on the canvas
-                B.drawPolygon()
+                B.drawPolygon(canvas)
                 seqs_of_polygons.append(B)
                 A.circumcircle.radius = B.circumcircle.radius
 
-            plt.axis('image')
-            plt.axis('off')
-            question_base_path = os.path.join(self.tmp_dir, f'grid_question_{self.questionCount}_{l}_0.png')
-            plt.savefig(question_base_path)
-            plt.close()
-
-            img = cv2.imread(question_base_path, 0)
-            img = cropImage(img)
-            cv2.imwrite(question_base_path, img)
-
-            img = IMG.open(question_base_path)
-            img = img.resize((300, 300), IMG.LANCZOS)
-            img.save(question_base_path, quality=90)
+            img = resizeImage(cropImage(canvas.toImage()), 300, 300)
+            canvas.close()
+            level_images = [img]
 
             for level in [1, 2]:
-                plt.figure()
+                canvas = newCanvas(backend=self.backend)
                 # transformations for each embedded polygon
                 # TODO: shuffle order and rules to generate distractors
                 for i in range(len(seqs_of_polygons)):
@@ -78,37 +76,30 @@ class Grid:
                     elif i == 2:
                         seqs_of_polygons[i].rotate(math.pi * 0.75)  # 270 degrees
 
-                    seqs_of_polygons[i].drawPolygon()
+                    seqs_of_polygons[i].drawPolygon(canvas)
 
                 if l == 2 and level == 1:
-                    dist_root_seq_of_polygons = copy.deepcopy(seqs_of_polygons)
+                    dist_root_seq_of_polygons = [poly.clone() for poly in seqs_of_polygons]
 
-                plt.axis('image')
-                plt.axis('off')
-                question_transform_path = os.path.join(self.tmp_dir, f'grid_question_{self.questionCount}_{l}_{level}.png')
-                plt.savefig(question_transform_path)
-                plt.close()
+                img = resizeImage(cropImage(canvas.toImage()), 300, 300)
+                canvas.close()
 
-                img = cv2.imread(question_transform_path, 0)
-                img = cropImage(img)
-                cv2.imwrite(question_transform_path, img)
-                img = IMG.open(question_transform_path)
-                img = img.resize((300, 300), IMG.LANCZOS)
-                img.save(question_transform_path, quality=90)
+                if l == 2 and level == 2:
+                    # the last transformation of the last level is the answer
+                    self.answer_path = self.store.save(f'grid_answer_{self.questionCount}.{self.format}', img)
+                else:
+                    level_images.append(img)
 
-            level_montage_path = os.path.join(self.tmp_dir, f'grid_question_{self.questionCount}_level_{l}_final.png')
+            level_montages.append(tile(level_images, cols=3, border=2, spacing=1))
 
             if l == 2:
-                self.answer_path = os.path.join(self.result_dir, f'grid_answer_{self.questionCount}.png')
-                os.system("cp " + os.path.join(self.tmp_dir, f'grid_question_{self.questionCount}_2_2.png') + ' ' + self.answer_path)
-                os.system("montage -mode concatenate -border 2 " + os.path.join(self.tmp_dir, f'grid_question_{self.questionCount}_{l}_[0-1].png') + " -tile 3x1 -geometry +1+1 " + level_montage_path)
 
                 # generate distractors
                 for dist in range(3):
                     # create copy of level 2 part 1 question - from which answer is generated
-                    dist_seq_of_polygons = copy.deepcopy(dist_root_seq_of_polygons)
+                    dist_seq_of_polygons = [poly.clone() for poly in dist_root_seq_of_polygons]
 
-                    plt.figure()
+                    canvas = newCanvas(backend=self.backend)
                     if dist == 0:
                         # order of transformations are shuffled for the distractors
                         for i in range(len(dist_seq_of_polygons)):
@@ -119,7 +110,7 @@ class Grid:
                             elif i == 2:
                                 dist_seq_of_polygons[i].rotate(math.pi * 0.5)  # 90 degrees
 
-                            dist_seq_of_polygons[i].drawPolygon()
+                            dist_seq_of_polygons[i].drawPolygon(canvas)
                     if dist == 1:
                         # order of transformations are shuffled for the distractors
                         for i in range(len(dist_seq_of_polygons)):
@@ -130,7 +121,7 @@ class Grid:
                             elif i == 2:
                                 dist_seq_of_polygons[i].flip('hori')
 
-                            dist_seq_of_polygons[i].drawPolygon()
+                            dist_seq_of_polygons[i].drawPolygon(canvas)
                     if dist == 2:
                         # order of transformations are shuffled for the distractors
                         for i in range(len(dist_seq_of_polygons)):
@@ -141,28 +132,15 @@ class Grid:
                             elif i == 2:
                                 dist_seq_of_polygons[i].rotate(math.pi * 0.5)  # 90 degrees
 
-                            dist_seq_of_polygons[i].drawPolygon()
+                            dist_seq_of_polygons[i].drawPolygon(canvas)
 
-                    plt.axis('image')
-                    plt.axis('off')
-                    distractor_path = os.path.join(self.result_dir, f'grid_question_{self.questionCount}_dist_{dist}.png')
-                    plt.savefig(distractor_path)
-                    plt.close()
-
-                    img = cv2.imread(distractor_path, 0)
-                    img = cropImage(img)
-                    cv2.imwrite(distractor_path, img)
-                    img = IMG.open(distractor_path)
-                    img = img.resize((300, 300), IMG.LANCZOS)
-                    img.save(distractor_path, quality=90)
+                    img = resizeImage(cropImage(canvas.toImage()), 300, 300)
+                    canvas.close()
+                    distractor_path = self.store.save(f'grid_question_{self.questionCount}_dist_{dist}.{self.format}', img)
 
                     self.distractors_path.append(distractor_path)
 
-            else:
-                os.system("montage -mode concatenate -border 2 " + os.path.join(self.tmp_dir, f'grid_question_{self.questionCount}_{l}_[0-2].png') + " -tile 3x1 -geometry +1+1 " + level_montage_path)
-
-        self.question_path = os.path.join(self.result_dir, f'grid_question_{self.questionCount}.png')
-        os.system("montage -mode concatenate -border 2 " + os.path.join(self.tmp_dir, f'grid_question_{self.questionCount}_level_[0-2]_final.png') + " -tile 1x3 -geometry +1+1 " + self.question_path)
+        self.question_path = self.store.save(f'grid_question_{self.questionCount}.{self.format}', tile(level_montages, cols=1, border=2, spacing=1))
 
     def get_question(self):
         return self.question_path
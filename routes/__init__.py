@@ -59,6 +59,47 @@ def fly_health_check():
             'error': str(e)
         }), 500
 
+@health_bp.route('/metrics', methods=['GET'])
+def render_metrics():
+    """
+    Counters of the question renderer, one section per component:
+    - canvas_pool, glyph_atlas, hatch_textures: reusable resources and caches
+    - encoding: images written per format
+    - result_store: images written and deduplicated
+    - question_pool: ready questions, hit rate and refill latency
+    - render_pool: worker processes and their jobs; renders in the workers
+      are counted in render_pool.workers
+    - render_jobs: the render job queue
+    - render_cache: cached seeded questions
+    - janitor: scheduled and expired images
+    - blob_store: images kept in memory
+    """
+    from Polygons.canvas import canvasPool
+    from Polygons.encoding import encodingStats
+    from utils.result_store import result_store
+    from utils.question_pool import question_pool
+    from utils.render_pool import render_pool
+    from utils.render_jobs import render_jobs
+    from utils.render_cache import render_cache
+    from utils.janitor import janitor
+    from utils.blob_store import blob_store
+    from Polygons.glyphs import atlas
+    from Polygons.hatching import textures
+
+    return jsonify({
+        'canvas_pool': canvasPool.stats(),
+        'glyph_atlas': atlas.stats(),
+        'hatch_textures': textures.stats(),
+        'encoding': encodingStats.stats(),
+        'result_store': result_store.stats(),
+        'question_pool': question_pool.stats(),
+        'render_pool': render_pool.stats(),
+        'render_jobs': render_jobs.stats(),
+        'render_cache': render_cache.stats(),
+        'janitor': janitor.stats(),
+        'blob_store': blob_store.stats(),
+    })
+
 # Add manual database initialization route
 @health_bp.route('/init-database', methods=['POST'])
 @cross_origin()
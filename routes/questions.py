@@ -1,79 +1,346 @@
-from flask import Blueprint, request, jsonify, url_for
+from flask import Blueprint, request, jsonify, url_for, current_app
 from flask_cors import CORS
 import random
+import base64
 import json
+import mimetypes
 import os
-import threading
-from utils.image_handlers import delete_images
-from generateQuestionPaper import generate_question
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.janitor import janitor, IMAGE_LIFETIME
+from utils.blob_store import blob_store
+from utils.question_pool import question_pool
+from utils.render_pool import render_pool, RenderError, RenderTimeout
+from utils.render_jobs import render_jobs, QueueFull
+from utils.render_cache import render_cache
+from generateQuestionPaper import IMAGE_FORMATS
+from Polygons.encoding import webpPath
 import diagram
 
 questions_bp = Blueprint('questions', __name__)
 CORS(questions_bp)
 
-# Remove the @current_app.csrf.exempt decorator
-@questions_bp.route('/diagram', methods=['POST'])
-def diagram_route():
-    data = request.get_json()
-    if not data:
-        return jsonify({'error': 'Invalid JSON payload'}), 400
+# question types of each endpoint
+NVR_TYPES = [i for i in range(1, 13) if i not in [3, 4]]
+SPATIAL_TYPES = [3, 4]
 
+def render_diagram(data):
     # Define output folder for diagrams
     output_folder = os.path.join(os.getcwd(), 'static', 'result')
     os.makedirs(output_folder, exist_ok=True)
 
     # Call the diagram drawing function with the provided JSON (wrapped in a list)
     diagram.draw_shape([data], output_folder=output_folder)
+    return os.path.join('result', f"{data['id']}.png")
+
+# Remove the @current_app.csrf.exempt decorator
+@questions_bp.route('/diagram', methods=['POST'])
+def diagram_route():
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'Invalid JSON payload'}), 400
 
     # Build URL for the generated image
-    image_filename = f"{data['id']}.png"
-    image_url = url_for('static.static_file', filename=os.path.join('result', image_filename), _external=True)
+    image_path = render_diagram(data)
+    image_url = url_for('static.static_file', filename=image_path, _external=True)
     return jsonify({'image_url': image_url})
 
-@questions_bp.route('/nvr', methods=['GET'])
-def nvr():
+@questions_bp.errorhandler(RenderTimeout)
+def render_timeout(e):
+    return jsonify({'error': str(e)}), 504
+
+@questions_bp.errorhandler(RenderError)
+def render_error(e):
+    print(f"Question generation failed: {e}")
+    return jsonify({'error': 'Question generation failed'}), 500
+
+@questions_bp.errorhandler(QueueFull)
+def queue_full(e):
+    response = jsonify({'error': str(e)})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+def timed_render(question_num, image_format, seed=None, lifetime=IMAGE_LIFETIME, images=None, sprite=False):
+    """
+    Returns (question data, timing) for a question: from the render cache if
+    its seed was rendered before, a pre-generated one from the question pool
+    if no seed is asked for, otherwise rendered now in a worker process.
+    Pool and rendered images are deleted after lifetime, cached ones stay
+    until they are evicted. Given an images dict, rendered images are put in
+    it instead of being stored (see inline_entry). With sprite the images
+    come packed into one sheet (see generate_question).
+    """
+    start = time.perf_counter()
+    timing = {'type': question_num}
+    question_data = None
+    if seed is None and not sprite:
+        # the pool's questions have seeds of their own
+        timing['source'] = 'pool'
+        question_data = question_pool.get(question_num, image_format)
+    elif seed is not None:
+        timing['source'] = 'cache'
+        question_data = render_cache.get(question_num, seed, image_format, sprite)
+
+    if question_data is None:
+        timing['source'] = 'render'
+        # wait_ms for a free render worker, render_ms in it
+        question_data = render_pool.generate(question_num, image_format, timing=timing, seed=seed, images=images, sprite=sprite)
+        if images is None:
+            delete_later(list(question_data.values())[0], lifetime)
+            if seed is not None:
+                question_data = render_cache.put(question_num, seed, image_format, question_data, sprite)
+    elif timing['source'] == 'pool':
+        delete_later(list(question_data.values())[0], lifetime)
+    timing['ms'] = round(1000 * (time.perf_counter() - start), 1)
+    return question_data, timing
+
+def render_questions(question_nums, image_format, seeds, images=None, sprite=False):
+    """
+    Renders the questions at the same time, each in its own render worker
+    process, and returns (question data, timing) pairs in order. images
+    holds an images dict (or None) per question, for timed_render.
+    """
+    if images is None:
+        images = [None] * len(question_nums)
+    lifetimes = [IMAGE_LIFETIME] * len(question_nums)
+    if len(question_nums) == 1:
+        return [timed_render(question_nums[0], image_format, seeds[0], lifetimes[0], images[0], sprite)]
+    with ThreadPoolExecutor(max_workers=len(question_nums)) as executor:
+        return list(executor.map(timed_render, question_nums, [image_format] * len(question_nums), seeds, lifetimes, images,
+                                 [sprite] * len(question_nums)))
+
+def requested_format():
+    # ?format=svg for vector images, png by default
+    image_format = request.args.get('format', 'png').lower()
+    if image_format not in IMAGE_FORMATS:
+        return None
+    return image_format
+
+def invalid_format_response():
+    return jsonify({'error': f"Invalid format, expected one of: {', '.join(IMAGE_FORMATS)}"}), 400
+
+def requested_count():
+    # ?count=N for several questions in one response
+    try:
+        count = int(request.args.get('count', 1))
+    except ValueError:
+        return None
+    if not 1 <= count <= current_app.config.get('QUESTION_BATCH_MAX', 20):
+        return None
+    return count
+
+def requested_types(valid_types):
+    # ?types=1,2,5 picks the questions from those types only
+    types = request.args.get('types')
+    if not types:
+        return valid_types
+    try:
+        chosen = [int(question_type) for question_type in types.split(',')]
+    except ValueError:
+        return None
+    if any(question_type not in valid_types for question_type in chosen):
+        return None
+    return chosen
+
+def requested_seed():
+    # ?seed=N renders the same question (type and images) every time;
+    # raises ValueError unless N is a non-negative integer
+    seed = request.args.get('seed')
+    if seed is None:
+        return None
+    seed = int(seed)
+    if seed < 0:
+        raise ValueError(seed)
+    return seed
+
+def requested_inline():
+    # ?inline=1 embeds the images in the JSON as data URIs
+    return request.args.get('inline', '').lower() in ('1', 'true')
+
+def requested_sprite():
+    # ?sprite=1 packs each question's images into one sprite sheet
+    return request.args.get('sprite', '').lower() in ('1', 'true')
+
+def invalid_seed_response():
+    return jsonify({'error': 'Invalid seed, expected a non-negative integer'}), 400
+
+def pick_type(types, seed=None):
+    # the question type, drawn from the seed when there is one
+    return (random if seed is None else random.Random(seed)).choice(types)
+
+def nvr_question_num(seed=None):
     # Generate images for random question (excluding 3,4)
-    valid_nums = [i for i in range(1, 13) if i not in [3, 4]]
-    question_num = random.choice(valid_nums)
-    question_data = generate_question(question_num)
+    return pick_type(NVR_TYPES, seed)
+
+def delete_later(question_info, lifetime=IMAGE_LIFETIME):
+    paths = [question_info['question'], question_info['answer'], *question_info['distractors']]
+    # images in memory expire there, the others are deleted from disk
+    janitor.schedule([path for path in paths if not blob_store.expire(path, lifetime)], lifetime)
+
+def question_entry(question_data):
     question_info = list(question_data.values())[0]
+    entry = {
+        'text': question_info['text'],
+        'explanation': question_info['explanation'],
+        # ?types=<type>&seed=<seed> renders this question again
+        'type': int(list(question_data)[0]),
+        'seed': question_info['seed']
+    }
+
+    if 'rects' in question_info:
+        # one sprite sheet, with the [x, y, width, height] of each image in it
+        entry['sprite'] = url_for('static.static_file', filename=question_info['question'])
+        entry['rects'] = question_info['rects']
+        return entry
 
     # Build URLs for question assets
-    question_url = url_for('static.static_file', filename=question_info['question'])
-    answer_url = url_for('static.static_file', filename=question_info['answer'])
-    distractor_urls = [url_for('static.static_file', filename=path) for path in question_info['distractors']]
-
-    threading.Timer(300, delete_images, args=(question_info['question'], question_info['answer'], *question_info['distractors'])).start()
-
-    return jsonify({
-        'questions': [{
-            'question': question_url,
-            'answer': answer_url,
-            'distractors': distractor_urls,
-            'text': question_info['text'],
-            'explanation': question_info['explanation']
-        }]
+    entry['question'] = url_for('static.static_file', filename=question_info['question'])
+    entry['answer'] = url_for('static.static_file', filename=question_info['answer'])
+    entry['distractors'] = [url_for('static.static_file', filename=path) for path in question_info['distractors']]
+    return entry
+
+def image_data(path, images):
+    # the bytes of an image rendered for this response, kept in the blob
+    # store or on disk, or None if there is no such image
+    if path in images:
+        return images[path]
+    data = blob_store.get(path, count=False) if blob_store.enabled else None
+    if data is None:
+        try:
+            with open(os.path.join(os.getcwd(), 'static', path), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+    return data
+
+def data_uri(path, images, accept_webp):
+    # PNGs are embedded as their WebP copy if the client accepts it and there is one
+    if accept_webp and path.lower().endswith('.png'):
+        data = image_data(webpPath(path), images)
+        if data is not None:
+            return 'data:image/webp;base64,' + base64.b64encode(data).decode('ascii')
+    data = image_data(path, images)
+    if data is None:
+        raise RenderError(f"Image {path} is gone")
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return f'data:{mimetype};base64,' + base64.b64encode(data).decode('ascii')
+
+def inline_entry(question_data, images):
+    """
+    question_entry with the images themselves as data URIs instead of links,
+    so a client needs no further request to show the question. images are
+    the ones rendered for the response; pool and cached images are read from
+    where they are kept.
+    """
+    accept_webp = request.accept_mimetypes['image/webp']
+    question_info = list(question_data.values())[0]
+    entry = question_entry(question_data)
+    if 'rects' in question_info:
+        entry['sprite'] = data_uri(question_info['question'], images, accept_webp)
+        return entry
+    entry['question'] = data_uri(question_info['question'], images, accept_webp)
+    entry['answer'] = data_uri(question_info['answer'], images, accept_webp)
+    entry['distractors'] = [data_uri(path, images, accept_webp) for path in question_info['distractors']]
+    return entry
+
+def question_json(question_data):
+    return {'questions': [question_entry(question_data)]}
+
+def questions_response(valid_types):
+    image_format = requested_format()
+    if image_format is None:
+        return invalid_format_response()
+    count = requested_count()
+    if count is None:
+        return jsonify({'error': f"Invalid count, expected 1 to {current_app.config.get('QUESTION_BATCH_MAX', 20)}"}), 400
+    types = requested_types(valid_types)
+    if types is None:
+        return jsonify({'error': f"Invalid types, expected some of: {', '.join(map(str, valid_types))}"}), 400
+    try:
+        seed = requested_seed()
+    except ValueError:
+        return invalid_seed_response()
+
+    # the questions of a seeded batch have the seeds seed, seed + 1, ...
+    seeds = [None] * count if seed is None else [seed + i for i in range(count)]
+    # inline images are rendered in memory, never written or scheduled for deletion
+    images = [{} for _ in seeds] if requested_inline() else None
+    start = time.perf_counter()
+    questions = []
+    rendered = render_questions([pick_type(types, s) for s in seeds], image_format, seeds, images, requested_sprite())
+    for i, (question_data, timing) in enumerate(rendered):
+        entry = question_entry(question_data) if images is None else inline_entry(question_data, images[i])
+        questions.append(dict(entry, timing=timing))
+
+    response = jsonify({
+        'questions': questions,
+        # the questions render at the same time, so total_ms is below the sum of their ms
+        'timing': {'total_ms': round(1000 * (time.perf_counter() - start), 1)}
     })
+    if images is not None:
+        # WebP is embedded only for clients that accept it
+        response.vary.add('Accept')
+    return response
+
+@questions_bp.route('/nvr', methods=['GET'])
+def nvr():
+    return questions_response(NVR_TYPES)
 
 @questions_bp.route('/spatial', methods=['GET'])
 def spatial():
-    question_data = generate_question(random.choice([3, 4]))
-    question_info = list(question_data.values())[0]
+    return questions_response(SPATIAL_TYPES)
+
+def render_question_job(question_num, image_format, seed=None):
+    # the images outlive the job, whose result links to them
+    return timed_render(question_num, image_format, seed, max(IMAGE_LIFETIME, render_jobs.ttl))[0]
+
+def job_created(job, endpoint):
+    status_url = url_for(endpoint, job_id=job.id)
+    return jsonify({'job_id': job.id, 'status': job.status, 'status_url': status_url}), 202, {'Location': status_url}
+
+def job_status(kind, job_id, result_json):
+    job = render_jobs.get(job_id)
+    if job is None or job.kind != kind:
+        return jsonify({'error': 'Unknown or expired job'}), 404
 
-    question_url = url_for('static.static_file', filename=question_info['question'])
-    answer_url = url_for('static.static_file', filename=question_info['answer'])
-    distractor_urls = [url_for('static.static_file', filename=path) for path in question_info['distractors']]
+    response = {'job_id': job.id, 'status': job.status}
+    if job.status == 'done':
+        response.update(result_json(job.result))
+    elif job.status == 'failed':
+        response['error'] = str(job.error) if isinstance(job.error, RenderTimeout) else 'Rendering failed'
+    return jsonify(response)
+
+@questions_bp.route('/nvr/jobs', methods=['POST'])
+def nvr_job_create():
+    image_format = requested_format()
+    if image_format is None:
+        return invalid_format_response()
+
+    try:
+        seed = requested_seed()
+    except ValueError:
+        return invalid_seed_response()
+
+    job = render_jobs.submit('nvr', render_question_job, nvr_question_num(seed), image_format, seed)
+    return job_created(job, 'questions.nvr_job')
+
+@questions_bp.route('/nvr/jobs/<job_id>', methods=['GET'])
+def nvr_job(job_id):
+    return job_status('nvr', job_id, question_json)
+
+@questions_bp.route('/diagram/jobs', methods=['POST'])
+def diagram_job_create():
+    data = request.get_json(silent=True)
+    if not data or 'id' not in data:
+        return jsonify({'error': 'Invalid JSON payload'}), 400
 
-    threading.Timer(300, delete_images, args=(question_info['question'], question_info['answer'], *question_info['distractors'])).start()
+    job = render_jobs.submit('diagram', render_diagram, data)
+    return job_created(job, 'questions.diagram_job')
 
-    return jsonify({
-        'questions': [{
-            'question': question_url,
-            'answer': answer_url,
-            'distractors': distractor_urls,
-            'text': question_info['text'],
-            'explanation': question_info['explanation']
-        }]
+@questions_bp.route('/diagram/jobs/<job_id>', methods=['GET'])
+def diagram_job(job_id):
+    return job_status('diagram', job_id, lambda image_path: {
+        'image_url': url_for('static.static_file', filename=image_path, _external=True)
     })
 
 @questions_bp.route('/english', methods=['GET'])
@@ -1,18 +1,85 @@
 # routes/static.py
-from flask import Blueprint, send_from_directory, current_app
+from flask import Blueprint, send_from_directory, current_app, request, Response, abort
 from flask_cors import CORS
+import functools
+import hashlib
 import os
+from werkzeug.security import safe_join
+from Polygons.encoding import webpPath
+from utils.blob_store import blob_store
+from utils.result_store import DIGEST_SIZE, is_content_addressed
 
 static_bp = Blueprint('static', __name__)
 CORS(static_bp)
 
+# files whose content hash is kept, by (path, modification time, size)
+ETAG_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=ETAG_CACHE_SIZE)
+def file_digest(path, mtime_ns, size):
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_etag(static_dir, filename):
+    """
+    A strong ETag from the content hash of a file under static/: the name of
+    a generated image, hashed from the bytes (once per version) for the others.
+    """
+    if is_content_addressed(filename):
+        return os.path.basename(filename)
+    path = safe_join(static_dir, filename)
+    try:
+        stat = os.stat(path) if path else None
+    except OSError:
+        stat = None
+    if stat is None:
+        abort(404)
+    return file_digest(path, stat.st_mtime_ns, stat.st_size)
+
+def cache_control(filename):
+    if is_content_addressed(filename):
+        return f"public, max-age={current_app.config.get('IMMUTABLE_MAX_AGE', 31536000)}, immutable"
+    policies = current_app.config.get('STATIC_CACHE_POLICIES', {})
+    prefix = max((prefix for prefix in policies if filename.startswith(prefix)), key=len, default=None)
+    return policies[prefix] if prefix is not None else 'no-cache'
+
 @static_bp.route('/static/<path:filename>')
 def static_file(filename):
     """
     Serve static files - note that this route is primarily for development.
     On PythonAnywhere, static files should be configured to be served directly
     via the web interface for better performance.
+
+    PNGs that have a .webp copy next to them are served as WebP to clients
+    that accept it. Images kept in the blob store are served from memory.
+    Every response has an ETag from the content hash, answers If-None-Match
+    and If-Modified-Since with 304 and Range with 206, and gets the
+    Cache-Control of its path: generated images named by their content hash
+    never change, so browsers and CDNs may keep them for IMMUTABLE_MAX_AGE;
+    other files follow STATIC_CACHE_POLICIES.
     """
     # Get static directory from the current application
     static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
-    return send_from_directory(static_dir, filename)
+    accept_webp = request.accept_mimetypes['image/webp']
+    in_memory = blob_store.response_data(filename, accept_webp) if blob_store.enabled else None
+    if in_memory is not None:
+        data, mimetype = in_memory
+        served = webpPath(filename) if mimetype == 'image/webp' else filename
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(content_etag(static_dir, served))
+        response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    else:
+        served = filename
+        variant = webpPath(filename)
+        if filename.lower().endswith('.png') and accept_webp and os.path.isfile(os.path.join(static_dir, variant)):
+            served = variant
+        response = send_from_directory(static_dir, served, etag=content_etag(static_dir, served))
+
+    if filename.lower().endswith('.png'):
+        # the same URL has a different body depending on Accept
+        response.vary.add('Accept')
+    response.headers['Cache-Control'] = cache_control(filename)
+    return response
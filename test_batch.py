@@ -0,0 +1,53 @@
+"""
+Tests for several questions in one response (?count=, ?types=, ?seed=).
+Run with: python -m pytest test_batch.py
+"""
+import pytest
+
+from routes.questions import NVR_TYPES, SPATIAL_TYPES, pick_type
+
+
+def questions(client, query, section='nvr'):
+    response = client.get(f'/api/questions/{section}?{query}')
+    assert response.status_code == 200
+    return response.get_json()['questions']
+
+
+def test_count_returns_that_many_questions_in_order(client):
+    batch = questions(client, 'count=3&seed=40')
+    assert [question['seed'] for question in batch] == [40, 41, 42]
+    # each type drawn from its own seed, so the order is the seeds'
+    assert [question['type'] for question in batch] == [pick_type(NVR_TYPES, seed) for seed in [40, 41, 42]]
+    assert len(questions(client, 'count=2')) == 2
+
+
+def test_types_restrict_the_questions(client):
+    batch = questions(client, 'count=4&types=9,12')
+    assert {question['type'] for question in batch} <= {9, 12}
+    assert {question['type'] for question in questions(client, 'count=2', 'spatial')} <= set(SPATIAL_TYPES)
+
+
+def test_each_seeded_question_has_its_own_seed_and_timing(client):
+    batch = questions(client, 'count=3&seed=7&types=9')
+    assert [question['seed'] for question in batch] == [7, 8, 9]
+    # the same seed renders the same question again
+    assert questions(client, 'seed=8&types=9')[0]['question'] == batch[1]['question']
+    for question in batch:
+        timing = question['timing']
+        assert timing['type'] == question['type'] == 9
+        assert timing['source'] == 'render'
+        assert timing['ms'] > 0
+
+
+@pytest.mark.parametrize('query', ['count=0', 'count=-1', 'count=two', 'count=1.5', 'types=99', 'types=9,x', 'types=3'])
+def test_invalid_batch_parameters_are_refused(client, query):
+    response = client.get(f'/api/questions/nvr?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_count_above_the_maximum_is_refused(client, app):
+    maximum = app.config['QUESTION_BATCH_MAX']
+    assert client.get(f'/api/questions/nvr?count={maximum + 1}').status_code == 400
+    # a type from the other section
+    assert client.get('/api/questions/spatial?types=9').status_code == 400
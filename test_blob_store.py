@@ -0,0 +1,93 @@
+"""
+Tests for the generated images kept in memory and served from there.
+Run with: python -m pytest test_blob_store.py
+"""
+import os
+
+import pytest
+
+from utils import blob_store as blob_store_module
+from utils.blob_store import BlobStore, blob_store
+from utils.result_store import ContentStore
+
+
+def blob(content, size=100):
+    # an image's path relative to static/, as the result store would name it, and its bytes
+    data = content.encode().ljust(size, b'.')
+    path = ContentStore(os.path.join(os.getcwd(), 'static', 'result')).path_for(data, '.png')
+    return os.path.relpath(path, os.path.join(os.getcwd(), 'static')), data
+
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / 'static')
+
+
+def test_images_over_the_cap_spill_to_disk(static_dir):
+    store = BlobStore(max_bytes=250)
+    blobs = dict(blob(content) for content in ['q', 'a', 'd'])
+    store.publish(blobs)
+
+    first, second, third = blobs
+    assert store.get(first) == blobs[first]
+    assert store.get(second) == blobs[second]
+    assert store.get(third) is None
+    # the one that did not fit was written instead
+    assert not os.path.exists(os.path.join(static_dir, first))
+    with open(os.path.join(static_dir, third), 'rb') as f:
+        assert f.read() == blobs[third]
+    stats = store.stats()
+    assert (stats['blobs'], stats['bytes'], stats['stored'], stats['overflowed']) == (2, 200, 2, 1)
+
+
+def test_images_expire(static_dir, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(blob_store_module.time, 'time', lambda: now[0])
+    store = BlobStore(max_bytes=1000)
+    served, data = blob('served')
+    unserved, _ = blob('unserved')
+    store.publish({served: data, unserved: data})
+
+    # serving an image sets its lifetime; the others wait up to UNSERVED_LIFETIME
+    assert store.expire(served, 60)
+    assert not store.expire(blob('missing')[0], 60)
+    now[0] += 61
+    assert store.get(served) is None
+    assert store.get(unserved) == data
+    now[0] += blob_store_module.UNSERVED_LIFETIME
+    assert store.get(unserved) is None
+    stats = store.stats()
+    assert (stats['blobs'], stats['bytes'], stats['expired']) == (0, 0, 2)
+
+
+def test_expired_images_make_room(static_dir, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(blob_store_module.time, 'time', lambda: now[0])
+    store = BlobStore(max_bytes=100)
+    first, data = blob('first')
+    store.publish({first: data})
+    store.expire(first, 60)
+
+    now[0] += 61
+    second, data = blob('second')
+    store.publish({second: data})
+    assert store.get(second) == data
+    assert store.stats()['overflowed'] == 0
+
+
+def test_static_route_serves_from_memory(client, monkeypatch):
+    monkeypatch.setattr(blob_store, 'max_bytes', 1000)
+    # an image that is only in memory: it is on no disk the route looks at
+    path, data = blob('in memory')
+    assert blob_store.put(path, data)
+    try:
+        response = client.get('/api/static/static/' + path.replace(os.sep, '/'))
+        assert response.status_code == 200
+        assert response.data == data
+        assert response.mimetype == 'image/png'
+        assert response.headers['ETag'] == '"%s"' % os.path.basename(path)
+        assert blob_store.stats()['hits'] >= 1
+    finally:
+        with blob_store.lock:
+            blob_store.drop(path)
@@ -0,0 +1,98 @@
+"""
+Tests for the in-process compositing and the palette PNG / WebP encoding,
+against what the PIL and ImageMagick steps they replace produced.
+Run with: python -m pytest test_encoding.py
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from Polygons import compositor, encoding
+from Polygons.canvas import newCanvas
+from Polygons.Polygons import Polygon, Circumcircle
+
+
+def line_art():
+    # a fold question's base: black shapes on transparent, as fold.py draws them
+    canvas = newCanvas(backend='raster')
+    for i, sides in enumerate([0, 0, 2, 4]):
+        poly = Polygon(no_of_sides=sides, isRegular=False, hatch='/')
+        poly.circumcircle = Circumcircle((i + 1) ** 2 * 100, 5 * i, 10 * (i % 2))
+        poly.makeShape()
+        poly.drawPolygon(canvas)
+    base = canvas.toRGBA(transparent=True)
+    canvas.close()
+    return base
+
+
+def pil_flatten(rgba):
+    # `convert -flatten`: over white, then to gray
+    white = Image.new('RGBA', (rgba.shape[1], rgba.shape[0]), (255, 255, 255, 255))
+    return np.array(Image.alpha_composite(white, Image.fromarray(rgba)).convert('L'))
+
+
+def test_fold_composite_matches_pil():
+    base = line_art()
+    mirrored = compositor.mirror(base)
+    assert np.array_equal(mirrored, np.array(Image.fromarray(base).transpose(Image.FLIP_LEFT_RIGHT)))
+
+    folded = compositor.alphaComposite(base, mirrored)
+    expected = np.array(Image.alpha_composite(Image.fromarray(base), Image.fromarray(mirrored)))
+    assert np.abs(folded.astype(int) - expected).max() <= 1
+    assert np.abs(compositor.flatten(folded).astype(int) - pil_flatten(expected)).max() <= 1
+
+
+def test_composite_of_any_colors_flattens_like_pil():
+    rng = np.random.default_rng(0)
+    bottom = rng.integers(0, 256, (64, 48, 4), dtype=np.uint8)
+    top = rng.integers(0, 256, (64, 48, 4), dtype=np.uint8)
+    expected = Image.alpha_composite(Image.fromarray(bottom), Image.fromarray(top))
+    flattened = compositor.flatten(compositor.alphaComposite(bottom, top))
+    assert np.abs(flattened.astype(int) - pil_flatten(np.array(expected))).max() <= 3
+
+
+def test_tile_lays_out_like_montage():
+    # `montage -mode concatenate -tile 2x -border 1 -geometry +2+2`
+    small = np.zeros((2, 3), dtype=np.uint8)
+    tall = np.full((4, 1), 100, dtype=np.uint8)
+    sheet = compositor.tile([small, tall, small], cols=2, border=1, spacing=2)
+
+    # cells are the image, its border and the spacing; rows as high as their tallest cell
+    assert sheet.shape == (10 + 8, 9 + 7)
+    # the short image is centered in the height of the first row, with its border around it
+    assert np.array_equal(sheet[4:6, 3:6], small)
+    assert (sheet[3, 2:7] == compositor.BORDER_COLOR).all()
+    assert (sheet[0:3, 0:9] == compositor.BACKGROUND_COLOR).all()
+    assert np.array_equal(sheet[3:7, 12:13], tall)
+    # the last row is centered in the width of the first
+    assert np.array_equal(sheet[13:15, 6:9], small)
+
+
+@pytest.mark.parametrize('bits', [1, 2, 4])
+def test_palette_png_round_trips(bits):
+    ramp = encoding.grayRamp(bits)
+    img = ramp[np.arange(60 * 40).reshape(60, 40) % len(ramp)]
+    data = encoding.encodePng(img, bits=bits)
+
+    # IHDR: bit depth, then color type 3 (palette)
+    assert (data[24], data[25]) == (bits, 3)
+    decoded = Image.open(io.BytesIO(data))
+    assert decoded.mode == 'P'
+    assert np.array_equal(np.array(decoded.convert('L')), img)
+
+
+def test_palette_png_quantizes_to_the_nearest_level():
+    img = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    decoded = np.array(Image.open(io.BytesIO(encoding.encodePng(img, bits=4))).convert('L'))
+    # 17 gray levels apart, so at most half a step off
+    assert np.abs(decoded.astype(int) - img).max() <= 8
+    assert len(np.unique(decoded)) == 16
+
+
+def test_webp_has_the_png_gray_levels():
+    img = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    png = np.array(Image.open(io.BytesIO(encoding.encodePng(img, bits=4))).convert('L'))
+    webp = np.array(Image.open(io.BytesIO(encoding.encodeWebp(img, bits=4))).convert('L'))
+    assert np.array_equal(png, webp)
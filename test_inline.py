@@ -0,0 +1,65 @@
+"""
+Tests for questions with their images inline, as data URIs (?inline=1).
+Run with: python -m pytest test_inline.py
+"""
+import base64
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import routes.questions
+from Polygons import encoding
+
+
+def decode(uri, mimetype):
+    prefix = f'data:{mimetype};base64,'
+    assert uri.startswith(prefix)
+    return Image.open(io.BytesIO(base64.b64decode(uri[len(prefix):])))
+
+
+def image_uris(entry):
+    return [entry['question'], entry['answer']] + entry['distractors']
+
+
+def written_files():
+    return [name for _, _, names in os.walk(os.path.join('static', 'result')) for name in names]
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    # the paths given to the janitor to delete
+    scheduled = []
+    monkeypatch.setattr(routes.questions.janitor, 'schedule', lambda paths, lifetime: scheduled.extend(paths))
+    monkeypatch.setattr(encoding, 'WEBP_VARIANTS', True)
+    return scheduled
+
+
+def test_images_are_data_uris(client, scheduled):
+    response = client.get('/api/questions/nvr?inline=1&types=9')
+    assert response.status_code == 200
+    assert 'Accept' in response.headers['Vary']
+    entry = response.get_json()['questions'][0]
+    for uri in image_uris(entry):
+        assert decode(uri, 'image/png').format == 'PNG'
+
+    # rendered in memory: nothing on disk, nothing to delete
+    assert written_files() == []
+    assert scheduled == []
+
+
+def test_webp_when_accepted(client, scheduled):
+    response = client.get('/api/questions/nvr?inline=1&types=9', headers={'Accept': 'image/webp,*/*'})
+    entry = response.get_json()['questions'][0]
+    for uri in image_uris(entry):
+        assert decode(uri, 'image/webp').format == 'WEBP'
+    assert written_files() == []
+    assert scheduled == []
+
+
+def test_links_are_scheduled_for_deletion(client, scheduled):
+    # the same request without inline writes its images and schedules them
+    entry = client.get('/api/questions/nvr?types=9').get_json()['questions'][0]
+    assert len(written_files()) >= len(image_uris(entry))
+    assert sorted(scheduled) == sorted(uri.split('/api/static/static/', 1)[1] for uri in image_uris(entry))
@@ -0,0 +1,124 @@
+"""
+Tests for the deletion of expired generated images.
+Run with: python -m pytest test_janitor.py
+"""
+import os
+import time
+
+import pytest
+
+from utils.janitor import Janitor
+from utils.result_store import ContentStore
+
+LIFETIME = 60
+
+
+@pytest.fixture
+def janitor(tmp_path, monkeypatch):
+    # never started: tests sweep what is due themselves
+    janitor = Janitor(str(tmp_path / 'static'))
+    monkeypatch.setattr(janitor, 'start', lambda: None)
+    return janitor
+
+
+def write_image(janitor, content, modified=None, webp=False):
+    # a generated image as the result store names it, relative to static/
+    data = content.encode()
+    path = ContentStore(os.path.join(janitor.root, 'result')).path_for(data, '.png')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for variant in [path] + ([os.path.splitext(path)[0] + '.webp'] if webp else []):
+        with open(variant, 'wb') as f:
+            f.write(data)
+        if modified is not None:
+            os.utime(variant, (modified, modified))
+    return os.path.relpath(path, janitor.root)
+
+
+def exists(janitor, path):
+    return os.path.exists(os.path.join(janitor.root, path))
+
+
+def sweep_due(janitor):
+    with janitor.lock:
+        due = janitor.pop_due(time.time())
+    janitor.sweep(due)
+    return [path for path, _ in due]
+
+
+def test_images_expire_in_heap_order(janitor):
+    now = time.time()
+    first, second, later = (write_image(janitor, name, now - 2 * LIFETIME) for name in ['first', 'second', 'later'])
+    janitor.schedule_at([second], now - 10, LIFETIME)
+    janitor.schedule_at([later], now + LIFETIME, LIFETIME)
+    janitor.schedule_at([first], now - 30, LIFETIME)
+
+    assert sweep_due(janitor) == [first, second]
+    assert not exists(janitor, first) and not exists(janitor, second)
+    assert exists(janitor, later)
+    stats = janitor.stats()
+    assert (stats['expired'], stats['live']) == (2, 1)
+    assert 0 < stats['next_expiry_s'] <= LIFETIME
+
+
+def test_refreshed_images_are_kept(janitor):
+    now = time.time()
+    # served again since it was scheduled: modified a moment ago
+    served = write_image(janitor, 'served', now - 1)
+    janitor.schedule_at([served], now - 10, LIFETIME)
+    # scheduled again for later, which supersedes the earlier expiry
+    stored = write_image(janitor, 'stored', now - 2 * LIFETIME)
+    janitor.schedule_at([stored], now - 10, LIFETIME)
+    janitor.schedule([stored], LIFETIME)
+
+    assert sweep_due(janitor) == [served]
+    assert exists(janitor, served) and exists(janitor, stored)
+    stats = janitor.stats()
+    assert (stats['kept'], stats['expired']) == (1, 0)
+    # a lifetime from the refresh
+    assert janitor.expiries[served] == (now - 1 + LIFETIME, LIFETIME)
+    assert janitor.expiries[stored][0] > now
+
+
+def test_rescan_picks_up_only_content_addressed_images(janitor):
+    now = time.time()
+    old = write_image(janitor, 'old', now - 2 * LIFETIME, webp=True)
+    recent = write_image(janitor, 'recent', now - 1)
+    # a diagram and a file of the wrong shape, which are not the janitor's
+    others = [os.path.join('result', 'diagram.png'), os.path.join('result', 'ab', 'other.png')]
+    for path in others:
+        os.makedirs(os.path.dirname(os.path.join(janitor.root, path)), exist_ok=True)
+        with open(os.path.join(janitor.root, path), 'wb') as f:
+            f.write(b'other')
+
+    janitor.rescan(LIFETIME)
+    # the WebP copy goes with its PNG
+    assert set(janitor.expiries) == {old, recent}
+    assert janitor.stats()['rescanned'] == 2
+
+    assert sweep_due(janitor) == [old]
+    assert not exists(janitor, old)
+    assert exists(janitor, recent)
+    for path in others:
+        assert exists(janitor, path)
+
+
+def test_expiring_a_png_removes_its_webp_copy(janitor):
+    path = write_image(janitor, 'image', time.time() - 2 * LIFETIME, webp=True)
+    webp = os.path.splitext(path)[0] + '.webp'
+    assert exists(janitor, webp)
+
+    janitor.schedule_at([path], time.time() - 1, LIFETIME)
+    sweep_due(janitor)
+    assert not exists(janitor, path)
+    assert not exists(janitor, webp)
+    assert janitor.stats()['expired'] == 1
+
+
+def test_images_already_gone_are_counted_missing(janitor):
+    gone = write_image(janitor, 'gone')
+    os.remove(os.path.join(janitor.root, gone))
+    janitor.schedule_at([gone, os.path.join('result', 'no', 'such', 'image.png')], time.time() - 1, LIFETIME)
+
+    sweep_due(janitor)
+    stats = janitor.stats()
+    assert (stats['missing'], stats['expired'], stats['kept'], stats['errors']) == (2, 0, 0, 0)
@@ -0,0 +1,111 @@
+"""
+Tests for the pool of pre-generated questions.
+Run with: python -m pytest test_question_pool.py
+"""
+import itertools
+import os
+import threading
+import time
+
+import pytest
+
+from utils.question_pool import QuestionPool
+
+
+class FakeGenerator:
+    """
+    Writes five small files per question instead of rendering one. The first
+    fail calls raise; questions from hold_from on wait until release is set.
+    """
+    def __init__(self, fail=0, hold_from=None):
+        self.count = itertools.count()
+        self.fail = fail
+        self.hold_from = hold_from
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def __call__(self, question_num, format='png'):
+        with self.lock:
+            if self.fail:
+                self.fail -= 1
+                raise RuntimeError("render failed")
+            n = next(self.count)
+        if self.hold_from is not None and n >= self.hold_from:
+            self.release.wait(10)
+        paths = [os.path.join('result', f'{n}_{i}.{format}') for i in range(5)]
+        for path in paths:
+            with open(os.path.join('static', path), 'wb') as f:
+                f.write(b'image')
+        return {str(question_num): {'question': paths[0], 'answer': paths[1], 'distractors': paths[2:]}}
+
+
+def wait_full(pool, key='9:png'):
+    deadline = time.monotonic() + 10
+    while pool.stats()['depth'].get(key) != pool.depth or pool.stats()['pending']:
+        assert time.monotonic() < deadline, "pool did not refill"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join('static', 'result'))
+
+
+def test_get_takes_a_question_and_refills(static_dir):
+    generate = FakeGenerator()
+    pool = QuestionPool(depth=2, workers=1, generate=generate)
+    pool.start([(9, 'png')])
+    wait_full(pool)
+
+    first = pool.get(9)
+    assert first['9']['question'] == os.path.join('result', '0_0.png')
+    wait_full(pool)
+    # oldest first, and the taken question is replaced
+    assert pool.get(9)['9']['question'] == os.path.join('result', '1_0.png')
+    wait_full(pool)
+    assert next(generate.count) == 4
+
+
+def test_questions_whose_files_are_gone_are_dropped(static_dir):
+    pool = QuestionPool(depth=2, workers=1, generate=FakeGenerator())
+    pool.start([(9, 'png')])
+    wait_full(pool)
+    # the janitor deleted the images of the oldest question
+    os.remove(os.path.join('static', 'result', '0_1.png'))
+
+    assert pool.get(9)['9']['question'] == os.path.join('result', '1_0.png')
+    assert pool.stats()['hits'] == 1
+    # the refills finish before the test leaves its directory
+    wait_full(pool)
+    # a type that is not kept is a miss
+    assert pool.get(3) is None
+    assert pool.stats()['misses'] == 1
+
+
+def test_metrics(static_dir):
+    generate = FakeGenerator(fail=1, hold_from=1)
+    pool = QuestionPool(depth=1, workers=1, generate=generate)
+    pool.start([(9, 'png')])
+    deadline = time.monotonic() + 10
+    while pool.stats()['pending']:
+        assert time.monotonic() < deadline, "refill did not fail"
+        time.sleep(0.01)
+    assert pool.stats()['failures'] == 1
+    assert pool.stats()['depth'] == {}
+
+    # empty, so a miss; the refill is drawn from next
+    assert pool.get(9) is None
+    wait_full(pool)
+    assert pool.get(9) is not None
+    stats = pool.stats()
+    assert stats['depth'] == {'9:png': 0}
+    assert stats['pending'] == 1
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+    generate.release.set()
+    wait_full(pool)
+    stats = pool.stats()
+    assert stats['target_depth'] == 1
+    assert stats['refill_ms']['p50'] is not None
+    assert stats['refill_ms']['p99'] >= stats['refill_ms']['p50']
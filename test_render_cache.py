@@ -0,0 +1,168 @@
+"""
+Tests for the disk cache of seeded questions.
+Run with: python -m pytest test_render_cache.py
+"""
+import hashlib
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from Polygons import encoding
+from utils.render_cache import RenderCache
+from utils.result_store import ContentStore
+
+
+def image(content):
+    # a few black pixels drawn from content
+    img = np.full((16, 16), 255, dtype=np.uint8)
+    img.flat[list(hashlib.md5(content.encode()).digest()[:4])] = 0
+    return img
+
+# stored without compression, every test image takes the same bytes
+IMAGE_BYTES = len(encoding.encodePng(image(''), compression=0))
+
+
+@pytest.fixture(autouse=True)
+def stored_pngs(monkeypatch):
+    monkeypatch.setattr(encoding, 'PNG_CACHE_COMPRESSION', 0)
+
+
+def store_image(static_dir, content, compression=0):
+    # an image as the result store writes it, under the hash of its bytes
+    data = encoding.encodePng(image(content), compression=compression)
+    path = ContentStore(os.path.join(static_dir, 'result')).path_for(data, '.png')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return os.path.relpath(path, static_dir)
+
+
+def question(static_dir, *contents):
+    paths = [store_image(static_dir, content) for content in contents]
+    return {'9': {'question': paths[0], 'answer': paths[1], 'distractors': paths[2:],
+                  'text': 'text', 'explanation': 'explanation', 'seed': 1}}
+
+
+def image_paths(question_data):
+    question_info = question_data['9']
+    return [question_info['question'], question_info['answer']] + question_info['distractors']
+
+
+def new_cache(tmp_path, max_bytes):
+    static_dir = tmp_path / 'static'
+    return RenderCache(max_bytes, str(static_dir / 'cache')), str(static_dir)
+
+
+def test_hit_and_miss(tmp_path):
+    cache, static_dir = new_cache(tmp_path, 10 * IMAGE_BYTES)
+    assert cache.get(9, 1, 'png') is None
+
+    cached = cache.put(9, 1, 'png', question(static_dir, 'q', 'a', 'd1', 'd2', 'd3'))
+    assert cache.get(9, 1, 'png') == cached
+    # another seed or format is another entry
+    assert cache.get(9, 2, 'png') is None
+    assert cache.get(9, 1, 'svg') is None
+
+    for path in image_paths(cached):
+        assert path.startswith('cache' + os.sep)
+        assert os.path.exists(os.path.join(static_dir, path))
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['inserts']) == (1, 3, 1)
+    assert stats['bytes'] == 5 * IMAGE_BYTES
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache, static_dir = new_cache(tmp_path, 10 * IMAGE_BYTES)
+    first = cache.put(9, 1, 'png', question(static_dir, 'q1', 'a1', 'x1', 'y1', 'z1'))
+    second = cache.put(9, 2, 'png', question(static_dir, 'q2', 'a2', 'x2', 'y2', 'z2'))
+    # the first entry is now the most recently used
+    assert cache.get(9, 1, 'png') is not None
+
+    cache.put(9, 3, 'png', question(static_dir, 'q3', 'a3', 'x3', 'y3', 'z3'))
+    assert cache.get(9, 2, 'png') is None
+    assert cache.get(9, 1, 'png') == first
+    assert cache.get(9, 3, 'png') is not None
+    for path in image_paths(second):
+        assert not os.path.exists(os.path.join(static_dir, path))
+    assert not os.path.exists(cache.manifest_path(cache.key(9, 2, 'png')))
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 10 * IMAGE_BYTES
+
+
+def test_shared_images_are_counted_once_and_outlive_an_entry(tmp_path):
+    cache, static_dir = new_cache(tmp_path, 6 * IMAGE_BYTES + IMAGE_BYTES // 2)
+    first = cache.put(9, 1, 'png', question(static_dir, 'q1', 'a', 'x', 'y', 'z'))
+    second = cache.put(9, 2, 'png', question(static_dir, 'q2', 'a', 'x', 'y', 'z'))
+    assert cache.stats()['bytes'] == 6 * IMAGE_BYTES
+
+    # one more image than fits: only the least recently used entry goes
+    cache.put(9, 3, 'png', question(static_dir, 'q3', 'a', 'x', 'y', 'z'))
+    assert cache.get(9, 1, 'png') is None
+    assert cache.get(9, 2, 'png') == second
+    assert cache.stats()['bytes'] == 6 * IMAGE_BYTES
+
+    assert not os.path.exists(os.path.join(static_dir, first['9']['question']))
+    for path in image_paths(second):
+        assert os.path.exists(os.path.join(static_dir, path))
+
+
+def test_reload_from_manifests_and_sweep_orphans(tmp_path):
+    cache, static_dir = new_cache(tmp_path, 10 * IMAGE_BYTES)
+    cached = cache.put(9, 1, 'png', question(static_dir, 'q', 'a', 'd1', 'd2', 'd3'))
+    # an image left behind by a stop while caching
+    orphan = os.path.join(os.path.dirname(os.path.join(static_dir, cached['9']['question'])), 'f' * 32 + '.png')
+    with open(orphan, 'wb') as f:
+        f.write(b'orphan')
+
+    reloaded, _ = new_cache(tmp_path, 10 * IMAGE_BYTES)
+    reloaded.load()
+    assert reloaded.get(9, 1, 'png') == cached
+    assert reloaded.stats()['bytes'] == cache.stats()['bytes']
+    assert not os.path.exists(orphan)
+    for path in image_paths(cached):
+        assert os.path.exists(os.path.join(static_dir, path))
+
+
+def test_only_the_first_process_uses_the_cache(tmp_path):
+    class App:
+        config = {'RENDER_CACHE_BYTES': 10 * IMAGE_BYTES}
+
+    first, static_dir = new_cache(tmp_path, 0)
+    first.init_app(App)
+    # another web process over the same directory
+    second, _ = new_cache(tmp_path, 0)
+    second.init_app(App)
+    assert first.max_bytes == 10 * IMAGE_BYTES
+    assert second.max_bytes == 0
+
+    cached = first.put(9, 1, 'png', question(static_dir, 'q', 'a', 'd1', 'd2', 'd3'))
+    assert second.put(9, 1, 'png', question(static_dir, 'q', 'a', 'd1', 'd2', 'd3'))['9']['question'].startswith('result')
+    assert second.get(9, 1, 'png') is None
+    assert first.get(9, 1, 'png') == cached
+
+
+def test_cached_pngs_are_encoded_again_at_the_cache_level(tmp_path, monkeypatch):
+    monkeypatch.setattr(encoding, 'PNG_CACHE_COMPRESSION', 9)
+    cache, static_dir = new_cache(tmp_path, 100 * IMAGE_BYTES)
+    rendered = question(static_dir, 'q', 'a', 'd1', 'd2', 'd3')
+    cached = cache.put(9, 1, 'png', rendered)
+
+    for src, dest in zip(image_paths(rendered), image_paths(cached)):
+        with open(os.path.join(static_dir, src), 'rb') as f:
+            data = f.read()
+        with open(os.path.join(static_dir, dest), 'rb') as f:
+            copy = f.read()
+        assert copy == encoding.recompressPng(data, 9)
+        assert len(copy) < len(data)
+        # same pixels, palette and bit depth
+        assert copy[24:26] == data[24:26]
+        assert np.array_equal(np.array(Image.open(io.BytesIO(copy))), np.array(Image.open(io.BytesIO(data))))
+    assert cache.stats()['bytes'] == cache.size(image_paths(cached))
+
+    # another level is another entry
+    assert cache.key(9, 1, 'png')[2].endswith('c9')
+    monkeypatch.setattr(encoding, 'PNG_CACHE_COMPRESSION', 6)
+    assert cache.get(9, 1, 'png') is None
@@ -0,0 +1,80 @@
+"""
+Tests for the render job endpoints: the job lifecycle, a full queue and expiry.
+Run with: python -m pytest test_render_jobs.py
+"""
+import os
+import threading
+import time
+
+import pytest
+
+import routes.questions
+from utils.render_jobs import JobQueue
+
+
+def wait_for(client, status_url, status='done', timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(status_url)
+        if response.get_json()['status'] == status:
+            return response
+        assert time.monotonic() < deadline, f"job did not reach {status}"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    jobs = JobQueue(size=4, workers=1, ttl=600)
+    monkeypatch.setattr(routes.questions, 'render_jobs', jobs)
+    return jobs
+
+
+def test_job_is_accepted_then_done(client, jobs):
+    response = client.post('/api/questions/nvr/jobs?seed=3')
+    assert response.status_code == 202
+    created = response.get_json()
+    assert created['status'] in ('queued', 'running')
+    assert response.headers['Location'] == created['status_url']
+
+    done = wait_for(client, created['status_url']).get_json()
+    assert done['job_id'] == created['job_id']
+    question = done['questions'][0]
+    assert question['seed'] == 3
+    # the images outlive the job's status
+    assert os.path.exists(question['answer'].split('/api/static/', 1)[1])
+    assert jobs.stats()['submitted'] == 1
+
+
+def test_full_queue_returns_503_with_retry_after(client, jobs, monkeypatch):
+    jobs.size = 1
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocked(*args):
+        started.set()
+        release.wait(10)
+        return None
+    monkeypatch.setattr(routes.questions, 'render_question_job', blocked)
+
+    try:
+        # one job running and one waiting fill the queue
+        assert client.post('/api/questions/nvr/jobs').status_code == 202
+        assert started.wait(10)
+        assert client.post('/api/questions/nvr/jobs').status_code == 202
+        response = client.post('/api/questions/nvr/jobs')
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        assert jobs.stats()['rejected'] == 1
+    finally:
+        release.set()
+
+
+def test_expired_job_returns_404(client, jobs):
+    jobs.ttl = 0.5
+    created = client.post('/api/questions/nvr/jobs?seed=4').get_json()
+    wait_for(client, created['status_url'])
+
+    time.sleep(jobs.ttl + 0.1)
+    response = client.get(created['status_url'])
+    assert response.status_code == 404
+    assert jobs.stats()['expired'] == 1
@@ -0,0 +1,97 @@
+"""
+Tests for the render worker processes: deadlines, crashes and recycling.
+Run with: python -m pytest test_render_pool.py
+"""
+import os
+import signal
+import time
+
+import pytest
+
+import routes.questions
+from utils.render_pool import RenderCrashed, RenderPool, RenderTimeout
+
+# seconds a new worker may take to import the generators
+STARTUP = 60
+
+
+def wait_idle(pool, count=1):
+    deadline = time.monotonic() + STARTUP
+    while pool.idle.qsize() < count:
+        assert time.monotonic() < deadline, "render worker did not start"
+        time.sleep(0.1)
+
+
+def pids(pool):
+    return {worker.pid for worker in pool.workers}
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    # the workers write their images under the test's directory
+    monkeypatch.chdir(tmp_path)
+    pool = RenderPool(processes=1, max_jobs=100, timeout=STARTUP)
+    pool.start()
+    wait_idle(pool)
+    yield pool
+    # replacements started by a test are waited for, so none is left behind
+    wait_idle(pool, len(pool.workers))
+    for worker in list(pool.workers):
+        worker.stop(kill=True)
+
+
+def test_timeout_returns_504_and_replaces_the_worker(pool, client, monkeypatch):
+    monkeypatch.setattr(routes.questions, 'render_pool', pool)
+    before = pids(pool)
+    # far shorter than any render
+    pool.timeout = 0.001
+
+    response = client.get('/api/questions/nvr')
+    assert response.status_code == 504
+    assert pool.stats()['timeouts'] == 1
+
+    # the stuck worker was killed and a new one takes its place
+    pool.timeout = STARTUP
+    wait_idle(pool)
+    assert pids(pool).isdisjoint(before)
+    assert pool.stats()['processes'] == 1
+    assert client.get('/api/questions/nvr').status_code == 200
+
+
+def test_generate_raises_render_timeout(pool):
+    before = pids(pool)
+    with pytest.raises(RenderTimeout):
+        pool.generate(9, seed=1, timeout=0.001)
+    assert pool.stats()['timeouts'] == 1
+
+    wait_idle(pool)
+    assert pids(pool).isdisjoint(before)
+    assert '9' in pool.generate(9, seed=1)
+
+
+def test_crashed_worker_is_respawned(pool):
+    before = pids(pool)
+    for pid in before:
+        os.kill(pid, signal.SIGKILL)
+
+    with pytest.raises(RenderCrashed):
+        pool.generate(9, seed=1)
+    assert pool.stats()['crashes'] == 1
+
+    wait_idle(pool)
+    assert pids(pool).isdisjoint(before)
+    assert '9' in pool.generate(9, seed=1)
+
+
+def test_worker_is_recycled_after_max_jobs(pool):
+    pool.max_jobs = 2
+    before = pids(pool)
+
+    pool.generate(9, seed=1)
+    assert pids(pool) == before
+    pool.generate(9, seed=2)
+    assert pool.stats()['recycled'] == 1
+
+    wait_idle(pool)
+    assert pids(pool).isdisjoint(before)
+    assert pool.stats()['jobs'] == 2
@@ -0,0 +1,110 @@
+"""
+Stress test for rendering questions from several threads in one process.
+Run with: python -m pytest test_render_threads.py
+"""
+import math
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+import Polygons.canvas
+from Polygons.canvas import BACKENDS, newCanvas
+from Polygons.Polygons import Polygon, Circumcircle
+from Polygons.utils import cropImage
+from generateQuestionPaper import generate_question
+
+THREADS = 8
+SCENES = 24
+
+
+def build_scene(seed):
+    """Build a list of polygons. Uses the global random module, so call it from one thread."""
+    random.seed(seed)
+    polys = []
+    for i, sides in enumerate([0, 1, 2, 3, 5, 8]):
+        poly = Polygon(no_of_sides=sides, isRegular='any', hatch=random.choice(Polygon.getHatches()))
+        poly.circumcircle = Circumcircle(10 + 5 * i, 30 * i, 10 * (i % 2))
+        poly.makeShape()
+        if sides > 2:
+            poly.rotate(math.pi / 4)
+        polys.append(poly)
+    return polys
+
+
+def render_scene(polys, backend):
+    canvas = newCanvas(backend=backend)
+    for poly in polys:
+        poly.drawPolygon(canvas)
+    img = cropImage(canvas.toImage())
+    canvas.close()
+    return img
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_concurrent_renders_match_serial_renders(backend):
+    scenes = [build_scene(seed) for seed in range(SCENES)]
+    expected = [render_scene(scene, backend) for scene in scenes]
+
+    # every scene several times over, interleaved across the threads
+    jobs = scenes * 3
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(render_scene, jobs, [backend] * len(jobs)))
+
+    for i, img in enumerate(results):
+        assert np.array_equal(img, expected[i % SCENES]), f"scene {i % SCENES} differs when rendered concurrently"
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_all_question_types_in_parallel(tmp_path, monkeypatch, backend):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Polygons.canvas, 'RENDER_BACKEND', backend)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(generate_question, range(1, 13)))
+
+    for question_num, question_data in zip(range(1, 13), results):
+        question_info = question_data[str(question_num)]
+        paths = [question_info['question'], question_info['answer']] + question_info['distractors']
+        assert len(question_info['distractors']) == 3
+        for path in paths:
+            img = cv2.imread(os.path.join(tmp_path, 'static', path), 0)
+            assert img is not None, f"{path} is missing or corrupt"
+            assert img.size > 0
+
+
+def test_same_question_type_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    # the same generator many times at once, as concurrent requests would
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(generate_question, [9] * THREADS * 2))
+
+    for question_data in results:
+        question_info = question_data['9']
+        for path in [question_info['question'], question_info['answer']] + question_info['distractors']:
+            img = cv2.imread(os.path.join(tmp_path, 'static', path), 0)
+            assert img is not None, f"{path} is missing or corrupt"
+    # every workspace is removed once its images are published
+    assert os.listdir(os.path.join(tmp_path, 'static', 'tmp')) == []
+
+
+def test_seeded_questions_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def paths(question_data):
+        question_info = list(question_data.values())[0]
+        return [question_info['question'], question_info['answer']] + question_info['distractors']
+
+    # each question once on its own, then all of them at once
+    expected = [paths(generate_question(question_num, seed=question_num)) for question_num in range(1, 13)]
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(lambda question_num: generate_question(question_num, seed=question_num), range(1, 13)))
+
+    # the images are stored under the hash of their bytes, so equal paths are equal images
+    for question_num, question_data in zip(range(1, 13), results):
+        assert question_data[str(question_num)]['seed'] == question_num
+        assert paths(question_data) == expected[question_num - 1], f"question {question_num} differs when generated concurrently"
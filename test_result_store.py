@@ -0,0 +1,89 @@
+"""
+Tests for storing generated images under the hash of their content.
+Run with: python -m pytest test_result_store.py
+"""
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from generateQuestionPaper import generate_question
+from Polygons import encoding
+from utils.result_store import CONTENT_NAME, DIGEST_SIZE, SHARD_LEVELS, ContentStore, is_content_addressed
+from utils.workspace import Workspace
+
+
+def image_paths(question_data, question_num):
+    question_info = question_data[str(question_num)]
+    return [question_info['question'], question_info['answer']] + question_info['distractors']
+
+
+def result_files(static_dir):
+    return sorted(os.path.relpath(os.path.join(root, name), static_dir)
+                  for root, _, names in os.walk(os.path.join(static_dir, 'result')) for name in names)
+
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / 'static')
+
+
+def test_identical_images_share_one_file(static_dir):
+    store = ContentStore()
+    img = np.full((20, 30), 255, dtype=np.uint8)
+    img[5:15, 10:20] = 0
+
+    first = store.save('fold_question_5.png', img)
+    # another generator's name for the same pixels
+    second = store.save('cut_answer_1.png', img.copy())
+    assert first == second
+    assert [path for path in result_files(static_dir) if path.endswith('.png')] == [os.path.relpath(first, static_dir)]
+    stats = store.stats()
+    assert (stats['writes'], stats['dedupes']) == (1, 1)
+    assert stats['bytes_deduped'] == stats['bytes_written'] == os.path.getsize(first)
+
+    img[0, 0] = 0
+    assert store.save('fold_question_5.png', img) != first
+
+
+def test_the_same_seed_renders_to_the_same_paths(static_dir):
+    first = image_paths(generate_question(5, seed=7), 5)
+    files = result_files(static_dir)
+    second = image_paths(generate_question(5, seed=7), 5)
+    assert second == first
+    # nothing new was written
+    assert result_files(static_dir) == files
+
+
+def test_shard_layout_matches_content_name(static_dir):
+    path = os.path.relpath(ContentStore().save('grid.png', np.zeros((4, 4), dtype=np.uint8)), static_dir)
+    assert CONTENT_NAME.match(path.replace(os.sep, '/'))
+    assert is_content_addressed(path)
+
+    # result/ab/cd/abcd....png: each shard is the next two characters of the name
+    parts = path.split(os.sep)
+    name = os.path.splitext(parts[-1])[0]
+    assert parts[0] == 'result'
+    assert len(parts) == SHARD_LEVELS + 2
+    assert len(name) == 2 * DIGEST_SIZE
+    assert parts[1:-1] == [name[2 * level:2 * level + 2] for level in range(SHARD_LEVELS)]
+
+    # a generator's own file name is not content addressed
+    assert not is_content_addressed(os.path.join('result', 'fold_question_5.png'))
+    assert not is_content_addressed(os.path.join('result', 'ab', name + '.png'))
+
+
+def test_images_are_written_at_the_store_level(static_dir):
+    img = np.zeros((64, 64), dtype=np.uint8)
+    img[::3] = 255
+    fast, strong = ContentStore(compression=1), ContentStore(compression=9)
+    with Workspace(fast) as workspace:
+        published = workspace.save('grid.png', img)
+    with open(published, 'rb') as f:
+        assert f.read() == encoding.encodePng(img, compression=1)
+    # the level is part of the bytes, so of the name
+    saved = strong.save('grid.png', img)
+    assert saved != published
+    assert np.array_equal(np.array(Image.open(saved).convert('L')), np.array(Image.open(published).convert('L')))
@@ -0,0 +1,45 @@
+"""
+Tests for questions packed into one sprite sheet (?sprite=1).
+Run with: python -m pytest test_sprite.py
+"""
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from Polygons import compositor
+
+SEED = 11
+
+
+def written_pngs():
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(os.path.join('static', 'result'))
+                  for name in names if name.endswith('.png'))
+
+
+def read_image(url):
+    with open(os.path.join('static', url.split('/api/static/static/', 1)[1]), 'rb') as f:
+        return np.array(Image.open(io.BytesIO(f.read())).convert('L'))
+
+
+def test_one_sheet_with_the_packed_rects(client):
+    response = client.get(f'/api/questions/nvr?sprite=1&types=9&seed={SEED}')
+    assert response.status_code == 200
+    entry = response.get_json()['questions'][0]
+    # the question's images in one file
+    assert written_pngs() == [os.path.join('static', entry['sprite'].split('/api/static/static/', 1)[1])]
+    assert 'question' not in entry
+    rects = entry['rects']
+
+    # the same question with an image per file
+    separate = client.get(f'/api/questions/nvr?types=9&seed={SEED}').get_json()['questions'][0]
+    images = [read_image(url) for url in [separate['question'], separate['answer']] + separate['distractors']]
+    _, packed = compositor.pack(images)
+    assert [rects['question'], rects['answer']] + rects['distractors'] == [list(rect) for rect in packed]
+
+    # each rect holds its image
+    sheet = read_image(entry['sprite'])
+    for img, (x, y, w, h) in zip(images, packed):
+        assert img.shape == (h, w)
+        assert np.array_equal(sheet[y:y + h, x:x + w], img)
@@ -0,0 +1,88 @@
+"""
+Tests for the caching headers, conditional and range requests of /api/static.
+Run with: python -m pytest test_static.py
+"""
+import os
+import shutil
+
+import pytest
+
+import routes.static
+from utils.result_store import ContentStore
+
+# the directory the route serves, whatever the current one is
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(routes.static.__file__)), os.pardir, 'static')
+DATA_FILE = 'data/english.json'
+
+
+def url(filename):
+    return '/api/static/static/' + filename
+
+
+@pytest.fixture
+def generated_image():
+    # an image as the result store writes it, removed with its shard directory
+    data = b'\x89PNG generated image'.ljust(200, b'.')
+    path = ContentStore(os.path.join(STATIC_DIR, 'result')).path_for(data, '.png')
+    shard = os.path.join(STATIC_DIR, 'result', os.path.relpath(path, os.path.join(STATIC_DIR, 'result')).split(os.sep)[0])
+    created = not os.path.exists(shard)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    yield os.path.relpath(path, STATIC_DIR).replace(os.sep, '/'), data
+    if created:
+        shutil.rmtree(shard)
+    else:
+        os.remove(path)
+
+
+def test_etag_answers_if_none_match_with_304(client):
+    response = client.get(url(DATA_FILE))
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    # a strong ETag, the same for the same bytes
+    assert not etag.startswith('W/')
+    assert client.get(url(DATA_FILE)).headers['ETag'] == etag
+
+    response = client.get(url(DATA_FILE), headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert client.get(url(DATA_FILE), headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_generated_image_etag_is_its_name(client, generated_image):
+    filename, data = generated_image
+    response = client.get(url(filename))
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.headers['ETag'] == '"%s"' % os.path.basename(filename)
+    assert 'Accept' in response.headers['Vary']
+    assert client.get(url(filename), headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_range_requests(client):
+    with open(os.path.join(STATIC_DIR, DATA_FILE), 'rb') as f:
+        data = f.read()
+
+    response = client.get(url(DATA_FILE), headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.data == data[:10]
+    assert response.headers['Content-Range'] == f'bytes 0-9/{len(data)}'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+    response = client.get(url(DATA_FILE), headers={'Range': f'bytes={len(data) + 100}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(data)}'
+
+
+def test_cache_control_by_prefix(client, app, generated_image):
+    filename, _ = generated_image
+    # content-addressed images never change
+    max_age = app.config['IMMUTABLE_MAX_AGE']
+    assert client.get(url(filename)).headers['Cache-Control'] == f'public, max-age={max_age}, immutable'
+
+    # the other files are revalidated, by the policy of their prefix
+    policies = app.config['STATIC_CACHE_POLICIES']
+    assert client.get(url(DATA_FILE)).headers['Cache-Control'] == policies['data/']
+    assert 'immutable' not in policies['data/']
+    assert client.get(url('templates/' + os.listdir(os.path.join(STATIC_DIR, 'templates'))[0])).headers['Cache-Control'] == policies['']
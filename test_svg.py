@@ -0,0 +1,100 @@
+"""
+Tests for the vector (SVG) images: the markup of every generator, the
+viewBox arithmetic and the montage layout.
+Run with: python -m pytest test_svg.py
+"""
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from generateQuestionPaper import generate_question
+from Polygons import svg
+
+NS = {'svg': svg.SVG_NS}
+
+
+def parse(img):
+    root = ET.fromstring(img.toString())
+    assert root.tag == '{%s}svg' % svg.SVG_NS
+    return root
+
+
+def viewport(element):
+    return (element.get('viewBox'), element.get('width'), element.get('height'))
+
+
+@pytest.mark.parametrize('question_num', range(1, 13))
+def test_every_generator_writes_valid_svg(question_num, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    question_info = generate_question(question_num, format='svg', seed=3)[str(question_num)]
+    paths = [question_info['question'], question_info['answer']] + question_info['distractors']
+    for path in paths:
+        assert path.endswith('.svg')
+        root = ET.parse(os.path.join('static', path)).getroot()
+        assert root.tag == '{%s}svg' % svg.SVG_NS
+        assert len(root.get('viewBox').split()) == 4
+        assert float(root.get('width')) > 0 and float(root.get('height')) > 0
+
+
+def test_unknown_format_is_refused(client):
+    response = client.get('/api/questions/nvr?format=gif')
+    assert response.status_code == 400
+    assert 'svg' in response.get_json()['error']
+    assert client.post('/api/questions/nvr/jobs?format=jpeg').status_code == 400
+
+
+def test_svg_format_links_svg_images(client):
+    entry = client.get('/api/questions/nvr?format=svg&types=9').get_json()['questions'][0]
+    for url in [entry['question'], entry['answer']] + entry['distractors']:
+        assert url.endswith('.svg')
+
+
+def test_crop_snaps_the_bbox_to_whole_pixels():
+    img = svg.SvgImage('<rect/>', 200, 100, bbox=(10.4, 20.6, 50.2, 70))
+    cropped = svg.crop(img)
+    assert cropped.viewBox == (10, 20, 41, 50)
+    assert viewport(parse(cropped)) == ('10 20 41 50', '41', '50')
+    # the original is unchanged
+    assert img.viewBox == (0, 0, 200, 100)
+
+    # clipped to what is shown
+    assert svg.crop(svg.SvgImage('', 200, 100, bbox=(-5, 90, 30, 120))).viewBox == (0, 90, 30, 10)
+
+
+def test_region_scales_output_pixels_to_the_viewbox():
+    # shown at half size
+    img = svg.SvgImage('<rect/>', 200, 100, viewBox=(10, 0, 400, 200), bbox=(0, 0, 400, 200))
+    part = svg.region(img, 10, 20, 60, 70)
+    assert part.viewBox == (30, 40, 100, 100)
+    assert viewport(parse(part)) == ('30 40 100 100', '50', '50')
+    assert part.bbox is None
+
+
+def test_tile_places_cells_like_the_raster_montage():
+    tall = svg.SvgImage('<rect/>', 10, 20)
+    wide = svg.SvgImage('<circle/>', 30, 10)
+    short = svg.SvgImage('<line/>', 20, 4)
+    sheet = svg.tile([tall, wide, short], cols=2, border=1, spacing=2, borderColor=0, background=255)
+    # cells are the image plus 2 * (border + spacing)
+    assert (sheet.width, sheet.height) == (16 + 36, 26 + 10)
+
+    root = parse(sheet)
+    groups = root.findall('svg:g', NS)
+    # the wide image is centered in the height of the row, the last row in the width
+    assert [group.get('transform') for group in groups] == ['translate(0 0)', 'translate(16 5)', 'translate(13 26)']
+    for group, img in zip(groups, [tall, wide, short]):
+        nested = group.find('svg:svg', NS)
+        assert (nested.get('x'), nested.get('y')) == ('3', '3')
+        assert (nested.get('width'), nested.get('height')) == (str(img.width), str(img.height))
+        assert group.find('svg:rect', NS).get('stroke-width') == '1'
+
+
+def test_pack_places_images_at_their_rects():
+    images = [svg.SvgImage('<rect/>', 10, 20), svg.SvgImage('<circle/>', 30, 10, viewBox=(5, 5, 60, 20))]
+    sheet = svg.pack(images, [(0, 0, 10, 20), (12, 4, 30, 10)], 42, 20, background=255)
+    assert (sheet.width, sheet.height) == (42, 20)
+
+    nested = parse(sheet).findall('svg:svg', NS)
+    assert [(element.get('x', '0'), element.get('y', '0')) for element in nested] == [('0', '0'), ('12', '4')]
+    assert viewport(nested[1]) == ('5 5 60 20', '30', '10')
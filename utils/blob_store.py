@@ -0,0 +1,176 @@
+# utils/blob_store.py
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from Polygons import encoding, svg
+from Polygons.utils import imageBytes
+from utils.result_store import result_store
+
+# seconds an image is kept before it is first served (question pool images
+# can wait a while); serving it schedules its real expiry
+UNSERVED_LIFETIME = 3600
+
+
+class BlobCollector:
+    """
+    Store for one generation that keeps the encoded images in blobs (path
+    relative to static/ -> bytes) instead of writing them. The paths are the
+    ones the result store would write, so the URLs are the same either way.
+    """
+    def __init__(self):
+        self.blobs = {}
+
+    def save(self, filename, img):
+        data = imageBytes(img, result_store.compression)
+        path = result_store.path_for(data, os.path.splitext(filename)[1])
+        static_dir = os.path.join(os.getcwd(), 'static')
+        self.blobs[os.path.relpath(path, static_dir)] = data
+        if not isinstance(img, svg.SvgImage) and encoding.WEBP_VARIANTS:
+            self.blobs[os.path.relpath(encoding.webpPath(path), static_dir)] = encoding.timed('webp', encoding.encodeWebp, img, encoding.PNG_BITS)
+        return path
+
+
+class BlobStore:
+    """
+    Generated images kept in this process's memory and served from there by
+    the static route, so that an image fetched once or twice within its
+    lifetime never touches the disk. Holds at most max_bytes; images that do
+    not fit are written to static/ as before. Each image expires at its own
+    time and is dropped when it is next looked at or room is needed.
+    """
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # path -> [bytes, expiry time, scheduled], oldest first
+        self.blobs = OrderedDict()
+        self.bytes = 0
+        self.stored = 0
+        self.overflowed = 0
+        self.expired = 0
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('BLOB_STORE_BYTES', 0)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def publish(self, blobs):
+        """
+        Keeps the images of a generation (from a BlobCollector), writing those
+        that do not fit under static/ instead.
+        """
+        static_dir = os.path.join(os.getcwd(), 'static')
+        for path, data in blobs.items():
+            if self.put(path, data):
+                continue
+            full_path = os.path.join(static_dir, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            encoding.writeFile(full_path, data)
+            with self.lock:
+                self.overflowed += 1
+
+    def put(self, path, data):
+        now = time.time()
+        with self.lock:
+            blob = self.blobs.get(path)
+            if blob is not None:
+                # the same image again; once served, serving it again sets its expiry
+                if not blob[2]:
+                    blob[1] = now + UNSERVED_LIFETIME
+                return True
+            if self.bytes + len(data) > self.max_bytes:
+                self.purge(now)
+                if self.bytes + len(data) > self.max_bytes:
+                    return False
+            self.blobs[path] = [data, now + UNSERVED_LIFETIME, False]
+            self.bytes += len(data)
+            self.stored += 1
+            return True
+
+    def get(self, path, count=True):
+        """
+        The bytes of an image, or None if it is not (or no longer) in memory.
+        Only counted in hits and misses if count is True.
+        """
+        with self.lock:
+            blob = self.blobs.get(path)
+            if blob is not None and blob[1] <= time.time():
+                self.drop(path)
+                self.expired += 1
+                blob = None
+            if count:
+                if blob is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return None if blob is None else blob[0]
+
+    def expire(self, path, lifetime):
+        """
+        Sets an image (and its WebP copy) to expire lifetime seconds from now.
+        Returns False if it is not in memory.
+        """
+        expires = time.time() + lifetime
+        with self.lock:
+            blob = self.blobs.get(path)
+            if blob is None:
+                return False
+            for key in {path, encoding.webpPath(path)}:
+                blob = self.blobs.get(key)
+                if blob is not None:
+                    # a shared image stays for the latest of its expiries
+                    blob[1] = max(blob[1], expires) if blob[2] else expires
+                    blob[2] = True
+            return True
+
+    def drop(self, path):
+        # (lock held)
+        data = self.blobs.pop(path)[0]
+        self.bytes -= len(data)
+
+    def purge(self, now):
+        # drops every expired image (lock held)
+        expired = [path for path, blob in self.blobs.items() if blob[1] <= now]
+        for path in expired:
+            self.drop(path)
+        self.expired += len(expired)
+
+    def response_data(self, filename, accept_webp):
+        """
+        (bytes, mimetype) to serve filename from memory, or None. PNGs are
+        served as their WebP copy if the client accepts it and there is one.
+        """
+        if accept_webp and filename.lower().endswith('.png'):
+            data = self.get(encoding.webpPath(filename), count=False)
+            if data is not None:
+                with self.lock:
+                    self.hits += 1
+                return data, 'image/webp'
+        data = self.get(filename)
+        if data is None:
+            return None
+        return data, mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'blobs': len(self.blobs),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'stored': self.stored,
+                'overflowed': self.overflowed,
+                'expired': self.expired,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 3) if requests else None,
+            }
+
+# generated images kept in memory by the web process (off unless BLOB_STORE_BYTES is set)
+blob_store = BlobStore()
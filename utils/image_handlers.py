@@ -1,18 +1,6 @@
 # utils/image_handlers.py
 import os
-
-def delete_images(*filepaths):
-    static_dir = os.path.join(os.getcwd(), 'static')
-    for filepath in filepaths:
-        full_path = os.path.join(static_dir, filepath)
-        try:
-            if os.path.exists(full_path):
-                os.remove(full_path)
-                print(f"Deleted {filepath}")
-            else:
-                print(f"File already deleted or does not exist: {filepath}")
-        except Exception as e:
-            print(f"Error deleting {filepath}: {e}")
+import shutil
 
 def ensure_static_folders():
     """
@@ -43,5 +31,9 @@ def cleanup_static_folders():
                 if os.path.isfile(file_path):
                     os.remove(file_path)
                     print(f"Deleted {file_path}")
+                elif os.path.isdir(file_path):
+                    # shard directories of the content addressed store
+                    shutil.rmtree(file_path)
+                    print(f"Deleted {file_path}")
             except Exception as e:
                 print(f"Error deleting {file_path}: {e}")
@@ -0,0 +1,191 @@
+# utils/janitor.py
+import heapq
+import os
+import threading
+import time
+from collections import defaultdict
+
+from Polygons.encoding import webpPath
+from utils.result_store import is_content_addressed
+
+# seconds before generated images are deleted
+IMAGE_LIFETIME = 300
+
+
+class Janitor:
+    """
+    Deletes generated images when they expire, from one background thread.
+    Expiry times are kept in a min-heap: the thread sleeps until the earliest
+    one, then deletes everything that is due a directory at a time, listing
+    it with os.scandir. An image stored or served again after it was
+    scheduled (it has a newer modification time) is kept for another lifetime
+    from then. At startup the result directory is rescanned, so deletions
+    pending when the process stopped are not lost; only generated images
+    named by their content hash are picked up, not diagrams (result/<id>.png).
+    """
+    def __init__(self, static_dir=None):
+        self.static_dir = static_dir
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        # (expiry time, path), earliest first; entries superseded in
+        # expiries are skipped when they come up
+        self.heap = []
+        # path (relative to static/) -> (expiry time, lifetime)
+        self.expiries = {}
+        self.thread = None
+        self.expired = 0
+        self.kept = 0
+        self.missing = 0
+        self.rescanned = 0
+        self.errors = 0
+
+    @property
+    def root(self):
+        return self.static_dir or os.path.join(os.getcwd(), 'static')
+
+    def init_app(self, app):
+        """
+        Schedules the images already in static/result from their modification
+        times, keeping them for the longest lifetime in use, and starts the thread.
+        """
+        self.rescan(max(IMAGE_LIFETIME, app.config.get('RENDER_JOB_TTL', 0)))
+        self.start()
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name='janitor', daemon=True)
+            self.thread.start()
+
+    def schedule(self, paths, lifetime=IMAGE_LIFETIME):
+        """
+        Deletes the images at paths (relative to static/) lifetime seconds from now.
+        """
+        self.schedule_at(paths, time.time() + lifetime, lifetime)
+        self.start()
+
+    def schedule_at(self, paths, expires, lifetime):
+        with self.lock:
+            earliest = self.heap[0][0] if self.heap else None
+            for path in paths:
+                current = self.expiries.get(path)
+                if current is not None and current[0] >= expires:
+                    continue
+                self.expiries[path] = (expires, lifetime)
+                heapq.heappush(self.heap, (expires, path))
+            # the thread sleeps until the old earliest expiry
+            if self.heap and self.heap[0][0] != earliest:
+                self.wakeup.notify()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.heap or self.heap[0][0] > time.time():
+                    self.wakeup.wait(self.heap[0][0] - time.time() if self.heap else None)
+                due = self.pop_due(time.time())
+            self.sweep(due)
+
+    def pop_due(self, now):
+        # (path, lifetime) of the images due by now, earliest first (lock held)
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            expires, path = heapq.heappop(self.heap)
+            if self.expiries.get(path, (None,))[0] == expires:
+                due.append((path, self.expiries.pop(path)[1]))
+        return due
+
+    def sweep(self, due):
+        """
+        Deletes the due images, listing each of their directories once.
+        """
+        by_dir = defaultdict(dict)
+        for path, lifetime in due:
+            full_path = os.path.join(self.root, path)
+            by_dir[os.path.dirname(full_path)][os.path.basename(full_path)] = (path, lifetime)
+
+        now = time.time()
+        expired = kept = errors = 0
+        found = 0
+        for directory, names in by_dir.items():
+            try:
+                entries = [entry for entry in os.scandir(directory) if entry.name in names]
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                path, lifetime = names[entry.name]
+                found += 1
+                try:
+                    modified = entry.stat().st_mtime
+                    if modified + lifetime > now:
+                        # stored or served again since it was scheduled
+                        self.schedule_at([path], modified + lifetime, lifetime)
+                        kept += 1
+                        continue
+                    os.remove(entry.path)
+                    expired += 1
+                    # the WebP copy written next to a PNG, if any
+                    if entry.name.lower().endswith('.png'):
+                        try:
+                            os.remove(webpPath(entry.path))
+                        except FileNotFoundError:
+                            pass
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    print(f"Error deleting {path}: {e}")
+                    errors += 1
+
+        with self.lock:
+            self.expired += expired
+            self.kept += kept
+            self.missing += len(due) - found
+            self.errors += errors
+        if expired:
+            print(f"Deleted {expired} expired images")
+
+    def rescan(self, lifetime):
+        """
+        Schedules every generated image under static/result (those named by
+        their content hash) at its modification time plus lifetime; those
+        already past it are deleted straight away.
+        """
+        result_dir = os.path.join(self.root, 'result')
+        directories = [result_dir]
+        scheduled = defaultdict(list)
+        while directories:
+            try:
+                entries = list(os.scandir(directories.pop()))
+            except FileNotFoundError:
+                continue
+            names = {entry.name for entry in entries}
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                    continue
+                # a WebP copy goes with its PNG
+                if entry.name.endswith('.webp') and entry.name[:-len('.webp')] + '.png' in names:
+                    continue
+                path = os.path.relpath(entry.path, self.root)
+                if not is_content_addressed(path):
+                    continue
+                scheduled[entry.stat().st_mtime + lifetime].append(path)
+        for expires, paths in scheduled.items():
+            self.schedule_at(paths, expires, lifetime)
+        with self.lock:
+            self.rescanned += sum(len(paths) for paths in scheduled.values())
+
+    def stats(self):
+        with self.lock:
+            return {
+                'live': len(self.expiries),
+                'expired': self.expired,
+                'kept': self.kept,
+                'missing': self.missing,
+                'rescanned': self.rescanned,
+                'errors': self.errors,
+                'next_expiry_s': round(max(self.heap[0][0] - time.time(), 0), 1) if self.heap else None,
+            }
+
+# deletes the images the API generates, started by create_app
+janitor = Janitor()
@@ -0,0 +1,141 @@
+# utils/question_pool.py
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+
+from utils.blob_store import blob_store
+from utils.render_pool import render_pool
+
+# question types kept ready
+QUESTION_NUMS = range(1, 13)
+# refill latencies kept for the percentiles in stats()
+LATENCY_SAMPLES = 256
+
+def percentile_ms(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(1000 * ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+
+class QuestionPool:
+    """
+    Ready generated questions, per (question number, format), kept at depth
+    by background threads (rendering in the render pool). get() takes one in O(1) and queues its
+    replacement; it returns None when none is ready, and the caller generates
+    synchronously instead.
+    """
+    def __init__(self, depth=0, workers=1, generate=render_pool.generate):
+        self.depth = depth
+        self.workers = workers
+        self.generate = generate
+        self.lock = threading.Lock()
+        self.ready = {}
+        # refills queued or being generated, per key
+        self.pending = Counter()
+        self.requests = queue.Queue()
+        self.threads = []
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def init_app(self, app):
+        """
+        Takes the depth and worker count from the app config and fills the
+        pool for every question type in PNG.
+        """
+        self.depth = app.config.get('QUESTION_POOL_DEPTH', 0)
+        self.workers = app.config.get('QUESTION_POOL_WORKERS', 1)
+        self.start([(question_num, 'png') for question_num in QUESTION_NUMS])
+
+    def start(self, keys):
+        """
+        Starts the producer threads and fills the pool for keys,
+        (question number, format) pairs.
+        """
+        if self.depth <= 0 or self.threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.produce, name=f'question-pool-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        for key in keys:
+            self.fill(key)
+
+    def fill(self, key):
+        with self.lock:
+            missing = self.depth - len(self.ready.get(key, ())) - self.pending[key]
+            self.pending[key] += max(missing, 0)
+        for _ in range(missing):
+            self.requests.put((key, time.perf_counter()))
+
+    def produce(self):
+        while True:
+            key, queued = self.requests.get()
+            try:
+                question_data = self.generate(*key)
+            except Exception as e:
+                print(f"Question pool failed to generate {key}: {e}")
+                with self.lock:
+                    self.pending[key] -= 1
+                    self.failures += 1
+                continue
+            with self.lock:
+                self.pending[key] -= 1
+                self.ready.setdefault(key, deque()).append(question_data)
+                self.latencies.append(time.perf_counter() - queued)
+
+    def get(self, question_num, format='png'):
+        if not self.threads:
+            return None
+        key = (question_num, format)
+        try:
+            while True:
+                with self.lock:
+                    ready = self.ready.get(key)
+                    question_data = ready.popleft() if ready else None
+                if question_data is None:
+                    with self.lock:
+                        self.misses += 1
+                    return None
+                # the images are deleted a while after they are served, so
+                # their lifetime starts now; a question whose images are
+                # already gone is dropped
+                if self.touch(question_data):
+                    with self.lock:
+                        self.hits += 1
+                    return question_data
+        finally:
+            self.fill(key)
+
+    def touch(self, question_data):
+        static_dir = os.path.join(os.getcwd(), 'static')
+        question_info = list(question_data.values())[0]
+        try:
+            for path in [question_info['question'], question_info['answer'], *question_info['distractors']]:
+                if blob_store.get(path, count=False) is None:
+                    os.utime(os.path.join(static_dir, path))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            latencies = list(self.latencies)
+            return {
+                'depth': {f'{num}:{format}': len(ready) for (num, format), ready in sorted(self.ready.items())},
+                'target_depth': self.depth,
+                'pending': sum(self.pending.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 3) if requests else None,
+                'failures': self.failures,
+                'refill_ms': {'p50': percentile_ms(latencies, 0.5), 'p99': percentile_ms(latencies, 0.99)},
+            }
+
+# the pool the question endpoints take from, started by create_app
+question_pool = QuestionPool()
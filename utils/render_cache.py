@@ -0,0 +1,292 @@
+# utils/render_cache.py
+import fcntl
+import json
+import os
+import shutil
+import threading
+from collections import Counter, OrderedDict
+
+from Polygons import encoding
+from utils.blob_store import blob_store
+
+def default_root():
+    return os.path.join(os.getcwd(), 'static', 'cache')
+
+def image_paths(question_data):
+    question_info = list(question_data.values())[0]
+    return [question_info['question'], question_info['answer'], *question_info['distractors']]
+
+def link_file(src, dest):
+    # a second name for src, or a copy where hard links are not possible
+    try:
+        os.link(src, dest)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class RenderCache:
+    """
+    Generated questions of known seeds, kept on disk under static/cache up to
+    max_bytes, so that a seed asked for again is not rendered again.
+    Entries are keyed by (question number, seed, format, encoding settings,
+    sprite sheet or not):
+    the same key always renders the same images (see generate_question).
+    The images are copies of the rendered files in the result store, so they
+    stay when those expire; they are removed when the least recently used
+    entries are evicted to make room. As they are kept that long, PNGs are
+    encoded again at PNG_CACHE_COMPRESSION; WebP and SVG files are hard links. The index is kept in memory, and each
+    entry has a manifest file it is read back from at startup.
+
+    The index and reference counts are this process's alone, so the cache
+    needs a single web process: a second one sharing the directory would
+    delete images the first still hands out, and sweep away those it is
+    still writing. The first process to start takes a lock on the directory;
+    the cache is disabled in any other.
+    """
+    def __init__(self, max_bytes=0, root=None):
+        self.max_bytes = max_bytes
+        self.root = root
+        self.lock = threading.Lock()
+        # key -> (question data, bytes of its images), least recently used first
+        self.entries = OrderedDict()
+        # image path (relative to static/) -> entries that use it
+        self.refs = Counter()
+        # image path -> bytes it and its WebP copy take, counted once however
+        # many entries share it
+        self.sizes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+        # open while this process owns the cache directory
+        self.owner_lock = None
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('RENDER_CACHE_BYTES', 0)
+        if self.max_bytes > 0 and not self.claim():
+            print(f"Render cache disabled: {self.root or default_root()} is used by another process")
+            self.max_bytes = 0
+        if self.max_bytes > 0:
+            self.load()
+
+    def claim(self):
+        """
+        Takes the lock that makes this process the only user of the cache
+        directory. Returns False if another process holds it.
+        """
+        if self.owner_lock is not None:
+            return True
+        entries_dir = os.path.dirname(self.manifest_path((0, 0, '')))
+        os.makedirs(entries_dir, exist_ok=True)
+        owner_lock = open(os.path.join(entries_dir, 'owner.lock'), 'a')
+        try:
+            fcntl.flock(owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            owner_lock.close()
+            return False
+        self.owner_lock = owner_lock
+        return True
+
+    @property
+    def static_dir(self):
+        return os.path.dirname(self.root or default_root())
+
+    def manifest_path(self, key):
+        question_num, seed, variant = key
+        return os.path.join(self.root or default_root(), 'entries', f'{question_num}-{seed}-{variant}.json')
+
+    def key(self, question_num, seed, format, sprite=False):
+        # a PNG's name depends on how it is encoded, its cached bytes on how it is encoded again
+        variant = format if format == 'svg' else f'{format}{encoding.PNG_BITS}z{encoding.PNG_COMPRESSION}c{encoding.PNG_CACHE_COMPRESSION}'
+        if sprite:
+            variant += 'sheet'
+        return (question_num, seed, variant)
+
+    def get(self, question_num, seed, format, sprite=False):
+        """
+        The cached question data of seed, or None.
+        """
+        if self.max_bytes <= 0:
+            return None
+        key = self.key(question_num, seed, format, sprite)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        # keeps the order for the next startup
+        try:
+            os.utime(self.manifest_path(key))
+        except FileNotFoundError:
+            pass
+        return entry[0]
+
+    def put(self, question_num, seed, format, question_data, sprite=False):
+        """
+        Caches a question rendered into the result store. Returns its question
+        data with the cached image paths, or question_data unchanged if it
+        does not fit.
+        """
+        if self.max_bytes <= 0:
+            return question_data
+        key = self.key(question_num, seed, format, sprite)
+        # result/ab/cd/<hash>.png -> cache/ab/cd/<hash>.png
+        cache_dir = os.path.basename(self.root or default_root())
+        paths = {path: os.path.join(cache_dir, *path.replace(os.sep, '/').split('/')[1:]) for path in image_paths(question_data)}
+        question_info = dict(list(question_data.values())[0])
+        for field in ('question', 'answer'):
+            question_info[field] = paths[question_info[field]]
+        question_info['distractors'] = [paths[path] for path in question_info['distractors']]
+        cached = {str(question_num): question_info}
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            for src, dest in paths.items():
+                self.link(src, dest)
+            sizes = {path: self.size([path]) for path in set(paths.values())}
+            if sum(sizes.values()) > self.max_bytes:
+                self.release(paths.values())
+                return question_data
+            self.add(sizes)
+            self.entries[key] = (cached, sum(sizes.values()))
+            self.inserts += 1
+            self.evict()
+            manifest = self.manifest_path(key)
+            os.makedirs(os.path.dirname(manifest), exist_ok=True)
+            encoding.writeFile(manifest, json.dumps(cached).encode())
+        return cached
+
+    def link(self, src, dest):
+        # puts an image and its WebP copy into the cache: PNGs encoded again,
+        # the others linked or written out of the blob store
+        os.makedirs(os.path.dirname(os.path.join(self.static_dir, dest)), exist_ok=True)
+        variants = [(src, dest)]
+        if encoding.webpPath(src) != src:
+            variants.append((encoding.webpPath(src), encoding.webpPath(dest)))
+        for src_variant, dest_variant in variants:
+            src_path = os.path.join(self.static_dir, src_variant)
+            dest_path = os.path.join(self.static_dir, dest_variant)
+            data = blob_store.get(src_variant, count=False)
+            if dest_variant.lower().endswith('.png'):
+                # already there for another entry
+                if os.path.exists(dest_path):
+                    continue
+                if data is None:
+                    with open(src_path, 'rb') as f:
+                        data = f.read()
+                encoding.writeFile(dest_path, encoding.timed('png', encoding.recompressPng, data, encoding.PNG_CACHE_COMPRESSION))
+            elif data is not None:
+                encoding.writeFile(dest_path, data)
+            elif src_variant == src or os.path.exists(src_path):
+                link_file(src_path, dest_path)
+
+    def size(self, paths):
+        # bytes of the images and their WebP copies
+        size = 0
+        for path in set(paths):
+            path = os.path.join(self.static_dir, path)
+            for variant in {path, encoding.webpPath(path)}:
+                if os.path.exists(variant):
+                    size += os.path.getsize(variant)
+        return size
+
+    def add(self, sizes):
+        # references an entry's images, counting the bytes of those that are
+        # new to the cache (lock held)
+        for path, size in sizes.items():
+            if self.refs[path] == 0:
+                self.sizes[path] = size
+                self.bytes += size
+            self.refs[path] += 1
+
+    def release(self, paths):
+        # removes the images no entry uses any more (lock held)
+        for path in set(paths):
+            if self.refs[path] > 0:
+                continue
+            del self.refs[path]
+            self.bytes -= self.sizes.pop(path, 0)
+            path = os.path.join(self.static_dir, path)
+            for variant in {path, encoding.webpPath(path)}:
+                try:
+                    os.remove(variant)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        # drops least recently used entries until the cache fits (lock held)
+        while self.bytes > self.max_bytes and self.entries:
+            key, (question_data, size) = self.entries.popitem(last=False)
+            self.evictions += 1
+            paths = image_paths(question_data)
+            self.refs.subtract(set(paths))
+            self.release(paths)
+            try:
+                os.remove(self.manifest_path(key))
+            except FileNotFoundError:
+                pass
+
+    def load(self):
+        """
+        Rebuilds the index from the manifests on disk, oldest use first.
+        Entries whose images are missing are dropped.
+        """
+        entries_dir = os.path.dirname(self.manifest_path((0, 0, '')))
+        try:
+            manifests = sorted((entry for entry in os.scandir(entries_dir) if entry.name.endswith('.json')),
+                               key=lambda entry: entry.stat().st_mtime)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            for manifest in manifests:
+                try:
+                    question_num, seed, variant = manifest.name[:-len('.json')].split('-', 2)
+                    with open(manifest.path) as f:
+                        question_data = json.load(f)
+                    paths = image_paths(question_data)
+                    if not all(os.path.exists(os.path.join(self.static_dir, path)) for path in paths):
+                        raise FileNotFoundError(manifest.path)
+                except (ValueError, KeyError, OSError):
+                    os.remove(manifest.path)
+                    continue
+                sizes = {path: self.size([path]) for path in set(paths)}
+                self.add(sizes)
+                self.entries[(int(question_num), int(seed), variant)] = (question_data, sum(sizes.values()))
+            self.evict()
+            self.sweep()
+
+    def sweep(self):
+        # removes images no manifest refers to, left by a stop while caching (lock held)
+        root = self.root or default_root()
+        for directory, subdirs, files in os.walk(root):
+            if directory == os.path.dirname(self.manifest_path((0, 0, ''))):
+                continue
+            for name in files:
+                path = os.path.join(directory, name)
+                image = os.path.relpath(os.path.splitext(path)[0] + '.png', self.static_dir)
+                if self.refs[os.path.relpath(path, self.static_dir)] == 0 and (not name.endswith('.webp') or self.refs[image] == 0):
+                    os.remove(path)
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 3) if requests else None,
+                'inserts': self.inserts,
+                'evictions': self.evictions,
+            }
+
+# the cache of seeded questions, under the current static/cache
+render_cache = RenderCache()
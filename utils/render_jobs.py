@@ -0,0 +1,153 @@
+# utils/render_jobs.py
+import math
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    """The job queue is at capacity; retry_after is a hint in seconds."""
+    def __init__(self, retry_after):
+        super().__init__(f"Render queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderJob:
+    """
+    One queued render: run(*args) is called by a job thread, and its return
+    value (or the error it raised) is kept until the job expires.
+    """
+    def __init__(self, kind, run, args):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.run = run
+        self.args = args
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+
+class JobQueue:
+    """
+    Renders submitted as jobs, run by a few background threads in the order
+    they arrive, so a request returns a job id straight away instead of
+    waiting for the render. The queue holds at most size jobs; submit() raises
+    QueueFull beyond that. Finished jobs are forgotten ttl seconds later.
+    """
+    def __init__(self, size=64, workers=2, ttl=600):
+        self.size = size
+        self.workers = workers
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.queue = None
+        self.threads = []
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.expired = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.finished = 0
+
+    def init_app(self, app):
+        self.size = app.config.get('RENDER_JOB_QUEUE_SIZE', 64)
+        self.workers = app.config.get('RENDER_JOB_WORKERS', 2)
+        self.ttl = app.config.get('RENDER_JOB_TTL', 600)
+        self.start()
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            self.queue = queue.Queue(maxsize=self.size)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f'render-job-{i}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, kind, run, *args):
+        """
+        Queues run(*args) and returns the job.
+        """
+        self.start()
+        self.expire()
+        job = RenderJob(kind, run, args)
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job.id]
+                self.rejected += 1
+            raise QueueFull(self.retry_after())
+        with self.lock:
+            self.submitted += 1
+        return job
+
+    def get(self, job_id):
+        """
+        The job with job_id, or None if there is none or it has expired.
+        """
+        self.expire()
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            job.started = time.time()
+            job.status = 'running'
+            try:
+                job.result = job.run(*job.args)
+                job.status = 'done'
+            except Exception as e:
+                print(f"Render job {job.id} ({job.kind}) failed: {e}")
+                job.error = e
+                job.status = 'failed'
+            job.finished = time.time()
+            with self.lock:
+                self.finished += 1
+                self.wait_seconds += job.started - job.created
+                self.run_seconds += job.finished - job.started
+                if job.status == 'failed':
+                    self.failed += 1
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job.finished is not None and job.finished < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+            self.expired += len(expired)
+
+    def retry_after(self):
+        # seconds for the threads to work through a full queue at the average job time
+        with self.lock:
+            run_seconds = self.run_seconds / self.finished if self.finished else 1
+        return max(1, math.ceil(run_seconds * self.size / max(self.workers, 1)))
+
+    def stats(self):
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+            return {
+                'queued': statuses.count('queued'),
+                'running': statuses.count('running'),
+                'done': statuses.count('done'),
+                'failed': statuses.count('failed'),
+                'capacity': self.size,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'failures': self.failed,
+                'expired': self.expired,
+                'wait_ms': round(1000 * self.wait_seconds / self.finished, 1) if self.finished else None,
+                'run_ms': round(1000 * self.run_seconds / self.finished, 1) if self.finished else None,
+            }
+
+# the queue behind the /jobs endpoints, started by create_app
+render_jobs = JobQueue()
@@ -0,0 +1,286 @@
+# utils/render_pool.py
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Connection
+
+from generateQuestionPaper import generate_question
+from utils.blob_store import BlobCollector, blob_store
+
+# the repository root, importable by the worker processes
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# seconds a new worker may take to import the generators
+STARTUP_TIMEOUT = 60
+# a worker keeps stdout (fd 1) for results and sends prints to stderr before
+# anything is imported, then serves jobs from stdin
+WORKER_COMMAND = 'import os; results = os.dup(1); os.dup2(2, 1); from utils.render_pool import serve; serve(0, results)'
+
+
+class RenderError(Exception):
+    """A render job failed in its worker process."""
+
+class RenderTimeout(RenderError):
+    """A render job did not finish before its deadline; its worker was killed."""
+
+class RenderCrashed(RenderError):
+    """The worker process died during a render job."""
+
+
+def worker_stats():
+    # the renderer's counters in this worker process
+    from Polygons.canvas import canvasPool
+    from Polygons.encoding import encodingStats
+    from Polygons.glyphs import atlas
+    from Polygons.hatching import textures
+    from utils.result_store import result_store
+    return {
+        'canvas_pool': canvasPool.stats(),
+        'glyph_atlas': atlas.stats(),
+        'hatch_textures': textures.stats(),
+        'encoding': encodingStats.stats(),
+        'result_store': result_store.stats(),
+    }
+
+def render(question_num, format, seed, in_memory, sprite=False):
+    # (question data, the encoded images if in_memory, otherwise None)
+    if not in_memory:
+        return generate_question(question_num, format, seed=seed, sprite=sprite), None
+    collector = BlobCollector()
+    return generate_question(question_num, format, collector, seed, sprite), collector.blobs
+
+def deliver(blobs, images):
+    # the images of an in-memory render go to the caller's images dict, or
+    # to the blob store
+    if images is not None:
+        images.update(blobs)
+    elif blobs:
+        blob_store.publish(blobs)
+
+def worker_main(jobs, results):
+    """
+    Runs render for each (question number, format, seed, in_memory, sprite) received
+    on jobs, sending back ('ok', (question data, images), stats) or ('error',
+    traceback, stats) on results. Exits on None.
+    """
+    results.send(('ready', None, None))
+    while True:
+        try:
+            job = jobs.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        try:
+            results.send(('ok', render(*job), worker_stats()))
+        except Exception:
+            results.send(('error', traceback.format_exc(), worker_stats()))
+
+
+def serve(jobs_fd, results_fd):
+    try:
+        worker_main(Connection(jobs_fd, writable=False), Connection(results_fd, readable=False))
+    except BrokenPipeError:
+        # the pool exited
+        pass
+
+
+class Worker:
+    """
+    A render process, talking to the pool over its stdin and stdout.
+    It imports the generators once and then runs jobs until it is stopped.
+    """
+    def __init__(self, cwd):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+        self.process = subprocess.Popen([sys.executable, '-c', WORKER_COMMAND], cwd=cwd, env=env,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.jobs_conn = Connection(os.dup(self.process.stdin.fileno()), readable=False)
+        self.results_conn = Connection(os.dup(self.process.stdout.fileno()), writable=False)
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.jobs = 0
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def wait_ready(self, timeout):
+        try:
+            return self.results_conn.poll(timeout) and self.results_conn.recv()[0] == 'ready'
+        except (OSError, EOFError):
+            return False
+
+    def stop(self, kill=False):
+        if not kill:
+            try:
+                self.jobs_conn.send(None)
+                self.process.wait(5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.jobs_conn.close()
+        self.results_conn.close()
+
+
+class RenderPool:
+    """
+    Worker processes that run generate_question, so renders use every core
+    and a slow, hung or crashing render never blocks a web worker.
+    Each worker runs one job at a time. A job that misses its deadline has its
+    worker killed, a worker that dies is replaced, and every worker is
+    replaced after max_jobs jobs. Workers only take jobs once they have
+    imported the generators (matplotlib, cv2, numpy).
+    With no processes, jobs run in the calling thread.
+    """
+    def __init__(self, processes=0, max_jobs=100, timeout=30):
+        self.processes = processes
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        self.workers = set()
+        self.lock = threading.Lock()
+        self.cwd = None
+        self.jobs = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.recycled = 0
+        self.busy_seconds = 0.0
+        self.worker_stats = {}
+
+    def init_app(self, app):
+        self.processes = app.config.get('RENDER_PROCESSES', 0)
+        self.max_jobs = app.config.get('RENDER_MAX_JOBS', 100)
+        self.timeout = app.config.get('RENDER_TIMEOUT', 30)
+        self.start()
+
+    @property
+    def started(self):
+        return self.cwd is not None
+
+    def start(self):
+        if self.processes <= 0 or self.started:
+            return
+        # the workers write to static/ under the app's directory
+        self.cwd = os.getcwd()
+        for _ in range(self.processes):
+            self.spawn()
+
+    def spawn(self):
+        """
+        Starts a worker; it joins the idle workers once it has imported the generators.
+        """
+        worker = Worker(self.cwd)
+        with self.lock:
+            self.workers.add(worker)
+        threading.Thread(target=self.ready, args=(worker,), daemon=True).start()
+
+    def ready(self, worker):
+        if worker.wait_ready(STARTUP_TIMEOUT):
+            self.idle.put(worker)
+            return
+        print(f"Render worker {worker.pid} failed to start, retrying")
+        with self.lock:
+            self.workers.discard(worker)
+            self.crashes += 1
+        worker.stop(kill=True)
+        # keeps the pool at size without spinning on a broken setup
+        time.sleep(1)
+        self.spawn()
+
+    def retire(self, worker, kill=False):
+        with self.lock:
+            self.workers.discard(worker)
+            self.worker_stats.pop(worker.pid, None)
+        worker.stop(kill=kill)
+        self.spawn()
+
+    def generate(self, question_num, format='png', timeout=None, timing=None, seed=None, images=None, sprite=False):
+        """
+        Generates a question in a worker process and returns its question data.
+        timeout (seconds, RENDER_TIMEOUT by default) covers waiting for a free
+        worker and the render itself. A timing dict is given the milliseconds
+        spent on each, as wait_ms and render_ms. The seed is passed on to
+        generate_question, and so is sprite. With the blob store enabled the images are sent
+        back and kept in memory rather than written to disk. Given an images
+        dict, they are sent back and put in it instead (path relative to
+        static/ -> bytes), and not stored at all.
+        """
+        queued = time.perf_counter()
+        if timing is None:
+            timing = {}
+        in_memory = images is not None or blob_store.enabled
+        if not self.started:
+            question_data, blobs = render(question_num, format, seed, in_memory, sprite)
+            deliver(blobs, images)
+            timing.update(wait_ms=0.0, render_ms=round(1000 * (time.perf_counter() - queued), 1))
+            return question_data
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            worker = self.idle.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            with self.lock:
+                self.timeouts += 1
+            raise RenderTimeout(f"No render worker free within {timeout or self.timeout}s")
+
+        start = time.perf_counter()
+        timing['wait_ms'] = round(1000 * (start - queued), 1)
+        try:
+            worker.jobs_conn.send((question_num, format, seed, in_memory, sprite))
+            if not worker.results_conn.poll(max(deadline - time.monotonic(), 0)):
+                with self.lock:
+                    self.timeouts += 1
+                self.retire(worker, kill=True)
+                raise RenderTimeout(f"Question {question_num} did not render within {timeout or self.timeout}s")
+            status, result, stats = worker.results_conn.recv()
+        except (OSError, EOFError):
+            with self.lock:
+                self.crashes += 1
+            self.retire(worker, kill=True)
+            raise RenderCrashed(f"Render worker died generating question {question_num}")
+
+        worker.jobs += 1
+        timing['render_ms'] = round(1000 * (time.perf_counter() - start), 1)
+        with self.lock:
+            self.jobs += 1
+            self.busy_seconds += time.perf_counter() - start
+            self.worker_stats[worker.pid] = stats
+            if status != 'ok':
+                self.errors += 1
+        if worker.jobs >= self.max_jobs:
+            with self.lock:
+                self.recycled += 1
+            self.retire(worker)
+        else:
+            self.idle.put(worker)
+
+        if status != 'ok':
+            raise RenderError(result)
+        question_data, blobs = result
+        deliver(blobs, images)
+        return question_data
+
+    def stats(self):
+        with self.lock:
+            return {
+                'processes': len(self.workers),
+                'idle': self.idle.qsize(),
+                'jobs': self.jobs,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'crashes': self.crashes,
+                'recycled': self.recycled,
+                'job_ms': round(1000 * self.busy_seconds / self.jobs, 1) if self.jobs else None,
+                # the renderer counters of each live worker, as of its last job
+                'workers': dict(self.worker_stats),
+            }
+
+# the pool the question endpoints render in, started by create_app
+render_pool = RenderPool()
+
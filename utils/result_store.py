@@ -0,0 +1,141 @@
+# utils/result_store.py
+import hashlib
+import os
+import re
+import threading
+
+from Polygons import encoding, svg
+from Polygons.utils import imageBytes, saveImage
+from utils.workspace import move_file, staged_variants
+
+# bytes of the content hash in a file name (32 hex characters)
+DIGEST_SIZE = 16
+# directory levels above a stored file, two hex characters each
+SHARD_LEVELS = 2
+
+# result/ab/cd/abcd....png, or cache/ab/cd/abcd....png for the render cache's links to them
+CONTENT_NAME = re.compile(r'^(?:result|cache)/(?:[0-9a-f]{2}/){%d}[0-9a-f]{%d}\.(?:png|svg|webp)$' % (SHARD_LEVELS, 2 * DIGEST_SIZE))
+
+def default_root():
+    return os.path.join(os.getcwd(), 'static', 'result')
+
+def is_content_addressed(filename):
+    """
+    True for a path under static/ that a ContentStore wrote, whose bytes never change.
+    """
+    return CONTENT_NAME.match(filename.replace(os.sep, '/')) is not None
+
+
+class NamedStore:
+    """
+    Writes each image under the file name the generator gives it, e.g.
+    grid_answer_9.png, replacing the previous image of that name. PNGs are
+    written at the zlib level compression (PNG_COMPRESSION by default).
+    """
+    def __init__(self, root=None, compression=None):
+        self.root = root
+        self.compression = compression
+
+    def save(self, filename, img):
+        root = self.root or default_root()
+        os.makedirs(root, exist_ok=True)
+        path = os.path.join(root, filename)
+        saveImage(path, img, self.compression)
+        return path
+
+    def publish(self, staged, filename):
+        """
+        Moves an image written elsewhere (and its variants) to its name.
+        """
+        root = self.root or default_root()
+        os.makedirs(root, exist_ok=True)
+        for variant in staged_variants(staged):
+            move_file(variant, os.path.join(root, os.path.basename(variant)))
+        path = os.path.join(root, filename)
+        move_file(staged, path)
+        return path
+
+
+class ContentStore:
+    """
+    Writes each image under the hash of its encoded bytes, in sharded
+    directories: result/ab/cd/abcd....png. The generator's file name only
+    gives the extension. An image that is already stored is not written again;
+    its modification time is refreshed instead, so that files are only expired
+    once no request has stored them for the whole lifetime. PNGs are encoded
+    at the zlib level compression (PNG_COMPRESSION by default); the level is
+    part of the bytes, and so of the name.
+    """
+    def __init__(self, root=None, compression=None):
+        self.root = root
+        self.compression = compression
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.dedupes = 0
+        self.bytes_written = 0
+        self.bytes_deduped = 0
+
+    def path_for(self, data, extension):
+        digest = hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+        shards = [digest[2 * level:2 * level + 2] for level in range(SHARD_LEVELS)]
+        return os.path.join(self.root or default_root(), *shards, digest + extension)
+
+    def stored(self, path, size):
+        # refreshes and counts an image that is already stored
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        with self.lock:
+            self.dedupes += 1
+            self.bytes_deduped += size
+        return True
+
+    def written(self, size):
+        with self.lock:
+            self.writes += 1
+            self.bytes_written += size
+
+    def save(self, filename, img):
+        data = imageBytes(img, self.compression)
+        path = self.path_for(data, os.path.splitext(filename)[1])
+        if self.stored(path, len(data)):
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not isinstance(img, svg.SvgImage):
+            # variants first, so a stored PNG always has them
+            encoding.writeVariants(path, img)
+        # two requests storing the same image write the same bytes
+        encoding.writeFile(path, data)
+        self.written(len(data))
+        return path
+
+    def publish(self, staged, filename):
+        """
+        Moves an image written elsewhere (and its variants) to the path of its hash.
+        """
+        with open(staged, 'rb') as f:
+            data = f.read()
+        path = self.path_for(data, os.path.splitext(filename)[1])
+        if self.stored(path, len(data)):
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for variant in staged_variants(staged):
+            move_file(variant, os.path.splitext(path)[0] + os.path.splitext(variant)[1])
+        move_file(staged, path)
+        self.written(len(data))
+        return path
+
+    def stats(self):
+        with self.lock:
+            return {
+                'writes': self.writes,
+                'dedupes': self.dedupes,
+                'bytes_written': self.bytes_written,
+                'bytes_deduped': self.bytes_deduped,
+            }
+
+# the store the API generates into, under the current static/result
+result_store = ContentStore()
@@ -0,0 +1,35 @@
+# utils/sprite_sheet.py
+import os
+
+from Polygons.compositor import pack
+
+# the directory of the placeholder paths a SpriteSheet hands out
+SPRITE_DIR = 'sprite'
+
+
+class SpriteSheet:
+    """
+    Store for one generation that keeps the generator's images instead of
+    encoding them, so that they can be packed into one sheet image and
+    encoded and stored once. save returns a placeholder path under
+    static/sprite/ that only identifies the image for pack.
+    """
+    def __init__(self, static_dir=None):
+        self.static_dir = static_dir or os.path.join(os.getcwd(), 'static')
+        # placeholder path (relative to static/) -> image
+        self.images = {}
+
+    def save(self, filename, img):
+        path = os.path.join(SPRITE_DIR, f'{len(self.images)}{os.path.splitext(filename)[1]}')
+        self.images[path] = img
+        return os.path.join(self.static_dir, path)
+
+    def pack(self, store, paths):
+        """
+        Packs the images at paths (placeholders relative to static/), in that
+        order, into one sheet saved to store. Returns the sheet's path
+        relative to static/ and the [x, y, width, height] of each image.
+        """
+        sheet, rects = pack([self.images[path] for path in paths])
+        sheet_path = store.save(f'sheet{os.path.splitext(paths[0])[1]}', sheet)
+        return os.path.relpath(sheet_path, self.static_dir), [list(rect) for rect in rects]
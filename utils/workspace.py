@@ -0,0 +1,71 @@
+# utils/workspace.py
+import errno
+import os
+import shutil
+import uuid
+
+from Polygons import encoding
+from Polygons.utils import saveImage
+
+# where workspaces are created, e.g. /dev/shm to keep scratch files in memory;
+# static/tmp under the current directory by default
+WORKSPACE_ROOT = os.getenv('RENDER_WORKSPACE_ROOT')
+
+def move_file(src, dest):
+    """
+    Moves src to dest with an atomic rename. Across filesystems (a tmpfs
+    workspace) the file is copied next to dest first and renamed there.
+    """
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        tmp = f'{dest}.{uuid.uuid4().hex}.tmp'
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+        os.remove(src)
+
+
+class Workspace:
+    """
+    Private scratch directory of one generation, named by a unique id.
+    Used as the generators' store: images are written into the workspace and
+    then published to the real store with an atomic rename, so concurrent
+    generations never see each other's files or a partly written image.
+    The directory is removed when the workspace is closed.
+    """
+    def __init__(self, store, root=None):
+        self.store = store
+        self.id = uuid.uuid4().hex
+        root = root or WORKSPACE_ROOT or os.path.join(os.getcwd(), 'static', 'tmp')
+        self.path = os.path.join(root, self.id)
+        os.makedirs(self.path)
+
+    def save(self, filename, img):
+        staged = os.path.join(self.path, filename)
+        # encoded as the store would
+        saveImage(staged, img, self.store.compression)
+        return self.store.publish(staged, filename)
+
+    def close(self):
+        if self.path is None:
+            return
+        # the name disappears in one step, the files are deleted after
+        removed = self.path + '.removed'
+        os.rename(self.path, removed)
+        shutil.rmtree(removed, ignore_errors=True)
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def staged_variants(path):
+    """
+    The other encodings saveImage wrote next to path: the WebP copy of a PNG.
+    """
+    variant = encoding.webpPath(path)
+    return [variant] if variant != path and os.path.exists(variant) else []